@@ -0,0 +1,112 @@
+"""Decodes ABI-encoded values of canonical types, e.g. `(address,uint256)[]`."""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def split_tuple(ty: str) -> tuple[str, ...]:
+    """Returns the component types of a tuple type, e.g. `(uint256,(bool,bytes))`."""
+    assert ty[:1] == "(" and ty[-1:] == ")", f"not a tuple type: {ty}"
+    parts = []
+    depth = 0
+    start = 1
+    for i in range(1, len(ty) - 1):
+        c = ty[i]
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "," and depth == 0:
+            parts.append(ty[start:i])
+            start = i + 1
+    if start < len(ty) - 1:
+        parts.append(ty[start:-1])
+    return tuple(parts)
+
+
+@lru_cache(maxsize=None)
+def array_of(ty: str) -> tuple[str, int | None] | None:
+    """Returns the element type and length (None if dynamic) of an array type, or None for other types."""
+    if not ty.endswith("]"):
+        return None
+    bracket = ty.rfind("[")
+    size = ty[bracket + 1 : -1]
+    return ty[:bracket], int(size) if size else None
+
+
+@lru_cache(maxsize=None)
+def is_dynamic(ty: str) -> bool:
+    array = array_of(ty)
+    if array is not None:
+        return array[1] is None or is_dynamic(array[0])
+    if ty.startswith("("):
+        return any(is_dynamic(c) for c in split_tuple(ty))
+    return ty in ("bytes", "string")
+
+
+@lru_cache(maxsize=None)
+def head_size(ty: str) -> int:
+    """Returns the size of `ty` in the head of its enclosing tuple."""
+    if is_dynamic(ty):
+        return 32
+    array = array_of(ty)
+    if array is not None:
+        return array[1] * head_size(array[0])
+    if ty.startswith("("):
+        return sum(head_size(c) for c in split_tuple(ty))
+    return 32
+
+
+def decode(types: list[str] | tuple[str, ...], data: bytes) -> list:
+    """Decodes `data` as the tuple of `types`, e.g. the arguments of a call without the selector."""
+    return _decode_tuple(types, data, 0)
+
+
+def decode_word(ty: str, word: bytes):
+    """Decodes a value type from its 32-byte word, e.g. an indexed event argument."""
+    if ty.startswith("uint"):
+        return int.from_bytes(word, "big")
+    if ty.startswith("int"):
+        return int.from_bytes(word, "big", signed=True)
+    if ty == "address":
+        return "0x" + word[12:].hex()
+    if ty == "bool":
+        return word != bytes(32)
+    if ty.startswith("bytes"):
+        return "0x" + word[: int(ty[len("bytes") :])].hex()
+    assert False, f"not a value type: {ty}"
+
+
+def _decode_tuple(types, data: bytes, base: int) -> list:
+    values = []
+    pos = base
+    for ty in types:
+        if is_dynamic(ty):
+            offset = int.from_bytes(data[pos : pos + 32], "big")
+            values.append(_decode_at(ty, data, base + offset))
+        else:
+            values.append(_decode_at(ty, data, pos))
+        pos += head_size(ty)
+    return values
+
+
+def _decode_at(ty: str, data: bytes, pos: int):
+    array = array_of(ty)
+    if array is not None:
+        elem, size = array
+        if size is None:
+            size = int.from_bytes(data[pos : pos + 32], "big")
+            pos += 32
+        return _decode_tuple([elem] * size, data, pos)
+    if ty.startswith("("):
+        return _decode_tuple(split_tuple(ty), data, pos)
+    if ty in ("bytes", "string"):
+        length = int.from_bytes(data[pos : pos + 32], "big")
+        raw = data[pos + 32 : pos + 32 + length]
+        assert len(raw) == length, f"{ty} runs past the end of the data"
+        return raw.decode("utf-8", errors="replace") if ty == "string" else "0x" + raw.hex()
+    word = data[pos : pos + 32]
+    assert len(word) == 32, f"{ty} runs past the end of the data"
+    return decode_word(ty, word)
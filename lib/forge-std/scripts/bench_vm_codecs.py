@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Measures the generated struct codecs against the generic decoder of `abi.py`.
+
+Encodes arrays of random values of every struct with the generated codecs,
+checks that `abi.decode` and the generated decoder read back the same values
+and that they encode to the same bytes again, then times both decoders.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+import abi
+from vm import Cheatcodes
+from vm_check import CanonicalTypes
+from vm_codecs import load_codecs, slug
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the generated struct codecs")
+    parser.add_argument(
+            "--from",
+            metavar="PATH",
+            dest="path",
+            required=True,
+            help="path to a json file containing the Vm interface, as generated by Foundry")
+    parser.add_argument("--count", type=int, default=1000, help="number of structs in each array (default: 1000)")
+    parser.add_argument("--runs", type=int, default=5, help="number of runs of each decoder")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random values")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    args = parser.parse_args()
+
+    contract = Cheatcodes.from_json_file(args.path)
+    codecs = load_codecs(contract)
+    canonical = CanonicalTypes(contract)
+    sampler = Sampler(contract, random.Random(args.seed))
+
+    results = []
+    print(f"{args.count} structs per array, median of {args.runs} runs")
+    for s in contract.structs:
+        ty = f"{s.name}[]"
+        values = [sampler.sample(s.name) for _ in range(args.count)]
+        encode = getattr(codecs, f"encode_{slug(ty)}")
+        decode = getattr(codecs, f"decode_{slug(ty)}")
+        data = encode(values)
+        types = [canonical.of(ty)]
+
+        generic = abi.decode(types, data)[0]
+        generated = decode(data)
+        assert as_abi(values) == generic, f"{ty} encodes to other values than it was given"
+        assert as_abi(generated) == generic, f"{ty} decodes to other values than abi.decode"
+        assert encode(generated) == data, f"{ty} doesn't encode back to its data"
+
+        generic_ms = timed(lambda: abi.decode(types, data), args.runs)
+        generated_ms = timed(lambda: decode(data), args.runs)
+        results.append({"type": ty, "bytes": len(data), "generic_ms": generic_ms, "generated_ms": generated_ms})
+        print(f"{ty:22} {len(data) / 1024:8.0f} KiB  generic {generic_ms:8.1f} ms  generated {generated_ms:7.1f} ms  ({generic_ms / generated_ms:.1f}x)")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump({"cpus": os.cpu_count(), "count": args.count, "runs": args.runs, "results": results}, f, indent=2)
+
+
+class Sampler:
+    """Random values of the types of a spec, in the form the generated encoders take."""
+
+    def __init__(self, contract: Cheatcodes, rng: random.Random):
+        self.structs = {s.name: s for s in contract.structs}
+        self.enums = {e.name: len(e.variants) for e in contract.enums}
+        self.rng = rng
+
+    def sample(self, ty: str):
+        rng = self.rng
+        array = abi.array_of(ty)
+        if array is not None:
+            return [self.sample(array[0]) for _ in range(array[1] if array[1] is not None else rng.randrange(4))]
+        if ty in self.structs:
+            return {f.name: self.sample(f.ty) for f in self.structs[ty].fields}
+        if ty in self.enums:
+            return rng.randrange(self.enums[ty])
+        if ty == "bool":
+            return rng.random() < 0.5
+        if ty == "address":
+            return "0x" + rng.randbytes(20).hex()
+        if ty == "bytes":
+            return rng.randbytes(rng.randrange(100))
+        if ty == "string":
+            return "".join(rng.choices("abcdefghijklmnopqrstuvwxyz/._-", k=rng.randrange(40)))
+        if ty.startswith("bytes"):
+            return "0x" + rng.randbytes(int(ty[len("bytes") :])).hex()
+        if ty.startswith("uint"):
+            return rng.getrandbits(int(ty[len("uint") :] or 256))
+        if ty.startswith("int"):
+            bits = int(ty[len("int") :] or 256)
+            return rng.getrandbits(bits) - (1 << (bits - 1))
+        assert False, f"unknown type: {ty}"
+
+
+def as_abi(value):
+    """Returns `value` in the form of `abi.decode`: structs as lists and bytes as hex strings."""
+    if isinstance(value, dict):
+        return [as_abi(v) for v in value.values()]
+    if isinstance(value, list):
+        return [as_abi(v) for v in value]
+    if isinstance(value, (bytes, memoryview)):
+        return "0x" + value.hex()
+    return value
+
+
+def timed(f, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        f()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Measures how long the compiler takes on variants of the generated Vm.sol.
+
+Each variant is rendered from the same spec into a scratch copy of `src/`,
+then a fixed set of test contracts is compiled against it with a locally
+installed `forge build` (or `solc`). Trials are interleaved across variants so
+that a slow period of the machine doesn't favour one of them.
+
+Variants:
+    full     Vm.sol as generated by `vm.py`.
+    pruned   only the cheatcodes that `src/` and the tests call.
+    split    the functions of each group in their own interface, inherited by `VmSafe` and `Vm`.
+    no-docs  without any doc comments.
+    lean     as generated by `vm.py --profile lean`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import re
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from vm import (
+    HIDDEN_STATUSES,
+    OUT_PATH,
+    VM_DOC,
+    VM_SAFE_DOC,
+    CheatcodeTable,
+    Cheatcodes,
+    CheatcodesPrinter,
+    external_params_to_calldata,
+    group,
+    read_cheatcodes,
+    render_vm_sol,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+MEMBER = re.compile(r"\.\s*(\w+)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the compile time of variants of the generated Vm.sol")
+    parser.add_argument(
+            "--from",
+            metavar="PATH",
+            dest="path",
+            help="path to a json file containing the Vm interface, as generated by Foundry")
+    parser.add_argument(
+            "--variants",
+            default=",".join(VARIANTS),
+            help=f"comma-separated variants to compile (default: {','.join(VARIANTS)})")
+    parser.add_argument(
+            "--tests",
+            default="test/*.t.sol",
+            help="glob of the test contracts to compile, relative to the forge-std root (default: test/*.t.sol)")
+    parser.add_argument("--compiler", choices=["forge", "solc"], default="forge", help="how to compile (default: forge)")
+    parser.add_argument("--solc", metavar="PATH", help="solc binary, also passed to forge with --use")
+    parser.add_argument("--runs", type=int, default=5, help="number of timed compilations per variant")
+    parser.add_argument("--warmup", type=int, default=1, help="number of untimed compilations per variant")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    args = parser.parse_args()
+
+    names = [v.strip() for v in args.variants.split(",") if v.strip()]
+    for name in names:
+        assert name in VARIANTS, f"unknown variant {name!r}, expected one of {', '.join(VARIANTS)}"
+    tests = sorted(ROOT.glob(args.tests))
+    assert tests, f"no test contracts match {args.tests}"
+
+    contract = read_cheatcodes(args.path)
+    used = used_members([p for p in (ROOT / "src").glob("*.sol") if p.name != "Vm.sol"] + tests)
+    compile_cmd = command(args.compiler, args.solc, [t.relative_to(ROOT).as_posix() for t in tests])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        projects = {}
+        for name in names:
+            project = Path(tmp) / name
+            source = VARIANTS[name](contract, used)
+            scratch_project(project, tests, source)
+            projects[name] = (project, source)
+
+        results = {
+            name: {
+                "bytes": len(source.encode()),
+                "functions": len(re.findall(r"^\s*function ", source, re.M)),
+                "runs_ms": [],
+                "error": None,
+            }
+            for name, (_, source) in projects.items()
+        }
+        for trial in range(args.warmup + args.runs):
+            for name, (project, _) in projects.items():
+                result = results[name]
+                if result["error"] is not None:
+                    continue
+                elapsed, error = compile_once(compile_cmd, project)
+                if error is not None:
+                    result["error"] = error
+                elif trial >= args.warmup:
+                    result["runs_ms"].append(elapsed)
+
+    for name, result in results.items():
+        runs = result["runs_ms"]
+        if runs:
+            result["min_ms"] = min(runs)
+            result["median_ms"] = statistics.median(runs)
+            print(
+                f"{name:8} {result['functions']:4} functions {result['bytes'] / 1024:7.1f} KiB  "
+                f"min {result['min_ms']:8.1f} ms  median {result['median_ms']:8.1f} ms"
+            )
+        else:
+            print(f"{name:8} failed: {(result['error'] or 'no runs').splitlines()[0]}")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "compiler": compiler_version(args.compiler, args.solc),
+                    "command": compile_cmd,
+                    "tests": [t.relative_to(ROOT).as_posix() for t in tests],
+                    "runs": args.runs,
+                    "variants": results,
+                },
+                f,
+                indent=2,
+            )
+            f.write("\n")
+
+
+def render_full(contract: Cheatcodes, used: set[str]) -> str:
+    return render_vm_sol(contract)
+
+
+def render_lean(contract: Cheatcodes, used: set[str]) -> str:
+    return render_vm_sol(contract, profile="lean")
+
+
+def render_pruned(contract: Cheatcodes, used: set[str]) -> str:
+    pruned = copy.copy(contract)
+    pruned.cheatcodes = [c for c in contract.cheatcodes if function_name(c.func.declaration) in used]
+    return render_vm_sol(pruned)
+
+
+def render_no_docs(contract: Cheatcodes, used: set[str]) -> str:
+    def undocumented(item):
+        item = copy.copy(item)
+        item.description = ""
+        return item
+
+    bare = copy.copy(contract)
+    bare.events = [undocumented(e) for e in contract.events]
+    bare.enums = [undocumented(e) for e in contract.enums]
+    for enum in bare.enums:
+        enum.variants = [undocumented(v) for v in enum.variants]
+    bare.structs = [undocumented(s) for s in contract.structs]
+    for struct in bare.structs:
+        struct.fields = [undocumented(f) for f in struct.fields]
+    bare.cheatcodes = [copy.copy(c) for c in contract.cheatcodes]
+    for cheatcode in bare.cheatcodes:
+        cheatcode.func = undocumented(cheatcode.func)
+    return render_vm_sol(bare)
+
+
+def render_split(contract: Cheatcodes, used: set[str]) -> str:
+    """Renders the types into a `VmTypes` interface and the functions of each group into an interface
+    that inherits it, then declares `VmSafe` and `Vm` as the union of their groups."""
+    table = CheatcodeTable(contract.cheatcodes, use_numpy=False)
+    pp = CheatcodesPrinter(
+        spdx_identifier="MIT OR Apache-2.0",
+        solidity_requirement=">=0.6.2 <0.9.0",
+        abicoder_pragma=True,
+    )
+    pp.p_prelude()
+    pp.prelude = False
+    out = pp.finish()
+
+    types = Cheatcodes(errors=[], events=contract.events, enums=contract.enums, structs=contract.structs, cheatcodes=[])
+    pp.p_contract(types, "VmTypes")
+    out += "\n\n" + pp.finish()
+
+    for safety, name, doc in (("safe", "VmSafe", VM_SAFE_DOC), ("unsafe", "Vm", VM_DOC)):
+        groups: dict[str, list] = {}
+        for cheatcode in table.select(safety=safety, exclude_status=HIDDEN_STATUSES):
+            groups.setdefault(cheatcode.group, []).append(cheatcode)
+        parents = ["VmSafe"] if safety == "unsafe" else []
+        for g, cheatcodes in groups.items():
+            parent = name + re.sub(r"\W", "", group(g))
+            pp.p_contract(Cheatcodes(errors=[], events=[], enums=[], structs=[], cheatcodes=cheatcodes), parent, "VmTypes")
+            out += "\n\n" + pp.finish()
+            parents.append(parent)
+        out += "\n\n" + doc
+        pp.p_contract(Cheatcodes(errors=[], events=[], enums=[], structs=[], cheatcodes=[]), name, ", ".join(parents))
+        out += pp.finish()
+
+    return external_params_to_calldata(out)
+
+
+VARIANTS = {
+    "full": render_full,
+    "pruned": render_pruned,
+    "split": render_split,
+    "no-docs": render_no_docs,
+    "lean": render_lean,
+}
+
+
+def function_name(declaration: str) -> str:
+    return declaration[len("function ") : declaration.index("(")].strip()
+
+
+def used_members(paths: list[Path]) -> set[str]:
+    """Returns every identifier accessed as a member in `paths`, a superset of the cheatcodes they call."""
+    used = set()
+    for path in paths:
+        used.update(MEMBER.findall(path.read_text()))
+    return used
+
+
+def scratch_project(project: Path, tests: list[Path], vm_sol: str):
+    shutil.copytree(ROOT / "src", project / "src")
+    (project / OUT_PATH).write_text(vm_sol)
+    for test in tests:
+        target = project / test.relative_to(ROOT)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(test, target)
+    shutil.copyfile(ROOT / "foundry.toml", project / "foundry.toml")
+
+
+def command(compiler: str, solc: str | None, tests: list[str]) -> list[str]:
+    if compiler == "forge":
+        cmd = ["forge", "build", "--force", "--skip", "script"]
+        if solc is not None:
+            cmd += ["--use", solc]
+        return cmd
+    # The same optimizer settings as foundry.toml.
+    return [solc or "solc", "--optimize", "--optimize-runs", "200", "--base-path", ".", "--bin", *tests]
+
+
+def compile_once(cmd: list[str], project: Path) -> tuple[float, str | None]:
+    start = time.perf_counter()
+    res = subprocess.run(cmd, cwd=project, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if res.returncode != 0:
+        return elapsed, res.stderr.strip() or f"exit status {res.returncode}"
+    return elapsed, None
+
+
+def compiler_version(compiler: str, solc: str | None) -> str:
+    cmd = [solc or "solc", "--version"] if compiler == "solc" else ["forge", "--version"]
+    res = subprocess.run(cmd, capture_output=True, text=True)
+    return res.stdout.strip().splitlines()[-1] if res.returncode == 0 and res.stdout.strip() else ""
+
+
+if __name__ == "__main__":
+    main()
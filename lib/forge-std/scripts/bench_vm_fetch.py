@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Measures how much of the spec download is hidden by decoding it as it arrives.
+
+Serves a local spec through a throttled HTTP server, then times the plain
+download-then-parse path against `vm_fetch.fetch_spec`, which builds the
+model from each chunk while the rest is still in flight. With `--drop`, the
+server cuts the first connections halfway to exercise the retries.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import request
+
+from vm import Cheatcodes
+from vm_fetch import fetch_spec
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the pipelined download of the cheatcodes spec")
+    parser.add_argument(
+            "--from",
+            metavar="PATH",
+            dest="path",
+            required=True,
+            help="path to a json file containing the Vm interface, as generated by Foundry")
+    parser.add_argument("--rate", type=float, default=2048, help="bandwidth of the server in KiB/s (default: 2048)")
+    parser.add_argument("--chunk", type=int, default=16 * 1024, help="size of each write of the server (default: 16384)")
+    parser.add_argument("--runs", type=int, default=5, help="number of runs of each path")
+    parser.add_argument("--drop", type=int, default=0, help="cut the first DROP connections halfway")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        body = f.read()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), throttled_handler(body, args.rate * 1024, args.chunk, args.drop))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/cheatcodes.json"
+
+    try:
+        if args.drop:
+            start = time.perf_counter()
+            spec = fetch_spec(url)
+            print(f"fetched {len(spec.contract.cheatcodes)} cheatcodes in {time.perf_counter() - start:.2f}s despite {args.drop} dropped connections")
+            return
+
+        parse = timed(lambda: Cheatcodes.from_json(body), args.runs)
+        download = timed(lambda: request.urlopen(url).read(), args.runs)
+        sequential = timed(lambda: Cheatcodes.from_json(request.urlopen(url).read().decode("utf-8")), args.runs)
+        pipelined = timed(lambda: fetch_spec(url).contract, args.runs)
+    finally:
+        server.shutdown()
+
+    print(f"{len(body) / 1024:.0f} KiB at {args.rate:g} KiB/s, median of {args.runs} runs")
+    print(f"  download only:    {download:8.1f} ms")
+    print(f"  parse only:       {parse:8.1f} ms")
+    print(f"  download + parse: {sequential:8.1f} ms")
+    print(f"  pipelined:        {pipelined:8.1f} ms")
+
+
+def timed(f, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        f()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def throttled_handler(body: bytes, rate: float, chunk: int, drop: int) -> type:
+    dropped = [0]
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                cut = dropped[0] < drop
+                dropped[0] += cut
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            end = len(body) // 2 if cut else len(body)
+            start = time.perf_counter()
+            for offset in range(0, end, chunk):
+                self.wfile.write(body[offset : min(offset + chunk, end)])
+                self.wfile.flush()
+                # Sleep until the bytes sent so far fit the bandwidth.
+                delay = (offset + chunk) / rate - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            if cut:
+                self.close_connection = True
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Measures where the parallel model loader beats `Cheatcodes.from_json`.
+
+Scales a spec up by repeating its cheatcodes, then times the sequential
+loader against `vm_load.load_parallel` for every number of jobs, checking
+that both build the same model.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from vm import Cheatcodes, content_key
+from vm_load import load_parallel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the parallel loading of the cheatcodes spec")
+    parser.add_argument(
+            "--from",
+            metavar="PATH",
+            dest="path",
+            required=True,
+            help="path to a json file containing the Vm interface, as generated by Foundry")
+    parser.add_argument(
+            "--scale",
+            type=int,
+            nargs="+",
+            default=[1, 10, 40],
+            help="number of copies of the cheatcodes in each generated spec (default: 1 10 40)")
+    parser.add_argument(
+            "--jobs",
+            type=int,
+            nargs="+",
+            default=sorted({2, 4, os.cpu_count() or 1}),
+            help="numbers of worker processes to compare (default: 2, 4 and the number of CPUs)")
+    parser.add_argument("--runs", type=int, default=5, help="number of runs of each loader")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        spec = json.load(f)
+
+    results = []
+    print(f"{os.cpu_count()} CPUs, median of {args.runs} runs")
+    for scale in args.scale:
+        text = json.dumps({**spec, "cheatcodes": spec["cheatcodes"] * scale}, indent=2)
+        expected = content_key(Cheatcodes.from_json(text).cheatcodes)
+        sequential = timed(lambda: Cheatcodes.from_json(text), args.runs)
+        row = {"scale": scale, "bytes": len(text), "sequential_ms": sequential, "parallel_ms": {}}
+        print(f"{len(text) / 1024 / 1024:6.1f} MiB  sequential {sequential:8.1f} ms")
+        for jobs in args.jobs:
+            contract = load_parallel(text, jobs, min_size=0)
+            assert content_key(contract.cheatcodes) == expected, f"{jobs} jobs built a different model"
+            parallel = timed(lambda: load_parallel(text, jobs, min_size=0), args.runs)
+            row["parallel_ms"][jobs] = parallel
+            print(f"{'':12}{jobs:2} jobs   {parallel:8.1f} ms  ({sequential / parallel:.2f}x)")
+        results.append(row)
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump({"cpus": os.cpu_count(), "runs": args.runs, "results": results}, f, indent=2)
+
+
+def timed(f, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        f()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    main()
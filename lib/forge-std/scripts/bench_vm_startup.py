@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Measures the cold start of `scripts/vm.py --from PATH`.
+
+Runs the script in a scratch directory with `-X importtime` to list what it
+imports, then times repeated end-to-end runs. `forge fmt` is replaced by a
+no-op so that only the script itself is measured.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+VM_PY = Path(__file__).resolve().parent / "vm.py"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold start of scripts/vm.py")
+    parser.add_argument(
+            "--from",
+            metavar="PATH",
+            dest="path",
+            required=True,
+            help="path to a json file containing the Vm interface, as generated by Foundry")
+    parser.add_argument("--runs", type=int, default=20, help="number of end-to-end runs")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    args = parser.parse_args()
+
+    spec = str(Path(args.path).resolve())
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = Path(tmp)
+        env = scratch_env(scratch)
+        imports = importtime(scratch, env, spec)
+        wall = [run_once(scratch, env, spec) for _ in range(args.runs)]
+
+    top = sorted(imports, key=lambda i: i[1], reverse=True)[: args.top]
+    results = {
+        "python": sys.version.split()[0],
+        "modules": len(imports),
+        "import_us": sum(cumulative for _, cumulative in imports),
+        "top_imports": [{"module": m, "cumulative_us": c} for m, c in top],
+        "wall_ms": {
+            "runs": args.runs,
+            "min": min(wall),
+            "median": statistics.median(wall),
+        },
+    }
+
+    print(f"{results['modules']} top-level imports, {results['import_us'] / 1000:.1f} ms")
+    for module, cumulative in top:
+        print(f"  {cumulative / 1000:7.1f} ms  {module}")
+    print(f"end-to-end: min {min(wall):.1f} ms, median {statistics.median(wall):.1f} ms over {args.runs} runs")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+
+def scratch_env(scratch: Path) -> dict:
+    (scratch / "src").mkdir()
+    bin = scratch / "bin"
+    bin.mkdir()
+    forge = bin / "forge"
+    forge.write_text("#!/bin/sh\nexit 0\n")
+    forge.chmod(0o755)
+
+    env = dict(os.environ)
+    env["PATH"] = f"{bin}{os.pathsep}{env.get('PATH', '')}"
+    return env
+
+
+def importtime(scratch: Path, env: dict, spec: str) -> list[tuple[str, int]]:
+    """Returns `(module, cumulative µs)` of every top-level import made by one run."""
+    cmd = [sys.executable, "-X", "importtime", str(VM_PY), "--from", spec]
+    res = subprocess.run(cmd, cwd=scratch, env=env, capture_output=True, text=True)
+    assert res.returncode == 0, f"command failed: {cmd}\n{res.stderr}"
+
+    imports = []
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Nested imports are indented below the module that triggered them.
+        if not name[1:].startswith(" "):
+            imports.append((name.strip(), int(cumulative)))
+    return imports
+
+
+def run_once(scratch: Path, env: dict, spec: str) -> float:
+    cmd = [sys.executable, str(VM_PY), "--from", spec]
+    start = time.perf_counter()
+    res = subprocess.run(cmd, cwd=scratch, env=env, stdout=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+    assert res.returncode == 0, f"command failed: {cmd}"
+    return elapsed * 1000
+
+
+if __name__ == "__main__":
+    main()
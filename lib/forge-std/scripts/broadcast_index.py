@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""Incrementally indexes the forge script runs of a project.
+
+`forge script --broadcast` writes every run twice: the transactions and
+receipts to `<broadcast>/<Script>.s.sol/<chainId>/run-<timestamp>.json`, and
+the RPC each transaction was sent to, to the same path under the cache
+directory (`cache_path` in `foundry.toml`). This tool indexes both into a
+SQLite database, re-reading only the files whose size, modification time and
+hash changed, and streaming through them so that large runs are never loaded
+whole.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from pathlib import Path
+from typing import IO, Iterator
+
+INDEX_PATH = "cache/broadcast-index.sqlite"
+RUN_FILE = re.compile(r"run-(\d+)\.json")
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run TEXT PRIMARY KEY,
+    script TEXT NOT NULL,
+    chain INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    commit_hash TEXT,
+    transactions INTEGER NOT NULL,
+    successful INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_script ON runs (script, chain, timestamp);
+CREATE INDEX IF NOT EXISTS runs_chain ON runs (chain, timestamp);
+CREATE TABLE IF NOT EXISTS transactions (
+    run TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    hash TEXT,
+    type TEXT,
+    contract_name TEXT,
+    contract_address TEXT,
+    function TEXT,
+    sender TEXT,
+    status INTEGER,
+    block_number INTEGER,
+    PRIMARY KEY (run, position)
+);
+CREATE INDEX IF NOT EXISTS transactions_hash ON transactions (hash);
+CREATE INDEX IF NOT EXISTS transactions_contract ON transactions (contract_name, type);
+CREATE TABLE IF NOT EXISTS rpcs (
+    run TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    rpc TEXT NOT NULL,
+    PRIMARY KEY (run, position)
+);
+CREATE INDEX IF NOT EXISTS rpcs_rpc ON rpcs (rpc);
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the forge script runs of a project")
+    parser.add_argument("--root", default=".", help="project root, containing foundry.toml (default: .)")
+    parser.add_argument(
+            "--db",
+            metavar="PATH",
+            help=f"path to the index, relative to the project root (default: {INDEX_PATH})")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    commands.add_parser("update", help="index new and changed runs (the default)")
+
+    latest = commands.add_parser(
+            "latest",
+            help="show the latest successful run of a script, or deployment of a contract")
+    target = latest.add_mutually_exclusive_group(required=True)
+    target.add_argument("--script", help="script file name, e.g. 'DeployAvaIP.s.sol'")
+    target.add_argument("--contract", help="contract name, e.g. 'AvaCharacter'")
+    latest.add_argument("--chain", type=int, help="chain id, e.g. 1315")
+
+    tx = commands.add_parser("tx", help="show the run that sent a transaction")
+    tx.add_argument("hash", help="transaction hash")
+
+    args = parser.parse_args()
+    root = Path(args.root)
+    index = RunIndex.open(root / (args.db or INDEX_PATH))
+    indexed, unchanged, removed = index.update(root)
+
+    if args.command in (None, "update"):
+        print(f"Indexed {indexed} files, {unchanged} unchanged, {removed} removed")
+    elif args.command == "latest":
+        if args.script is not None:
+            row = index.latest_run(args.script, args.chain)
+            if row is not None:
+                run, timestamp, commit = row
+                print(f"{run}\ttimestamp {timestamp}\tcommit {commit}")
+                for tx_row in index.run_transactions(run):
+                    print("\t".join(str(v) for v in tx_row))
+        else:
+            row = index.latest_deployment(args.contract, args.chain)
+            if row is not None:
+                print("\t".join(str(v) for v in row))
+        if row is None:
+            print("No successful run found")
+    elif args.command == "tx":
+        for row in index.transaction(args.hash):
+            print("\t".join(str(v) for v in row))
+
+    index.close()
+
+
+def foundry_dirs(root: Path) -> tuple[Path, Path]:
+    """Returns the broadcast and cache directories configured in `root`'s `foundry.toml`."""
+    broadcast, cache = "broadcast", "cache"
+    foundry_toml = root / "foundry.toml"
+    if foundry_toml.is_file():
+        try:
+            import tomllib
+        except ImportError:
+            tomllib = None
+        if tomllib is not None:
+            profile = tomllib.loads(foundry_toml.read_text()).get("profile", {}).get("default", {})
+            broadcast = profile.get("broadcast", broadcast)
+            cache = profile.get("cache_path", cache)
+    return root / broadcast, root / cache
+
+
+def run_files(directory: Path) -> Iterator[tuple[str, Path]]:
+    """Yields `(run, path)` for every `<Script>/<chainId>/run-<timestamp>.json` under `directory`.
+
+    `run-latest.json` copies the newest timestamped run and is skipped.
+    """
+    if not directory.is_dir():
+        return
+    for script in os.scandir(directory):
+        if not script.is_dir():
+            continue
+        for chain in os.scandir(script.path):
+            if not chain.is_dir() or not chain.name.isdigit():
+                continue
+            for entry in os.scandir(chain.path):
+                if entry.is_file() and RUN_FILE.fullmatch(entry.name):
+                    yield f"{script.name}/{chain.name}/{entry.name}", Path(entry.path)
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 16) -> str:
+    """Returns the sha256 of `path`, read in chunks so that large runs are never loaded whole."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class JsonStream:
+    """Reads the members of a json object one value at a time from a text file.
+
+    Only one value is held in memory at a time, and the elements of arrays
+    listed in `arrays` are yielded one by one instead of as a whole.
+    """
+
+    WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+    f: IO[str]
+    chunk_size: int
+    buf: str
+    pos: int
+
+    def __init__(self, f: IO[str], chunk_size: int = 1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            self.pos = self.WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("unexpected end of json")
+
+    def _expect(self, chars: str) -> str:
+        c = self._peek()
+        if c not in chars:
+            raise ValueError(f"expected one of {chars!r}, found {c!r}")
+        self.pos += 1
+        return c
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer might continue in the next chunk.
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self, arrays: tuple[str, ...] = ()) -> Iterator[tuple[str, object]]:
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key in arrays and self._peek() == "[":
+                self.pos += 1
+                if self._peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self._value()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                yield key, self._value()
+            if self._expect(",}") == "}":
+                return
+
+
+def hex_int(value) -> int | None:
+    return int(value, 16) if isinstance(value, str) and value.startswith("0x") else value
+
+
+class RunIndex:
+    conn: sqlite3.Connection
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    @staticmethod
+    def open(path: Path) -> "RunIndex":
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path)
+        (schema_version,) = conn.execute("PRAGMA user_version").fetchone()
+        if schema_version < 1:
+            # Version 0 didn't record the kind of each file, so it is indexed again from scratch.
+            conn.executescript(
+                "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS runs;"
+                " DROP TABLE IF EXISTS transactions; DROP TABLE IF EXISTS rpcs;"
+            )
+        conn.executescript(SCHEMA)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        return RunIndex(conn)
+
+    def close(self):
+        self.conn.close()
+
+    def update(self, root: Path) -> tuple[int, int, int]:
+        """Indexes every new or changed run file, returning `(indexed, unchanged, removed)` file counts."""
+        broadcast, cache = foundry_dirs(root)
+        known = {path: (size, mtime, sha, kind) for path, kind, size, mtime, sha in self.conn.execute("SELECT * FROM files")}
+        seen = set()
+        indexed = unchanged = 0
+
+        for kind, directory in (("broadcast", broadcast), ("cache", cache)):
+            for run, path in run_files(directory):
+                # The cache directory may be outside of the project.
+                key = os.path.relpath(path, root)
+                seen.add(key)
+                st = path.stat()
+                old = known.get(key)
+                if old is not None and old[:2] == (st.st_size, st.st_mtime_ns):
+                    unchanged += 1
+                    continue
+                sha = file_sha256(path)
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", (key, kind, st.st_size, st.st_mtime_ns, sha)
+                    )
+                    if old is not None and old[2] == sha:
+                        # Touched but not modified.
+                        unchanged += 1
+                        continue
+                    if kind == "broadcast":
+                        self._index_broadcast(run, path)
+                    else:
+                        self._index_rpcs(run, path)
+                indexed += 1
+
+        removed = [key for key in known if key not in seen]
+        with self.conn:
+            for key in removed:
+                self.conn.execute("DELETE FROM files WHERE path = ?", (key,))
+                run = "/".join(Path(key).parts[-3:])
+                table = "rpcs" if known[key][3] == "cache" else "transactions"
+                self.conn.execute(f"DELETE FROM {table} WHERE run = ?", (run,))
+                if table == "transactions":
+                    self.conn.execute("DELETE FROM runs WHERE run = ?", (run,))
+        return indexed, unchanged, len(removed)
+
+    def _index_broadcast(self, run: str, path: Path):
+        script, chain, name = run.split("/")
+        conn = self.conn
+        conn.execute("DELETE FROM transactions WHERE run = ?", (run,))
+        meta = {"timestamp": int(RUN_FILE.fullmatch(name).group(1)), "chain": int(chain), "commit": None}
+        transactions = successful = 0
+        with open(path) as f:
+            for key, value in JsonStream(f).members(arrays=("transactions", "receipts")):
+                if key == "transactions":
+                    tx = value.get("transaction") or {}
+                    conn.execute(
+                        "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, NULL)",
+                        (
+                            run,
+                            transactions,
+                            value.get("hash"),
+                            value.get("transactionType"),
+                            value.get("contractName"),
+                            value.get("contractAddress"),
+                            value.get("function"),
+                            tx.get("from"),
+                        ),
+                    )
+                    transactions += 1
+                elif key == "receipts":
+                    status = hex_int(value.get("status"))
+                    successful += status == 1
+                    conn.execute(
+                        "UPDATE transactions SET status = ?, block_number = ? WHERE run = ? AND hash = ?",
+                        (status, hex_int(value.get("blockNumber")), run, value.get("transactionHash")),
+                    )
+                elif key in meta:
+                    meta[key] = value
+        conn.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run, script, meta["chain"], meta["timestamp"], meta["commit"], transactions, successful),
+        )
+
+    def _index_rpcs(self, run: str, path: Path):
+        self.conn.execute("DELETE FROM rpcs WHERE run = ?", (run,))
+        position = 0
+        with open(path) as f:
+            for key, value in JsonStream(f).members(arrays=("transactions",)):
+                if key != "transactions":
+                    continue
+                if isinstance(value, dict) and value.get("rpc") is not None:
+                    self.conn.execute("INSERT INTO rpcs VALUES (?, ?, ?)", (run, position, value["rpc"]))
+                position += 1
+
+    def latest_run(self, script: str, chain: int | None = None) -> tuple[str, int, str | None] | None:
+        """Returns `(run, timestamp, commit)` of the latest run of `script` whose transactions all succeeded."""
+        sql = "SELECT run, timestamp, commit_hash FROM runs WHERE script = ? AND transactions > 0 AND successful = transactions"
+        params: list = [script]
+        if chain is not None:
+            sql += " AND chain = ?"
+            params.append(chain)
+        return self.conn.execute(sql + " ORDER BY timestamp DESC LIMIT 1", params).fetchone()
+
+    def latest_deployment(self, contract: str, chain: int | None = None) -> tuple | None:
+        """Returns `(run, timestamp, address, hash, rpc)` of the latest successful deployment of `contract`."""
+        sql = """
+            SELECT t.run, r.timestamp, t.contract_address, t.hash, p.rpc FROM transactions t
+            JOIN runs r ON r.run = t.run
+            LEFT JOIN rpcs p ON p.run = t.run AND p.position = t.position
+            WHERE t.contract_name = ? AND t.type IN ('CREATE', 'CREATE2') AND t.status = 1
+        """
+        params: list = [contract]
+        if chain is not None:
+            sql += " AND r.chain = ?"
+            params.append(chain)
+        return self.conn.execute(sql + " ORDER BY r.timestamp DESC LIMIT 1", params).fetchone()
+
+    def run_transactions(self, run: str) -> list[tuple]:
+        """Returns `(hash, type, contract, address, function, status, rpc)` for every transaction of `run`."""
+        sql = """
+            SELECT t.hash, t.type, t.contract_name, t.contract_address, t.function, t.status, p.rpc
+            FROM transactions t LEFT JOIN rpcs p ON p.run = t.run AND p.position = t.position
+            WHERE t.run = ? ORDER BY t.position
+        """
+        return self.conn.execute(sql, (run,)).fetchall()
+
+    def transaction(self, hash: str) -> list[tuple]:
+        """Returns `(run, position, type, contract, function, status, block, rpc)` for every run that sent `hash`."""
+        sql = """
+            SELECT t.run, t.position, t.type, t.contract_name, t.function, t.status, t.block_number, p.rpc
+            FROM transactions t LEFT JOIN rpcs p ON p.run = t.run AND p.position = t.position
+            WHERE t.hash = ? ORDER BY t.run
+        """
+        return self.conn.execute(sql, (hash.lower(),)).fetchall()
+
+
+if __name__ == "__main__":
+    main()
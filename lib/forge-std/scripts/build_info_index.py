@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""Incrementally indexes the build-info files of a forge project.
+
+Build-info files are named by opaque build ids and can be hundreds of MB when
+they carry the compiler input and output. This tool memory-maps each one and
+only decodes what it needs: the `id` and `source_id_to_path` header fields,
+and a hash of every source's raw `content` when the compiler input is
+included. Builds without their input fall back to the content hashes forge
+records in `solidity-files-cache.json`. The results are kept in a SQLite index
+that maps source paths to the builds that compiled them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+INDEX_PATH = "cache/build-info-index.sqlite"
+FILES_CACHE = "solidity-files-cache.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id TEXT PRIMARY KEY,
+    file TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    language TEXT
+);
+CREATE TABLE IF NOT EXISTS sources (
+    build_id TEXT NOT NULL REFERENCES builds (id),
+    source_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    source_hash TEXT,
+    PRIMARY KEY (build_id, source_id)
+);
+CREATE INDEX IF NOT EXISTS sources_path ON sources (path);
+CREATE TABLE IF NOT EXISTS artifacts (
+    contract TEXT NOT NULL,
+    path TEXT NOT NULL,
+    version TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    artifact TEXT NOT NULL,
+    build_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_contract ON artifacts (contract);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+WHITESPACE = re.compile(rb"[ \t\n\r]*")
+INPUT_SOURCES = re.compile(rb'"input"\s*:\s*\{\s*(?:"language"\s*:\s*"[^"]*"\s*,\s*)?"sources"\s*:\s*\{')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the build-info files of a forge project")
+    parser.add_argument("--root", default=".", help="project root, containing foundry.toml (default: .)")
+    parser.add_argument(
+            "--db",
+            metavar="PATH",
+            help=f"path to the index, relative to the project root (default: {INDEX_PATH})")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    commands.add_parser("update", help="index new and changed build-info files (the default)")
+    which = commands.add_parser("which", help="list the builds that compiled a source file")
+    which.add_argument("path", help="source path as seen by the compiler, e.g. 'lib/forge-std/src/Vm.sol'")
+    changes = commands.add_parser("changes", help="show whether a source file changed between builds")
+    changes.add_argument("path", help="source path as seen by the compiler, e.g. 'lib/forge-std/src/Vm.sol'")
+    contract = commands.add_parser("contract", help="show the build that produced a contract's artifact")
+    contract.add_argument("name", help="contract name, e.g. 'AvaCharacter'")
+
+    args = parser.parse_args()
+    root = Path(args.root)
+    out, cache = foundry_dirs(root)
+    index = BuildInfoIndex.open(root / (args.db or INDEX_PATH))
+    indexed, unchanged, removed = index.update(out / "build-info", cache / FILES_CACHE)
+
+    if args.command in (None, "update"):
+        print(f"Indexed {indexed} build-info files, {unchanged} unchanged, {removed} removed")
+    elif args.command == "which":
+        for row in index.builds_for(args.path):
+            print("\t".join(str(v) for v in row))
+    elif args.command == "changes":
+        for build_id, source_hash, change in index.changes(args.path):
+            print(f"{build_id}\t{source_hash}\t{change}")
+    elif args.command == "contract":
+        for row in index.contract(args.name):
+            print("\t".join(str(v) for v in row))
+
+    index.close()
+
+
+def foundry_dirs(root: Path) -> tuple[Path, Path]:
+    """Returns the artifacts and cache directories configured in `root`'s `foundry.toml`."""
+    out, cache = "out", "cache"
+    foundry_toml = root / "foundry.toml"
+    if foundry_toml.is_file():
+        try:
+            import tomllib
+        except ImportError:
+            tomllib = None
+        if tomllib is not None:
+            profile = tomllib.loads(foundry_toml.read_text()).get("profile", {}).get("default", {})
+            out = profile.get("out", out)
+            cache = profile.get("cache_path", cache)
+    return root / out, root / cache
+
+
+class BuildInfoHeader:
+    id: str
+    language: str | None
+    source_id_to_path: dict[int, str]
+    source_hashes: dict[str, str]
+
+    def __init__(self, id: str, language: str | None, source_id_to_path: dict[int, str], source_hashes: dict[str, str]):
+        self.id = id
+        self.language = language
+        self.source_id_to_path = source_id_to_path
+        self.source_hashes = source_hashes
+
+    @staticmethod
+    def read(path: Path) -> "BuildInfoHeader":
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f"{path} is empty")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                header = read_header(mm, {b"id", b"language", b"source_id_to_path"})
+                # Forge names build-info files after their id.
+                id = header.get("id", path.stem)
+                mapping = header.get("source_id_to_path")
+                if mapping is None:
+                    mapping = find_value(mm, rb'"source_id_to_path"\s*:\s*') or {}
+                return BuildInfoHeader(
+                    id,
+                    header.get("language"),
+                    {int(k): v for k, v in mapping.items()},
+                    input_source_hashes(mm),
+                )
+
+
+def decode_at(mm: mmap.mmap, pos: int):
+    """Decodes the json value starting at `pos`, returning it and the position after it.
+
+    Only a window around the value is decoded, growing until the value fits.
+    """
+    decoder = json.JSONDecoder()
+    window = 1 << 16
+    while True:
+        chunk = mm[pos : pos + window].decode("utf-8", errors="ignore")
+        try:
+            value, end = decoder.raw_decode(chunk)
+        except json.JSONDecodeError:
+            if pos + window >= len(mm):
+                raise
+            window *= 4
+            continue
+        return value, pos + len(chunk[:end].encode())
+
+
+def read_header(mm: mmap.mmap, wanted: set[bytes]) -> dict:
+    """Reads the leading scalar and small members of the top-level object.
+
+    Stops at the first large object or array that is not wanted, so that the
+    compiler input and output are never decoded.
+    """
+    found: dict = {}
+    pos = WHITESPACE.match(mm, 0).end()
+    if mm[pos : pos + 1] != b"{":
+        return found
+    pos += 1
+    while wanted - found.keys():
+        pos = WHITESPACE.match(mm, pos).end()
+        if mm[pos : pos + 1] != b'"':
+            break
+        end = mm.find(b'"', pos + 1)
+        key = mm[pos + 1 : end]
+        pos = WHITESPACE.match(mm, end + 1).end()
+        if mm[pos : pos + 1] != b":":
+            break
+        pos = WHITESPACE.match(mm, pos + 1).end()
+        if key not in wanted and mm[pos : pos + 1] in (b"{", b"["):
+            break
+        value, pos = decode_at(mm, pos)
+        if key in wanted:
+            found[key] = value
+        pos = WHITESPACE.match(mm, pos).end()
+        if mm[pos : pos + 1] != b",":
+            break
+        pos += 1
+    return {k.decode(): v for k, v in found.items()}
+
+
+def find_value(mm: mmap.mmap, key_pattern: bytes):
+    m = re.compile(key_pattern).search(mm)
+    if m is None:
+        return None
+    return decode_at(mm, m.end())[0]
+
+
+def string_end(mm: mmap.mmap, pos: int) -> int:
+    """Returns the position of the closing quote of the json string whose content starts at `pos`."""
+    while True:
+        end = mm.find(b'"', pos)
+        if end < 0:
+            raise ValueError("unterminated json string")
+        backslashes = 0
+        while mm[end - 1 - backslashes] == 0x5C:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return end
+        pos = end + 1
+
+
+def input_source_hashes(mm: mmap.mmap) -> dict[str, str]:
+    """Returns `path -> sha256` of the raw (escaped) content of every source in the compiler input."""
+    m = INPUT_SOURCES.search(mm)
+    if m is None:
+        return {}
+    hashes = {}
+    pos = m.end()
+    while True:
+        pos = WHITESPACE.match(mm, pos).end()
+        if mm[pos : pos + 1] != b'"':
+            break
+        path, pos = decode_at(mm, pos)
+        pos = WHITESPACE.match(mm, pos).end() + 1  # :
+        pos = WHITESPACE.match(mm, pos).end() + 1  # {
+        while True:
+            pos = WHITESPACE.match(mm, pos).end()
+            if mm[pos : pos + 1] == b"}":
+                pos += 1
+                break
+            key, pos = decode_at(mm, pos)
+            pos = WHITESPACE.match(mm, pos).end() + 1  # :
+            pos = WHITESPACE.match(mm, pos).end()
+            if key == "content" and mm[pos : pos + 1] == b'"':
+                end = string_end(mm, pos + 1)
+                hashes[path] = "sha256:" + hashlib.sha256(mm[pos + 1 : end]).hexdigest()
+                pos = end + 1
+            else:
+                _, pos = decode_at(mm, pos)
+            pos = WHITESPACE.match(mm, pos).end()
+            if mm[pos : pos + 1] == b",":
+                pos += 1
+        pos = WHITESPACE.match(mm, pos).end()
+        if mm[pos : pos + 1] != b",":
+            break
+        pos += 1
+    return hashes
+
+
+class BuildInfoIndex:
+    conn: sqlite3.Connection
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    @staticmethod
+    def open(path: Path) -> "BuildInfoIndex":
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        return BuildInfoIndex(conn)
+
+    def close(self):
+        self.conn.close()
+
+    def update(self, build_info: Path, files_cache: Path) -> tuple[int, int, int]:
+        """Indexes new and changed build-info files, returning `(indexed, unchanged, removed)` counts."""
+        conn = self.conn
+        known = {file: (id, size, mtime) for id, file, size, mtime in conn.execute("SELECT id, file, size, mtime_ns FROM builds")}
+        seen = set()
+        indexed = unchanged = 0
+
+        entries = sorted(os.scandir(build_info), key=lambda e: e.name) if build_info.is_dir() else []
+        for entry in entries:
+            if not entry.name.endswith(".json") or not entry.is_file():
+                continue
+            seen.add(entry.name)
+            st = entry.stat()
+            old = known.get(entry.name)
+            if old is not None and old[1:] == (st.st_size, st.st_mtime_ns):
+                unchanged += 1
+                continue
+            header = BuildInfoHeader.read(Path(entry.path))
+            with conn:
+                if old is not None:
+                    self._delete(old[0])
+                conn.execute(
+                    "INSERT OR REPLACE INTO builds VALUES (?, ?, ?, ?, ?)",
+                    (header.id, entry.name, st.st_size, st.st_mtime_ns, header.language),
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                    [
+                        (header.id, source_id, path, header.source_hashes.get(path))
+                        for source_id, path in header.source_id_to_path.items()
+                    ],
+                )
+            indexed += 1
+
+        removed = [file for file in known if file not in seen]
+        with conn:
+            for file in removed:
+                self._delete(known[file][0])
+
+        if indexed or removed or self._files_cache_changed(files_cache):
+            self._apply_files_cache(files_cache)
+        return indexed, unchanged, len(removed)
+
+    def _delete(self, build_id: str):
+        self.conn.execute("DELETE FROM sources WHERE build_id = ?", (build_id,))
+        self.conn.execute("DELETE FROM builds WHERE id = ?", (build_id,))
+
+    def _files_cache_changed(self, files_cache: Path) -> bool:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'files_cache'").fetchone()
+        return (row[0] if row else None) != self._files_cache_stamp(files_cache)
+
+    @staticmethod
+    def _files_cache_stamp(files_cache: Path) -> str:
+        try:
+            st = files_cache.stat()
+        except FileNotFoundError:
+            return ""
+        return f"{st.st_size}:{st.st_mtime_ns}"
+
+    def _apply_files_cache(self, files_cache: Path):
+        """Records the artifacts of `solidity-files-cache.json`, and its content hashes for sources
+        whose build-info didn't include the compiler input."""
+        conn = self.conn
+        with conn:
+            conn.execute("DELETE FROM artifacts")
+            if files_cache.is_file():
+                with open(files_cache) as f:
+                    files = json.load(f).get("files", {})
+                for path, entry in files.items():
+                    content_hash = entry.get("contentHash")
+                    for contract, versions in entry.get("artifacts", {}).items():
+                        for version, profiles in versions.items():
+                            for profile, artifact in profiles.items():
+                                build_id = artifact.get("build_id")
+                                if build_id is None:
+                                    continue
+                                conn.execute(
+                                    "INSERT INTO artifacts VALUES (?, ?, ?, ?, ?, ?)",
+                                    (contract, path, version, profile, artifact.get("path", ""), build_id),
+                                )
+                                if content_hash is not None:
+                                    conn.execute(
+                                        "UPDATE sources SET source_hash = ? WHERE build_id = ? AND path = ? AND source_hash IS NULL",
+                                        (f"forge:{content_hash}", build_id, path),
+                                    )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('files_cache', ?)", (self._files_cache_stamp(files_cache),)
+            )
+
+    def builds_for(self, path: str) -> list[tuple]:
+        """Returns `(build_id, file, source_id, source_hash)` of every build that compiled `path`, oldest first."""
+        sql = """
+            SELECT b.id, b.file, s.source_id, s.source_hash FROM sources s JOIN builds b ON b.id = s.build_id
+            WHERE s.path = ? ORDER BY b.mtime_ns, b.id
+        """
+        return self.conn.execute(sql, (path,)).fetchall()
+
+    def changes(self, path: str) -> list[tuple[str, str | None, str]]:
+        """Returns `(build_id, source_hash, change)` for every build that compiled `path`, oldest first."""
+        changes = []
+        previous = None
+        for build_id, _, _, source_hash in self.builds_for(path):
+            if source_hash is None or previous is None:
+                change = "unknown" if source_hash is None else "first"
+            elif previous.split(":")[0] != source_hash.split(":")[0]:
+                change = "unknown"
+            else:
+                change = "unchanged" if previous == source_hash else "changed"
+            changes.append((build_id, source_hash, change))
+            if source_hash is not None:
+                previous = source_hash
+        return changes
+
+    def contract(self, name: str) -> list[tuple]:
+        """Returns `(build_id, file, path, version, profile, artifact)` for every artifact of contract `name`."""
+        sql = """
+            SELECT a.build_id, b.file, a.path, a.version, a.profile, a.artifact FROM artifacts a
+            LEFT JOIN builds b ON b.id = a.build_id WHERE a.contract = ? ORDER BY a.path, a.version, a.profile
+        """
+        return self.conn.execute(sql, (name,)).fetchall()
+
+
+if __name__ == "__main__":
+    main()
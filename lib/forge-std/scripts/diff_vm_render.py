@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Checks that every rendering path of `vm.py` prints exactly what the frozen reference prints.
+
+Renders random specs from `vm_randspec.py`, and optionally a given spec,
+with `vm_reference.render_reference` and with each path of the current
+generator: the plain model, the parallel loader, the decoder that parses
+the spec while it downloads (fed in random chunk sizes), the worker pool,
+and the section cache, both cold and warm. Outputs are compared byte for
+byte, before `forge fmt`, and every path is timed against the reference.
+Exits with status 1 if any output differs.
+"""
+
+from __future__ import annotations
+
+import argparse
+import difflib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from vm import Cheatcodes, SectionCache, render_vm_sol
+from vm_fetch import CHUNK_SIZE, SpecDecoder
+from vm_load import load_parallel
+from vm_randspec import random_spec
+from vm_reference import render_reference
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the outputs of vm.py with its frozen reference")
+    parser.add_argument(
+            "--from",
+            metavar="PATH",
+            dest="path",
+            help="also compare on a json file containing the Vm interface, as generated by Foundry")
+    parser.add_argument("--specs", type=int, default=20, help="number of random specs (default: 20)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first random spec, incremented for the next ones")
+    parser.add_argument("--cheatcodes", type=int, default=300, help="number of cheatcodes in each random spec (default: 300)")
+    parser.add_argument("--jobs", type=int, default=2, help="worker processes of the parallel paths (default: 2)")
+    parser.add_argument("--runs", type=int, default=3, help="number of timed runs of each path and spec")
+    parser.add_argument(
+            "--keep",
+            metavar="DIR",
+            default="cache/vm-diff",
+            help="where to write the spec and both outputs of a mismatch (default: cache/vm-diff)")
+    parser.add_argument("--json", metavar="PATH", help="also write the timings to PATH")
+    args = parser.parse_args()
+
+    cases = [(f"seed {args.seed + i}", args.seed + i) for i in range(args.specs)]
+    if args.path is not None:
+        cases.insert(0, (args.path, None))
+
+    paths = {"reference": render_reference, **optimized_paths(args.jobs, random.Random(args.seed))}
+    times: dict[str, list[float]] = {name: [] for name in paths}
+    failures = 0
+    for case, seed in cases:
+        if seed is None:
+            text = Path(case).read_text()
+        else:
+            text = json.dumps(random_spec(random.Random(seed), args.cheatcodes), indent=2)
+        expected = render_reference(text)
+        for name, render in paths.items():
+            out = render(text)
+            if out != expected:
+                failures += 1
+                report_mismatch(case, name, text, expected, out, Path(args.keep))
+            times[name].append(timed(lambda: render(text), args.runs))
+
+    reference_ms = sum(times["reference"])
+    print(f"{len(cases)} specs, median of {args.runs} runs, total over the specs:")
+    for name, ms in times.items():
+        print(f"  {name:22} {sum(ms):9.1f} ms  ({reference_ms / sum(ms):.2f}x the reference)")
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump({"cpus": os.cpu_count(), "specs": [c for c, _ in cases], "runs": args.runs, "ms": times}, f, indent=2)
+    if failures:
+        print(f"{failures} outputs differ from the reference")
+        sys.exit(1)
+    print("All outputs match the reference")
+
+
+def optimized_paths(jobs: int, rng: random.Random) -> dict:
+    """Returns the rendering paths of the current generator, each from the spec's text to Vm.sol.
+
+    `rng` draws the chunk sizes that the incremental decoder is fed with.
+    """
+
+    def model(text: str) -> str:
+        return render_vm_sol(Cheatcodes.from_json(text))
+
+    def load_jobs(text: str) -> str:
+        return render_vm_sol(load_parallel(text, jobs, min_size=0))
+
+    def spec_decoder(text: str) -> str:
+        decoder = SpecDecoder()
+        pos = 0
+        while pos < len(text):
+            # From single characters up to a whole chunk of the download.
+            size = int(2 ** rng.uniform(0, CHUNK_SIZE.bit_length() - 1))
+            decoder.feed(text[pos : pos + size])
+            pos += size
+        return render_vm_sol(decoder.finish())
+
+    def render_jobs(text: str) -> str:
+        return render_vm_sol(Cheatcodes.from_json(text), jobs=jobs)
+
+    def section_cache(text: str) -> str:
+        cache = SectionCache()
+        cold = render_vm_sol(Cheatcodes.from_json(text), section_cache=cache)
+        cache.rotate()
+        warm = render_vm_sol(Cheatcodes.from_json(text), section_cache=cache)
+        # Either of them differing from the reference is a mismatch.
+        return warm if warm == cold else f"{cold}\n\n// warm render:\n{warm}"
+
+    return {
+        "model": model,
+        f"--load-jobs {jobs}": load_jobs,
+        "SpecDecoder": spec_decoder,
+        f"--render-jobs {jobs}": render_jobs,
+        "section cache": section_cache,
+    }
+
+
+def report_mismatch(case: str, name: str, text: str, expected: str, out: str, keep: Path):
+    slug = "".join(c if c.isalnum() else "-" for c in f"{case}-{name}").strip("-")
+    keep.mkdir(parents=True, exist_ok=True)
+    (keep / f"{slug}.json").write_text(text)
+    (keep / f"{slug}.reference.sol").write_text(expected)
+    (keep / f"{slug}.sol").write_text(out)
+    print(f"MISMATCH {case}: {name} differs from the reference, written to {keep / slug}.*")
+    diff = difflib.unified_diff(expected.splitlines(), out.splitlines(), "reference", name, n=1, lineterm="")
+    for line in list(diff)[:20]:
+        print(f"    {line}")
+
+
+def timed(f, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        f()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    main()
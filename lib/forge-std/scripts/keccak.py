@@ -0,0 +1,91 @@
+"""Keccak-256, as used by Ethereum for selectors and event topics.
+
+`hashlib.sha3_256` pads differently and gives other digests. PyCryptodome is
+used when it is installed; otherwise this falls back to a pure Python
+implementation, which takes about half a millisecond per signature, so
+selectors are memoized.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+RATE = 136
+MASK = (1 << 64) - 1
+ROUND_CONSTANTS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+# Rotation of lane `x + 5 * y`, and where the rho and pi steps move it.
+ROTATIONS = [0, 1, 62, 28, 27, 36, 44, 6, 55, 20, 3, 10, 43, 25, 39, 41, 45, 15, 21, 8, 18, 2, 61, 56, 14]
+PI_STEPS = [
+    (x + 5 * y, y + 5 * ((2 * x + 3 * y) % 5), x, ROTATIONS[x + 5 * y], 64 - ROTATIONS[x + 5 * y])
+    for y in range(5)
+    for x in range(5)
+]
+
+
+def _keccak_f(a: list[int]):
+    b = [0] * 25
+    for rc in ROUND_CONSTANTS:
+        # theta
+        c0 = a[0] ^ a[5] ^ a[10] ^ a[15] ^ a[20]
+        c1 = a[1] ^ a[6] ^ a[11] ^ a[16] ^ a[21]
+        c2 = a[2] ^ a[7] ^ a[12] ^ a[17] ^ a[22]
+        c3 = a[3] ^ a[8] ^ a[13] ^ a[18] ^ a[23]
+        c4 = a[4] ^ a[9] ^ a[14] ^ a[19] ^ a[24]
+        d = (
+            c4 ^ (((c1 << 1) | (c1 >> 63)) & MASK),
+            c0 ^ (((c2 << 1) | (c2 >> 63)) & MASK),
+            c1 ^ (((c3 << 1) | (c3 >> 63)) & MASK),
+            c2 ^ (((c4 << 1) | (c4 >> 63)) & MASK),
+            c3 ^ (((c0 << 1) | (c0 >> 63)) & MASK),
+        )
+        # rho and pi
+        for src, dst, x, r, l in PI_STEPS:
+            v = a[src] ^ d[x]
+            b[dst] = ((v << r) | (v >> l)) & MASK
+        # chi
+        for y in (0, 5, 10, 15, 20):
+            b0, b1, b2, b3, b4 = b[y : y + 5]
+            a[y] = b0 ^ (~b1 & b2)
+            a[y + 1] = b1 ^ (~b2 & b3)
+            a[y + 2] = b2 ^ (~b3 & b4)
+            a[y + 3] = b3 ^ (~b4 & b0)
+            a[y + 4] = b4 ^ (~b0 & b1)
+        # iota
+        a[0] ^= rc
+
+
+def _keccak256(data: bytes) -> bytes:
+    padded = bytearray(data)
+    padded.append(0x01)
+    padded.extend(b"\0" * (-len(padded) % RATE))
+    padded[-1] |= 0x80
+    a = [0] * 25
+    for offset in range(0, len(padded), RATE):
+        for i in range(RATE // 8):
+            a[i] ^= int.from_bytes(padded[offset + 8 * i : offset + 8 * i + 8], "little")
+        _keccak_f(a)
+    return b"".join(lane.to_bytes(8, "little") for lane in a[:4])
+
+
+def _pycryptodome():
+    try:
+        from Crypto.Hash import keccak
+    except ImportError:
+        return None
+    return lambda data: keccak.new(data=data, digest_bits=256).digest()
+
+
+keccak256 = _pycryptodome() or _keccak256
+
+
+@lru_cache(maxsize=None)
+def selector(signature: str) -> bytes:
+    """Returns the 4-byte selector of a function or error signature, e.g. `prank(address)`."""
+    return keccak256(signature.encode())[:4]
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""Merges every 4-byte selector and event topic a project knows about into one database.
+
+The selectors come from the cheatcodes spec (with `--from`), the ABI files
+of the project (`abis/` by default) and its compiled artifacts (`out/`,
+without the build-info files). Function selectors are taken from the
+artifacts' `methodIdentifiers` where present; all others, and the topic0 of
+events, are hashed from the canonical signature. Two files are written:
+
+- `cache/selectors.json`, the merged table: for functions and errors, each
+  selector with its signatures, and for events, each topic0 with the
+  signature and parameters of every variant (e.g. ERC-20 and ERC-721
+  `Transfer` only differ in which parameters are indexed). It is all a
+  decoder needs to load, after which decoding calldata, revert data or a
+  log is a single dict lookup.
+- `cache/selectors.sources.json`, the entries of every source with its size
+  and mtime, so that an update only re-reads the sources that changed.
+
+Selectors with more than one signature, across functions and errors, are
+reported as collisions.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+import abi
+from keccak import keccak256, selector
+
+DB_PATH = "cache/selectors.json"
+ABIS_DIR = "abis"
+KINDS = ("function", "error")
+SPEC_DECLARATION = re.compile(r"(error|event)\s+(\w+)\s*\(")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the selectors of a project into one database")
+    parser.add_argument("--root", default=".", help="project root, containing foundry.toml (default: .)")
+    parser.add_argument(
+            "--db",
+            metavar="PATH",
+            help=f"path to the merged table, relative to the project root (default: {DB_PATH})")
+    parser.add_argument(
+            "--from",
+            metavar="PATH",
+            dest="path",
+            help="path to a json file containing the Vm interface, as generated by Foundry")
+    parser.add_argument(
+            "--abis",
+            metavar="DIR",
+            default=ABIS_DIR,
+            help=f"directory of ABI files, relative to the project root (default: {ABIS_DIR})")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    commands.add_parser("update", help="re-read new and changed sources (the default)")
+    decode = commands.add_parser("decode", help="name the function or error of calldata or revert data")
+    decode.add_argument("data", help="hex calldata, revert data or selector, e.g. '0xca669fa7...'")
+    commands.add_parser("collisions", help="list the selectors with more than one signature")
+    log = commands.add_parser("log", help="decode an event log")
+    log.add_argument("topics", nargs="+", help="hex topics of the log, topic0 first")
+    log.add_argument("--data", default="0x", help="hex data of the log (default: 0x)")
+    logs = commands.add_parser("logs", help="decode every log of a broadcast run or a JSON list of logs")
+    logs.add_argument("file", help="e.g. 'broadcast/Deploy.s.sol/1315/run-latest.json'")
+
+    args = parser.parse_args()
+    root = Path(args.root)
+    db_path = root / (args.db or DB_PATH)
+
+    if args.command in (None, "update"):
+        sources = SourceIndex.load(sources_path(db_path))
+        read, unchanged, removed = sources.update(root, args.path, root / args.abis)
+        table = sources.merge()
+        if read or removed or not db_path.is_file():
+            sources.save()
+            table.save(db_path)
+        print(f"Read {read} sources, {unchanged} unchanged, {removed} removed; {len(table)} selectors and topics")
+        for kind, sel, signatures in table.collisions():
+            print(f"collision: {kind} 0x{sel}: {', '.join(signatures)}", file=sys.stderr)
+    elif args.command == "decode":
+        table = SelectorTable.load(db_path)
+        found = table.decode(args.data)
+        for kind, signature in found:
+            print(f"{kind}\t{signature}")
+        if not found:
+            sys.exit(1)
+    elif args.command == "collisions":
+        for kind, sel, signatures in SelectorTable.load(db_path).collisions():
+            print(f"{kind}\t0x{sel}\t" + "\t".join(signatures))
+    elif args.command == "log":
+        decoded = SelectorTable.load(db_path).decode_log(args.topics, args.data)
+        print(json.dumps(decoded))
+        if decoded is None:
+            sys.exit(1)
+    elif args.command == "logs":
+        table = SelectorTable.load(db_path)
+        with open(args.file) as f:
+            d = json.load(f)
+        receipts = d.get("receipts", []) if isinstance(d, dict) else [{"logs": d}]
+        for receipt in receipts:
+            for log in receipt.get("logs", []):
+                decoded = table.decode_log(log.get("topics", []), log.get("data", "0x"))
+                print(json.dumps({"address": log.get("address"), "transactionHash": receipt.get("transactionHash"), "event": decoded}))
+
+
+def sources_path(db_path: Path) -> Path:
+    return db_path.with_name(db_path.stem + ".sources.json")
+
+
+def artifacts_dir(root: Path) -> Path:
+    """Returns the artifacts directory configured in `root`'s `foundry.toml`."""
+    out = "out"
+    foundry_toml = root / "foundry.toml"
+    if foundry_toml.is_file():
+        try:
+            import tomllib
+        except ImportError:
+            tomllib = None
+        if tomllib is not None:
+            out = tomllib.loads(foundry_toml.read_text()).get("profile", {}).get("default", {}).get("out", out)
+    return root / out
+
+
+def canonical_type(param: dict) -> str:
+    """Returns the canonical ABI type of an ABI parameter, expanding tuples, e.g. `(address,uint256)[]`."""
+    ty = param["type"]
+    if ty.startswith("tuple"):
+        return "(" + ",".join(canonical_type(c) for c in param.get("components", [])) + ")" + ty[len("tuple") :]
+    return ty
+
+
+def abi_entries(abi: list[dict], method_identifiers: dict[str, str] | None = None) -> list[list]:
+    """Returns `[kind, selector, signature]` of the functions and errors of `abi`, and
+    `["event", topic0, signature, params]` of its events, see `event_entry`."""
+    entries = []
+    if method_identifiers is not None:
+        entries.extend(["function", sel, signature] for signature, sel in method_identifiers.items())
+    for item in abi:
+        kind = item.get("type")
+        if kind == "event":
+            if not item.get("anonymous"):
+                params = [[p.get("name", ""), canonical_type(p), bool(p.get("indexed"))] for p in item.get("inputs", [])]
+                entries.append(event_entry(item["name"], params))
+            continue
+        if kind not in KINDS or (kind == "function" and method_identifiers is not None):
+            continue
+        signature = f"{item['name']}({','.join(canonical_type(p) for p in item.get('inputs', []))})"
+        entries.append([kind, selector(signature).hex(), signature])
+    return entries
+
+
+def event_entry(name: str, params: list[list]) -> list:
+    """Returns the entry of an event with `[name, canonical type, indexed]` params."""
+    signature = f"{name}({','.join(ty for _, ty, _ in params)})"
+    return ["event", keccak256(signature.encode()).hex(), signature, params]
+
+
+def spec_entries(path: str) -> list[list]:
+    """Returns the entries of the cheatcodes, errors and events of the spec at `path`, see `abi_entries`."""
+    from vm import Declaration, read_cheatcodes
+    from vm_check import CanonicalTypes
+
+    contract = read_cheatcodes(path)
+    entries = [["function", cc.func.selector[2:], cc.func.signature] for cc in contract.cheatcodes]
+    types = CanonicalTypes(contract)
+    for item in (*contract.errors, *contract.events):
+        m = SPEC_DECLARATION.match(item.declaration)
+        assert m is not None, f"not an error or event declaration: {item.declaration}"
+        param_list = item.declaration[m.end() - 1 :]
+        tokens = re.findall(Declaration.TOKEN, param_list)
+        # `indexed` sits where the parser expects a data location.
+        indexed = []
+        for i, token in enumerate(tokens):
+            if token == "indexed":
+                indexed.append(sum(t == "," for t in tokens[:i]))
+        params = Declaration.parse_params(re.sub(r"\bindexed\b", "", param_list))
+        kind, name = m.groups()
+        if kind == "event":
+            entries.append(event_entry(name, [[p.name, types.of(p.ty), i in indexed] for i, p in enumerate(params)]))
+        else:
+            signature = f"{name}({','.join(types.of(p.ty) for p in params)})"
+            entries.append(["error", selector(signature).hex(), signature])
+    return entries
+
+
+class SourceIndex:
+    """The entries of every source, with the size and mtime they were read at."""
+
+    VERSION = 2
+
+    path: Path
+    # Source name -> `[size, mtime_ns, entries]`.
+    sources: dict[str, list]
+
+    def __init__(self, path: Path, sources: dict[str, list]):
+        self.path = path
+        self.sources = sources
+
+    @staticmethod
+    def load(path: Path) -> "SourceIndex":
+        try:
+            with open(path) as f:
+                d = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return SourceIndex(path, {})
+        if d.get("version") != SourceIndex.VERSION:
+            return SourceIndex(path, {})
+        return SourceIndex(path, d["sources"])
+
+    def save(self):
+        write_json(self.path, {"version": self.VERSION, "sources": self.sources})
+
+    def update(self, root: Path, spec: str | None, abis: Path) -> tuple[int, int, int]:
+        """Re-reads the sources that are new or changed, returning `(read, unchanged, removed)` counts.
+
+        Without a `spec`, the entries of the last spec read are kept.
+        """
+        old = self.sources
+        self.sources = {}
+        read = unchanged = 0
+
+        files = []
+        if spec is not None:
+            files.append((f"spec:{Path(spec).as_posix()}", Path(spec), "spec"))
+        else:
+            for name, entry in old.items():
+                if name.startswith("spec:"):
+                    self.sources[name] = entry
+                    unchanged += 1
+        if abis.is_dir():
+            files.extend((rel(path, root), path, "abi") for path in sorted(abis.glob("*.json")))
+        out = artifacts_dir(root)
+        if out.is_dir():
+            for dirpath, dirnames, filenames in os.walk(out):
+                dirnames[:] = sorted(d for d in dirnames if d != "build-info")
+                files.extend(
+                    (rel(Path(dirpath, name), root), Path(dirpath, name), "artifact")
+                    for name in sorted(filenames)
+                    if name.endswith(".json")
+                )
+
+        for name, path, kind in files:
+            st = path.stat()
+            entry = old.get(name)
+            if entry is not None and entry[:2] == [st.st_size, st.st_mtime_ns]:
+                self.sources[name] = entry
+                unchanged += 1
+                continue
+            self.sources[name] = [st.st_size, st.st_mtime_ns, read_entries(path, kind)]
+            read += 1
+        return read, unchanged, len(old.keys() - self.sources.keys())
+
+    def merge(self) -> "SelectorTable":
+        """Merges the entries of every source, in a stable order."""
+        table: dict[str, dict[str, list]] = {kind: {} for kind in (*KINDS, "event")}
+        for name in sorted(self.sources):
+            for kind, key, *value in self.sources[name][2]:
+                # Functions and errors are listed by signature, events with their params.
+                value = value[0] if kind in KINDS else value
+                values = table[kind].setdefault(key, [])
+                if value not in values:
+                    values.append(value)
+        return SelectorTable({kind: dict(sorted(by_key.items())) for kind, by_key in table.items()})
+
+
+def read_entries(path: Path, kind: str) -> list[list]:
+    if kind == "spec":
+        return spec_entries(str(path))
+    with open(path) as f:
+        d = json.load(f)
+    if kind == "abi" and isinstance(d, list):
+        return abi_entries(d)
+    if not isinstance(d, dict) or not isinstance(d.get("abi"), list):
+        return []
+    return abi_entries(d["abi"], d.get("methodIdentifiers"))
+
+
+class SelectorTable:
+    """Signatures by kind and lowercase hex selector, without `0x`.
+
+    Events are keyed by their topic0 instead, and list `[signature, params]`
+    variants.
+    """
+
+    VERSION = 2
+
+    table: dict[str, dict[str, list]]
+
+    def __init__(self, table: dict[str, dict[str, list]]):
+        self.table = table
+
+    def __len__(self) -> int:
+        return sum(len(by_key) for by_key in self.table.values())
+
+    @staticmethod
+    def load(path: Path) -> "SelectorTable":
+        with open(path) as f:
+            d = json.load(f)
+        assert d.get("version") == SelectorTable.VERSION, f"unsupported database version in {path}"
+        return SelectorTable({kind: d[kind] for kind in (*KINDS, "event")})
+
+    def save(self, path: Path):
+        write_json(path, {"version": self.VERSION, **self.table})
+
+    def decode(self, data: str | bytes) -> list[tuple[str, str]]:
+        """Returns `(kind, signature)` of everything the selector of `data` may stand for, functions first."""
+        if isinstance(data, str):
+            data = data.removeprefix("0x").removeprefix("0X")[:8].lower()
+        else:
+            data = data[:4].hex()
+        return [(kind, signature) for kind in KINDS for signature in self.table[kind].get(data, [])]
+
+    def decode_log(self, topics: list[str], data: str) -> dict | None:
+        """Decodes a log by its topic0, or returns None if no known event matches it.
+
+        Of the variants of the event, the one with as many indexed parameters
+        as the log has further topics is used. The arguments are listed in
+        declaration order as `{name, type, indexed, value}`, as parameters may
+        be unnamed or share a name. Indexed parameters of dynamic types are
+        only logged as their hash, which is returned as is.
+        """
+        variants = self.table["event"].get(topics[0].removeprefix("0x").lower()) if topics else None
+        for signature, params in variants or []:
+            if sum(1 for p in params if p[2]) != len(topics) - 1:
+                continue
+            unindexed = [ty for _, ty, is_indexed in params if not is_indexed]
+            values = iter(abi.decode(unindexed, bytes.fromhex(data.removeprefix("0x"))))
+            indexed_topics = iter(topics[1:])
+            args = []
+            for name, ty, is_indexed in params:
+                if is_indexed:
+                    word = bytes.fromhex(next(indexed_topics).removeprefix("0x"))
+                    hashed = abi.is_dynamic(ty) or ty.startswith("(") or ty.endswith("]")
+                    value = "0x" + word.hex() if hashed else abi.decode_word(ty, word)
+                else:
+                    value = next(values)
+                args.append({"name": name, "type": ty, "indexed": is_indexed, "value": value})
+            return {"event": signature, "args": args}
+        return None
+
+    def collisions(self) -> list[tuple[str, str, list[str]]]:
+        """Returns `(kind, selector, signatures)` of every selector with more than one signature.
+
+        Functions and errors share one selector space, as `decode` cannot tell
+        calldata from revert data; a selector of both has the kind `function/error`.
+        """
+        by_selector: dict[str, list[tuple[str, str]]] = {}
+        for kind in KINDS:
+            for sel, signatures in self.table[kind].items():
+                by_selector.setdefault(sel, []).extend((kind, signature) for signature in signatures)
+        collisions = []
+        for sel, variants in sorted(by_selector.items()):
+            if len(variants) > 1:
+                kinds = "/".join(kind for kind in KINDS if any(k == kind for k, _ in variants))
+                collisions.append((kinds, sel, [signature for _, signature in variants]))
+        # Variants of one event that only differ in which parameters are indexed share their topic0 by design.
+        collisions.extend(
+            ("event", topic, signatures)
+            for topic, variants in self.table["event"].items()
+            if len(signatures := sorted({signature for signature, _ in variants})) > 1
+        )
+        return collisions
+
+
+def rel(path: Path, root: Path) -> str:
+    return Path(os.path.relpath(path, root)).as_posix()
+
+
+def write_json(path: Path, d: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(json.dumps(d, separators=(",", ":")))
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    main()
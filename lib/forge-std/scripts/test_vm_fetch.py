@@ -0,0 +1,79 @@
+"""Tests of the incremental spec decoder that `vm_fetch.fetch_spec` feeds while downloading.
+
+Run from this directory with `python -m unittest` or `python -m pytest`.
+"""
+
+import json
+import random
+import unittest
+
+from vm import Cheatcodes, content_key
+from vm_fetch import SpecDecoder
+from vm_randspec import random_spec
+
+
+def decode_in_chunks(text: str, sizes) -> Cheatcodes:
+    decoder = SpecDecoder()
+    pos = 0
+    while pos < len(text):
+        size = next(sizes)
+        decoder.feed(text[pos : pos + size])
+        pos += size
+    return decoder.finish()
+
+
+class SpecDecoderTest(unittest.TestCase):
+    def test_chunk_boundaries(self):
+        for seed in range(5):
+            rng = random.Random(seed)
+            spec = random_spec(rng, 12)
+            # Members the decoder skips, including a number that a boundary can split.
+            spec["version"] = 1234567
+            spec["meta"] = {"cheatcodes": [1, 2], "s": "]}"}
+            text = json.dumps(spec, indent=rng.choice([None, 2]))
+            expected = content_key(Cheatcodes.from_json(text))
+            for limit in [1, 7, 64, len(text)]:
+                sizes = iter(lambda: rng.randint(1, limit), None)
+                with self.subTest(seed=seed, limit=limit):
+                    self.assertEqual(content_key(decode_in_chunks(text, sizes)), expected)
+
+    def test_every_split(self):
+        text = json.dumps(random_spec(random.Random(0), 3))
+        expected = content_key(Cheatcodes.from_json(text))
+        for i in range(len(text) + 1):
+            decoder = SpecDecoder()
+            decoder.feed(text[:i])
+            decoder.feed(text[i:])
+            self.assertEqual(content_key(decoder.finish()), expected, f"split at {i}")
+
+    def test_repeated_member(self):
+        spec = random_spec(random.Random(1), 4)
+        text = json.dumps(spec)
+        repeated = text[:-1] + ', "cheatcodes": ' + json.dumps(spec["cheatcodes"][:1]) + "}"
+        decoded = decode_in_chunks(repeated, iter(lambda: 5, None))
+        self.assertEqual(content_key(decoded), content_key(Cheatcodes.from_json(repeated)))
+
+    def test_missing_array(self):
+        spec = random_spec(random.Random(2), 4)
+        del spec["cheatcodes"]
+        text = json.dumps(spec)
+        with self.assertRaises(KeyError):
+            Cheatcodes.from_json(text)
+        with self.assertRaisesRegex(AssertionError, "cheatcodes"):
+            decode_in_chunks(text, iter(lambda: 100, None))
+
+    def test_not_an_array(self):
+        spec = random_spec(random.Random(3), 4)
+        spec["enums"] = None
+        with self.assertRaisesRegex(AssertionError, "enums"):
+            decode_in_chunks(json.dumps(spec), iter(lambda: 100, None))
+
+    def test_truncated(self):
+        text = json.dumps(random_spec(random.Random(4), 4))
+        for end in [0, 1, len(text) // 2, len(text) - 1]:
+            with self.subTest(end=end), self.assertRaises((AssertionError, ValueError)):
+                decode_in_chunks(text[:end], iter(lambda: 100, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
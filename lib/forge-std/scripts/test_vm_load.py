@@ -0,0 +1,38 @@
+"""Tests of the parallel model loader behind `vm.py --load-jobs`.
+
+Run from this directory with `python -m unittest` or `python -m pytest`.
+"""
+
+import json
+import random
+import unittest
+
+from vm import Cheatcodes, content_key
+from vm_load import load_parallel
+from vm_randspec import random_spec
+
+
+class LoadParallelTest(unittest.TestCase):
+    def test_same_model(self):
+        for seed in range(3):
+            text = json.dumps(random_spec(random.Random(seed), 40), indent=2)
+            with self.subTest(seed=seed):
+                self.assertEqual(content_key(load_parallel(text, 2, min_size=0)), content_key(Cheatcodes.from_json(text)))
+
+    def test_missing_array(self):
+        for key in ["errors", "cheatcodes"]:
+            spec = random_spec(random.Random(1), 4)
+            del spec[key]
+            with self.subTest(key=key), self.assertRaisesRegex(AssertionError, f"has no {key}"):
+                load_parallel(json.dumps(spec), 2, min_size=0)
+
+    def test_not_an_array(self):
+        for key in ["enums", "cheatcodes"]:
+            spec = random_spec(random.Random(2), 4)
+            spec[key] = None
+            with self.subTest(key=key), self.assertRaisesRegex(AssertionError, f"expected '{key}' to be an array"):
+                load_parallel(json.dumps(spec), 2, min_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Tests of the call scanner shared by `vm.py usage` and `vm.py safety`.
+
+Run from this directory with `python -m unittest` or `python -m pytest`.
+"""
+
+import unittest
+
+from vm_usage import blank_comments_and_strings, scan
+
+
+class ScanTest(unittest.TestCase):
+    def test_calls(self):
+        source = b"""contract C {
+    function run() public {
+        vm.startBroadcast();
+        vm.deal(a, 1 ether);
+        vm.label(a, "x, y");
+        myvm.etch(a, b);
+    }
+}
+"""
+        self.assertEqual(scan(source), [["startBroadcast", 3, 0], ["deal", 4, 2], ["label", 5, 2]])
+
+    def test_comment_marker_in_string(self):
+        source = b'string memory u = "http://x"; vm.etch(a, b);\nvm.deal(a, 1);\n'
+        self.assertEqual(scan(source), [["etch", 1, 2], ["deal", 2, 2]])
+
+    def test_comment_marker_in_char_string(self):
+        source = b"string memory u = 'a/*b'; vm.etch(a, b); // '*/ vm.prank(a);\n"
+        self.assertEqual(scan(source), [["etch", 1, 2]])
+
+    def test_line_comment(self):
+        source = b"vm.startBroadcast(); // vm.deal(a, 1);\n// vm.etch(a, b);\n"
+        self.assertEqual(scan(source), [["startBroadcast", 1, 0]])
+
+    def test_block_comment(self):
+        source = b"""/*
+vm.deal(a, 1);
+ * vm.etch(a, "*/");
+*/ vm.prank(a); /* vm.roll(1); */ vm.warp(1);
+/** @dev vm.store(a, s, v); */
+"""
+        # The `*/` in the "string" of the comment ends it.
+        self.assertEqual(scan(source), [["prank", 4, 1], ["warp", 4, 1]])
+
+    def test_quotes_in_comment(self):
+        source = b"// don't call vm.etch\nvm.deal(a, 1); // it's fine\nvm.prank(a);\n"
+        self.assertEqual(scan(source), [["deal", 2, 2], ["prank", 3, 1]])
+
+    def test_unterminated_block_comment(self):
+        self.assertEqual(scan(b"vm.deal(a, 1);\n/* vm.etch(a, b);\nvm.prank(a);\n"), [["deal", 1, 2]])
+
+    def test_strings_keep_arity(self):
+        source = b'vm.setEnv("a,b", \'c)d\');\nvm.envOr("K", "");\nvm.parseJson(json, "$.a[\\"b, c\\"]");\n'
+        self.assertEqual(scan(source), [["setEnv", 1, 2], ["envOr", 2, 2], ["parseJson", 3, 2]])
+
+    def test_blank_keeps_offsets(self):
+        source = b'a = "x\\"//y"; // c\n/* d\ne */ b;'
+        blanked = blank_comments_and_strings(source)
+        self.assertEqual(len(blanked), len(source))
+        self.assertEqual(blanked, b'a = "      ";     \n    \n     b;')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,19 +1,33 @@
 #!/usr/bin/env python3
 
-import argparse
-import copy
+from __future__ import annotations
+
 import json
-import re
-import subprocess
+import sys
 from enum import Enum as PyEnum
-from pathlib import Path
-from typing import Callable
-from urllib import request
 
-VoidFn = Callable[[], None]
+# Everything else is imported where it is used, so that the plain `--from PATH` invocation stays cheap to start.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import argparse
+    from pathlib import Path
+    from typing import Callable, Sequence
+
+    VoidFn = Callable[[], None]
 
 CHEATCODES_JSON_URL = "https://raw.githubusercontent.com/foundry-rs/foundry/master/crates/cheatcodes/assets/cheatcodes.json"
 OUT_PATH = "src/Vm.sol"
+CATALOG_PATH = "cache/cheatcodes.sqlite"
+HISTORY_PATH = "cache/vm-history"
+STORE_PATH = "cache/vm-store"
+INDEX_PATH = "cache/vm-index.json"
+USAGE_CACHE_PATH = "cache/vm-usage.json"
+CODECS_PATH = "cache/vm_structs.py"
+SAFETY_CACHE_PATH = "cache/vm-safety.json"
+# Cheatcodes with these statuses are left out of Vm.sol.
+HIDDEN_STATUSES = ["experimental", "internal"]
+# How Vm.sol is printed: `lean` leaves out the comments, group headers and indentation, for builds that nobody reads.
+PROFILES = ["default", "lean"]
 
 VM_SAFE_DOC = """\
 /// The `VmSafe` interface does not allow manipulation of the EVM state or other actions that may
@@ -28,30 +42,357 @@ VM_DOC = """\
 
 
 def main():
+    argv = sys.argv[1:]
+    if not argv or (len(argv) == 2 and argv[0] == "--from" and not argv[1].startswith("-")):
+        # The plain `vm.py [--from PATH]` invocation doesn't need argparse.
+        generate(read_cheatcodes(argv[1] if argv else None))
+        return
+
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    import argparse
+
     parser = argparse.ArgumentParser(
             description="Generate Vm.sol based on the cheatcodes json created by Foundry")
+    add_from_argument(parser)
+    parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="regenerate whenever the file passed to --from changes")
+    parser.add_argument(
+            "--debounce",
+            metavar="MS",
+            type=float,
+            default=50,
+            help="with --watch, wait for MS milliseconds without changes before regenerating (default: 50)")
+    parser.add_argument(
+            "--store",
+            metavar="DIR",
+            nargs="?",
+            const=STORE_PATH,
+            help=f"copy Vm.sol from the store in DIR if it holds the same inputs, else add it there (default: {STORE_PATH})")
+    add_store_size_argument(parser, "--store-max-size")
+    parser.add_argument(
+            "--index",
+            metavar="PATH",
+            nargs="?",
+            const=INDEX_PATH,
+            help=f"also write the byte and line range of every declaration of Vm.sol to PATH (default: {INDEX_PATH})")
+    parser.add_argument(
+            "--store-link",
+            action="store_true",
+            help="with --store, hardlink Vm.sol to the store instead of copying it when possible")
+    parser.add_argument(
+            "--load-jobs",
+            metavar="N",
+            type=int,
+            help="build the model of a large spec with N worker processes")
+    parser.add_argument(
+            "--render-jobs",
+            metavar="N",
+            type=int,
+            help="render the sections of Vm.sol with N worker processes")
+    parser.add_argument(
+            "--profile",
+            choices=PROFILES,
+            default="default",
+            help="'lean' prints Vm.sol without comments, group headers or formatting, with the same ABI (default: default)")
+    parser.set_defaults(func=cmd_generate)
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    catalog = commands.add_parser(
+            "catalog",
+            help="export the cheatcodes into a SQLite catalog")
+    add_from_argument(catalog, argparse.SUPPRESS)
+    add_db_argument(catalog)
+    catalog.set_defaults(func=lazy_command("vm_catalog", "cmd_catalog"))
+
+    search = commands.add_parser(
+            "search",
+            help="full-text search over the descriptions in the SQLite catalog")
+    add_from_argument(search, argparse.SUPPRESS)
+    add_db_argument(search)
+    search.add_argument("text", help="FTS5 query, e.g. 'prank OR broadcast'")
+    search.add_argument("--limit", type=int, default=20, help="maximum number of results")
+    add_refresh_argument(search)
+    search.set_defaults(func=lazy_command("vm_catalog", "cmd_search"))
+
+    query = commands.add_parser(
+            "query",
+            help="query the cheatcodes in the SQLite catalog")
+    add_from_argument(query, argparse.SUPPRESS)
+    add_db_argument(query)
+    query.add_argument("--name", help="function name, e.g. 'prank'")
+    query.add_argument("--group", help="cheatcode group, e.g. 'evm'")
+    query.add_argument("--status", help="cheatcode status, e.g. 'deprecated'")
+    query.add_argument("--safety", choices=["safe", "unsafe"], help="cheatcode safety")
+    query.add_argument("--selector", help="4-byte function selector, e.g. '0xca669fa7'")
+    query.add_argument("--param-type", metavar="TYPE", help="type of any parameter, as declared, e.g. 'address'")
+    query.add_argument("--returns", metavar="TYPE", help="type of any return value, as declared, e.g. 'bytes32[]'")
+    add_refresh_argument(query)
+    query.set_defaults(func=lazy_command("vm_catalog", "cmd_query"))
+
+    history = commands.add_parser(
+            "history",
+            help="record and query the history of cheatcodes specs")
+    add_from_argument(history, argparse.SUPPRESS)
+    history.add_argument(
+            "--store",
+            metavar="PATH",
+            default=HISTORY_PATH,
+            help=f"path to the history store (default: {HISTORY_PATH})")
+    history_commands = history.add_subparsers(dest="history_command", metavar="ACTION", required=True)
+    record = history_commands.add_parser("record", help="record the cheatcodes spec as a new version")
+    record.add_argument("--label", default="", help="free-form label, e.g. the forge-std version")
+    record.set_defaults(func=lazy_command("vm_history", "cmd_history_record"))
+    log = history_commands.add_parser("log", help="list the recorded versions")
+    log.set_defaults(func=lazy_command("vm_history", "cmd_history_log"))
+    selector = history_commands.add_parser("selector", help="show when a selector was added, changed or removed")
+    selector.add_argument("selector", help="4-byte function selector, e.g. '0xca669fa7'")
+    selector.set_defaults(func=lazy_command("vm_history", "cmd_history_selector"))
+    show = history_commands.add_parser("show", help="render Vm.sol as of a recorded version")
+    show.add_argument("version", type=int, help="version number, as listed by 'history log'")
+    show.add_argument("--out", metavar="PATH", help="write to PATH and format it instead of printing")
+    show.set_defaults(func=lazy_command("vm_history", "cmd_history_show"))
+
+    workspace = commands.add_parser(
+            "workspace",
+            help="regenerate every vendored forge-std under a directory")
+    add_from_argument(workspace, argparse.SUPPRESS)
+    workspace.add_argument("root", nargs="?", default=".", help="directory to search (default: .)")
+    workspace.add_argument("--jobs", type=int, default=8, help="maximum number of concurrent forge fmt runs and writes")
+    workspace.add_argument("--dry-run", action="store_true", help="only list the vendored forge-std copies")
+    workspace.set_defaults(func=lazy_command("vm_workspace", "cmd_workspace"))
+
+    locate = commands.add_parser(
+            "locate",
+            help="print where a declaration is in Vm.sol, using the index written by --index")
+    locate.add_argument("key", help="function id, selector, or name of a struct, enum, event or group")
+    locate.add_argument(
+            "--index",
+            metavar="PATH",
+            default=INDEX_PATH,
+            help=f"path to the index (default: {INDEX_PATH})")
+    locate.add_argument("--doc", action="store_true", help="print the declaration and its doc comment instead")
+    locate.set_defaults(func=lazy_command("vm_index", "cmd_locate"))
+
+    annotate = commands.add_parser(
+            "annotate",
+            help="name the raw cheatcode calls in a forge trace")
+    add_from_argument(annotate, argparse.SUPPRESS)
+    annotate.add_argument("trace", help="trace log, e.g. the output of 'forge test -vvvv', or '-' for stdin")
+    annotate.add_argument("--out", metavar="PATH", help="write the annotated trace to PATH instead of stdout")
+    annotate.add_argument("--jobs", type=int, help="number of worker processes (default: the number of CPUs)")
+    annotate.set_defaults(func=lazy_command("vm_annotate", "cmd_annotate"))
+
+    store = commands.add_parser(
+            "store",
+            help="manage the store of generated Vm.sol files used by --store")
+    store.add_argument(
+            "--store",
+            metavar="DIR",
+            default=STORE_PATH,
+            help=f"path to the store (default: {STORE_PATH})")
+    store_commands = store.add_subparsers(dest="store_command", metavar="ACTION", required=True)
+    gc = store_commands.add_parser("gc", help="evict the least recently used entries above the size cap")
+    add_store_size_argument(gc, "--max-size")
+    gc.set_defaults(func=lazy_command("vm_store", "cmd_store_gc"))
+
+    check = commands.add_parser(
+            "check",
+            help="report selector drift between the spec, Vm.sol and the compiled Vm artifacts")
+    add_from_argument(check, argparse.SUPPRESS)
+    check.add_argument("--vm-sol", metavar="PATH", default=OUT_PATH, help=f"path to Vm.sol (default: {OUT_PATH})")
+    check.add_argument(
+            "--artifacts",
+            metavar="DIR",
+            default="out/Vm.sol",
+            help="directory with the compiled Vm.sol artifacts, skipped if missing (default: out/Vm.sol)")
+    check.set_defaults(func=lazy_command("vm_check", "cmd_check"))
+
+    usage = commands.add_parser(
+            "usage",
+            help="report the cheatcodes a project calls by status, e.g. deprecated")
+    add_from_argument(usage, argparse.SUPPRESS)
+    usage.add_argument("root", nargs="?", default=".", help="project root, containing foundry.toml (default: .)")
+    usage.add_argument(
+            "--dir",
+            metavar="DIR",
+            dest="dirs",
+            action="append",
+            help="directory to scan, relative to the root (default: the src, test and script directories)")
+    usage.add_argument(
+            "--status",
+            action="append",
+            help="list the calls with this status, e.g. 'deprecated' or 'unknown' (default: all but stable)")
+    usage.add_argument(
+            "--cache",
+            metavar="PATH",
+            default=USAGE_CACHE_PATH,
+            help=f"path to the scan cache, relative to the root (default: {USAGE_CACHE_PATH})")
+    usage.set_defaults(func=lazy_command("vm_usage", "cmd_usage"))
+
+    codecs = commands.add_parser(
+            "codecs",
+            help="generate Python encoders and decoders of the structs, e.g. for the return data of cheatcodes")
+    add_from_argument(codecs, argparse.SUPPRESS)
+    codecs.add_argument(
+            "--out",
+            metavar="PATH",
+            default=CODECS_PATH,
+            help=f"path to the generated module (default: {CODECS_PATH})")
+    codecs.set_defaults(func=lazy_command("vm_codecs", "cmd_codecs"))
+
+    safety = commands.add_parser(
+            "safety",
+            help="flag the cheatcodes of Forge scripts that are not in VmSafe, exiting with status 1 if any")
+    add_from_argument(safety, argparse.SUPPRESS)
+    safety.add_argument("root", nargs="?", default=".", help="project root, containing foundry.toml (default: .)")
+    safety.add_argument(
+            "--dir",
+            metavar="DIR",
+            dest="dirs",
+            action="append",
+            help="directory of *.s.sol files to check, relative to the root (default: the script directory)")
+    safety.add_argument(
+            "--cache",
+            metavar="PATH",
+            default=SAFETY_CACHE_PATH,
+            help=f"path to the scan cache, relative to the root, next to the spec's safety index (default: {SAFETY_CACHE_PATH})")
+    safety.set_defaults(func=lazy_command("vm_safety", "cmd_safety"))
+
+    return parser
+
+
+def cmd_generate(args: argparse.Namespace):
+    if args.watch:
+        assert args.path is not None, "--watch requires --from"
+        lazy_command("vm_watch", "cmd_watch")(args)
+    elif args.store is not None:
+        lazy_command("vm_store", "cmd_generate_stored")(args)
+    else:
+        generate(read_cheatcodes(args.path, args.load_jobs), args.index, args.render_jobs, args.profile)
+
+
+def lazy_command(module: str, name: str) -> Callable[[argparse.Namespace], None]:
+    """Returns a command that only imports `module` once it runs."""
+
+    def run(args: argparse.Namespace):
+        import importlib
+
+        getattr(importlib.import_module(module), name)(args)
+
+    return run
+
+
+def add_from_argument(parser: argparse.ArgumentParser, default=None):
     parser.add_argument(
             "--from",
             metavar="PATH",
             dest="path",
             required=False,
+            default=default,
             help="path to a json file containing the Vm interface, as generated by Foundry")
-    args = parser.parse_args()
-    json_str = request.urlopen(CHEATCODES_JSON_URL).read().decode("utf-8") if args.path is None else Path(args.path).read_text()
-    contract = Cheatcodes.from_json(json_str)
 
-    ccs = contract.cheatcodes
-    ccs = list(filter(lambda cc: cc.status not in ["experimental", "internal"], ccs))
-    ccs.sort(key=lambda cc: cc.func.id)
 
-    safe = list(filter(lambda cc: cc.safety == "safe", ccs))
-    safe.sort(key=CmpCheatcode)
-    unsafe = list(filter(lambda cc: cc.safety == "unsafe", ccs))
-    unsafe.sort(key=CmpCheatcode)
-    assert len(safe) + len(unsafe) == len(ccs)
+def add_store_size_argument(parser: argparse.ArgumentParser, flag: str):
+    parser.add_argument(
+            flag,
+            metavar="MIB",
+            dest="store_max_size",
+            type=float,
+            default=64,
+            help="size cap of the store in MiB, past which the least recently used entries are evicted (default: 64)")
 
-    prefix_with_group_headers(safe)
-    prefix_with_group_headers(unsafe)
+
+def add_db_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+            "--db",
+            metavar="PATH",
+            default=CATALOG_PATH,
+            help=f"path to the SQLite catalog (default: {CATALOG_PATH})")
+
+
+def add_refresh_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help="without --from, download the spec and rebuild the catalog if it changed, instead of using the catalog as is")
+
+
+def read_cheatcodes_json(path: str | None) -> str:
+    if path is None:
+        from vm_fetch import fetch_spec
+
+        return fetch_spec(CHEATCODES_JSON_URL, build=False).text
+    with open(path) as f:
+        return f.read()
+
+
+def read_cheatcodes(path: str | None, jobs: int | None = None) -> Cheatcodes:
+    """Reads the spec from `path`, or downloads it while building its model if None.
+
+    With `jobs`, a large spec read from `path` is built by as many worker processes.
+    """
+    if path is None:
+        from vm_fetch import fetch_spec
+
+        return fetch_spec(CHEATCODES_JSON_URL).contract
+    if jobs is not None:
+        from vm_load import load_parallel
+
+        return load_parallel(read_cheatcodes_json(path), jobs)
+    return Cheatcodes.from_json(read_cheatcodes_json(path))
+
+
+def generate(
+    contract: Cheatcodes,
+    index_path: str | None = None,
+    jobs: int | None = None,
+    profile: str = "default",
+):
+    emitted = [] if index_path is not None else None
+    out = render_vm_sol(contract, emitted=emitted, jobs=jobs, profile=profile)
+    write_vm_sol(out, fmt=profile != "lean")
+    if index_path is not None:
+        from vm_index import write_declaration_index
+
+        write_declaration_index(emitted, OUT_PATH, index_path)
+
+
+def render_vm_sol(
+    contract: "Cheatcodes",
+    section_cache: SectionCache | None = None,
+    emitted: list[tuple[str, Item, object]] | None = None,
+    jobs: int | None = None,
+    profile: str = "default",
+) -> str:
+    """Renders the `Vm.sol` source for `contract`, before `forge fmt`.
+
+    With a `section_cache`, sections whose items did not change since the
+    previous render are copied from it instead of being printed again. With an
+    `emitted` list, the printer appends every item it emits to it, see
+    `CheatcodesPrinter`. With several `jobs`, the sections of both contracts
+    are rendered by a pool of worker processes, see `render_sections`.
+    The `lean` profile declares the same functions, without the comments,
+    group headers, blank lines and indentation that solc would skip anyway.
+    """
+    assert profile in PROFILES, f"unknown profile: {profile}"
+    lean = profile == "lean"
+    defer = jobs is not None and jobs > 1
+    # Importing NumPy would take longer than sorting a single spec.
+    table = CheatcodeTable(contract.cheatcodes, use_numpy=False)
+
+    safe = table.select(safety="safe", exclude_status=HIDDEN_STATUSES)
+    unsafe = table.select(safety="unsafe", exclude_status=HIDDEN_STATUSES)
+    assert len(safe) + len(unsafe) == len(table.mask(exclude_status=HIDDEN_STATUSES))
+
+    if not lean:
+        prefix_with_group_headers(safe)
+        prefix_with_group_headers(unsafe)
 
     out = ""
 
@@ -61,13 +402,17 @@ def main():
         spdx_identifier="MIT OR Apache-2.0",
         solidity_requirement=">=0.6.2 <0.9.0",
         abicoder_pragma=True,
+        indent_with=0 if lean else 4,
+        lean=lean,
+        section_cache=section_cache,
+        emitted=emitted,
+        defer=defer,
     )
     pp.p_prelude()
     pp.prelude = False
     out += pp.finish()
 
-    out += "\n\n"
-    out += VM_SAFE_DOC
+    out += "\n" if lean else "\n\n" + VM_SAFE_DOC
     vm_safe = Cheatcodes(
         # TODO: Custom errors were introduced in 0.8.4
         errors=[],  # contract.errors
@@ -79,8 +424,7 @@ def main():
     pp.p_contract(vm_safe, "VmSafe")
     out += pp.finish()
 
-    out += "\n\n"
-    out += VM_DOC
+    out += "\n" if lean else "\n\n" + VM_DOC
     vm_unsafe = Cheatcodes(
         errors=[],
         events=[],
@@ -91,20 +435,50 @@ def main():
     pp.p_contract(vm_unsafe, "Vm", "VmSafe")
     out += pp.finish()
 
-    # Compatibility with <0.8.0
+    if defer:
+        out = pp.resolve(out, jobs)
+    return external_params_to_calldata(out)
+
+
+def external_params_to_calldata(out: str) -> str:
+    """Declares the `memory` parameters of external functions as `calldata`, as required before 0.8.0."""
+    import re
+
     def memory_to_calldata(m: re.Match) -> str:
         return " calldata " + m.group(1)
 
-    out = re.sub(r" memory (.*returns)", memory_to_calldata, out)
+    return re.sub(r" memory (.*returns)", memory_to_calldata, out)
+
 
-    with open(OUT_PATH, "w") as f:
+def write_vm_sol(out: str, path: str = OUT_PATH, fmt: bool = True):
+    import os
+    import subprocess
+
+    # Replace rather than overwrite the file, which may be a hardlink into the store of `--store-link`.
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
         f.write(out)
+    os.replace(tmp, path)
+
+    if fmt:
+        forge_fmt = ["forge", "fmt", path]
+        res = subprocess.run(forge_fmt)
+        assert res.returncode == 0, f"command failed: {forge_fmt}"
 
-    forge_fmt = ["forge", "fmt", OUT_PATH]
-    res = subprocess.run(forge_fmt)
-    assert res.returncode == 0, f"command failed: {forge_fmt}"
+    print(f"Wrote to {path}")
 
-    print(f"Wrote to {OUT_PATH}")
+
+def fmt_config_key(target: Path) -> str:
+    """Returns the `forge fmt` configuration that applies to `target`, as a comparable string."""
+    foundry_toml = target / "foundry.toml"
+    if not foundry_toml.is_file():
+        return ""
+    text = foundry_toml.read_text()
+    try:
+        import tomllib
+    except ImportError:
+        return text
+    return json.dumps(tomllib.loads(text).get("fmt", {}), sort_keys=True)
 
 
 class CmpCheatcode:
@@ -135,6 +509,146 @@ def cmp_cheatcode(a: "Cheatcode", b: "Cheatcode") -> int:
     return 0
 
 
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class CheatcodeTable:
+    """Columnar (struct-of-arrays) view of a list of cheatcodes.
+
+    `group`, `status` and `safety` are small integer codes into the sorted
+    `groups`, `statuses` and `safeties` vocabularies, so comparing codes orders
+    the same way as comparing the strings. `id_rank` is the rank of `func.id`
+    among all ids and `selector` is the packed 4-byte selector.
+
+    Columns are NumPy arrays when NumPy is installed and `array.array`s
+    otherwise; filtering and ordering are vectorized in the former case.
+    """
+
+    cheatcodes: list["Cheatcode"]
+    groups: list[str]
+    statuses: list[str]
+    safeties: list[str]
+
+    group: Sequence[int]
+    status: Sequence[int]
+    safety: Sequence[int]
+    id_rank: Sequence[int]
+    selector: Sequence[int]
+
+    def __init__(self, cheatcodes: list["Cheatcode"], use_numpy: bool = True):
+        self.cheatcodes = list(cheatcodes)
+        self._np = _numpy() if use_numpy else None
+
+        self.groups = sorted({cc.group for cc in self.cheatcodes})
+        self.statuses = sorted({cc.status for cc in self.cheatcodes})
+        self.safeties = sorted({cc.safety for cc in self.cheatcodes})
+        assert max(len(self.groups), len(self.statuses), len(self.safeties), 0) <= 0xFF, "too many distinct codes"
+
+        group_codes = {g: i for i, g in enumerate(self.groups)}
+        status_codes = {s: i for i, s in enumerate(self.statuses)}
+        safety_codes = {s: i for i, s in enumerate(self.safeties)}
+        id_ranks = {id: i for i, id in enumerate(sorted({cc.func.id for cc in self.cheatcodes}))}
+
+        self.group = self._column("B", [group_codes[cc.group] for cc in self.cheatcodes])
+        self.status = self._column("B", [status_codes[cc.status] for cc in self.cheatcodes])
+        self.safety = self._column("B", [safety_codes[cc.safety] for cc in self.cheatcodes])
+        self.id_rank = self._column("I", [id_ranks[cc.func.id] for cc in self.cheatcodes])
+        self.selector = self._column("I", [int.from_bytes(cc.func.selector_bytes, "big") for cc in self.cheatcodes])
+
+    def __len__(self) -> int:
+        return len(self.cheatcodes)
+
+    def _column(self, typecode: str, values: list[int]):
+        if self._np is not None:
+            dtype = self._np.uint8 if typecode == "B" else self._np.uint32
+            return self._np.array(values, dtype=dtype)
+
+        from array import array
+
+        col = array(typecode, values)
+        assert col.itemsize >= (1 if typecode == "B" else 4)
+        return col
+
+    @staticmethod
+    def _codes(vocabulary: list[str], values: list[str] | str) -> list[int]:
+        if isinstance(values, str):
+            values = [values]
+        return [i for i, v in enumerate(vocabulary) if v in values]
+
+    def mask(
+        self,
+        safety: list[str] | str | None = None,
+        status: list[str] | str | None = None,
+        exclude_status: list[str] | str | None = None,
+    ):
+        """Returns the indices of the rows matching all of the given filters."""
+        safeties = None if safety is None else self._codes(self.safeties, safety)
+        statuses = None if status is None else self._codes(self.statuses, status)
+        excluded = [] if exclude_status is None else self._codes(self.statuses, exclude_status)
+
+        np = self._np
+        if np is not None:
+            m = np.ones(len(self), dtype=bool)
+            if safeties is not None:
+                m &= np.isin(self.safety, safeties)
+            if statuses is not None:
+                m &= np.isin(self.status, statuses)
+            if excluded:
+                m &= ~np.isin(self.status, excluded)
+            return np.flatnonzero(m)
+
+        return [
+            i
+            for i in range(len(self))
+            if (safeties is None or self.safety[i] in safeties)
+            and (statuses is None or self.status[i] in statuses)
+            and self.status[i] not in excluded
+        ]
+
+    def argsort(self, indices=None):
+        """Orders `indices` (all rows by default) by `(group, status, safety, id)`.
+
+        This is the same order as sorting with `CmpCheatcode`.
+        """
+        np = self._np
+        if np is not None:
+            if indices is None:
+                indices = np.arange(len(self))
+            indices = np.asarray(indices, dtype=np.intp)
+            order = np.lexsort(
+                (
+                    self.id_rank[indices],
+                    self.safety[indices],
+                    self.status[indices],
+                    self.group[indices],
+                )
+            )
+            return indices[order]
+
+        if indices is None:
+            indices = range(len(self))
+        g, st, sa, id = self.group, self.status, self.safety, self.id_rank
+        return sorted(indices, key=lambda i: (g[i], st[i], sa[i], id[i]))
+
+    def take(self, indices) -> list["Cheatcode"]:
+        """Converts rows back to the model objects they were built from."""
+        return [self.cheatcodes[i] for i in indices]
+
+    def select(
+        self,
+        safety: list[str] | str | None = None,
+        status: list[str] | str | None = None,
+        exclude_status: list[str] | str | None = None,
+    ) -> list["Cheatcode"]:
+        """Filters and orders the cheatcodes, returning model objects."""
+        return self.take(self.argsort(self.mask(safety, status, exclude_status)))
+
+
 # HACK: A way to add group header comments without having to modify printer code
 def prefix_with_group_headers(cheats: list["Cheatcode"]):
     s = set()
@@ -144,9 +658,22 @@ def prefix_with_group_headers(cheats: list["Cheatcode"]):
 
         s.add(cheat.group)
 
-        c = copy.deepcopy(cheat)
-        c.func.description = ""
-        c.func.declaration = f"// ======== {group(c.group)} ========"
+        f = cheat.func
+        c = Cheatcode(
+            Function(
+                f.id,
+                "",
+                f"// ======== {group(cheat.group)} ========",
+                f.visibility,
+                f.mutability,
+                f.signature,
+                f.selector,
+                f.selector_bytes,
+            ),
+            cheat.group,
+            cheat.status,
+            cheat.safety,
+        )
         cheats.insert(i, c)
     return cheats
 
@@ -178,6 +705,101 @@ class Mutability(PyEnum):
         return self.value
 
 
+class Param:
+    ty: str
+    location: str
+    name: str
+
+    def __init__(self, ty: str, location: str = "", name: str = ""):
+        self.ty = ty
+        self.location = location
+        self.name = name
+
+
+class Declaration:
+    """The parts of a function declaration, e.g. `function load(address target, bytes32 slot) external view returns (bytes32 data);`."""
+
+    name: str
+    params: list[Param]
+    returns: list[Param]
+    visibility: Visibility
+    mutability: Mutability
+
+    DATA_LOCATIONS = ("memory", "calldata", "storage")
+    # Identifiers and types, including arrays, and the punctuation that separates them.
+    TOKEN = r"[\w.]+(?:\[\d*\])*|[(),;]"
+
+    def __init__(
+        self,
+        name: str,
+        params: list[Param],
+        returns: list[Param],
+        visibility: Visibility,
+        mutability: Mutability,
+    ):
+        self.name = name
+        self.params = params
+        self.returns = returns
+        self.visibility = visibility
+        self.mutability = mutability
+
+    @staticmethod
+    def parse(declaration: str) -> "Declaration":
+        import re
+
+        tokens = re.findall(Declaration.TOKEN, declaration)
+        assert tokens[:1] == ["function"] and tokens[2:3] == ["("], f"not a function declaration: {declaration}"
+        name = tokens[1]
+        params, i = Declaration._parse_params(tokens, 3)
+
+        visibility = None
+        mutability = Mutability.NONE
+        returns = []
+        while tokens[i] != ";":
+            token = tokens[i]
+            if token == "returns":
+                assert tokens[i + 1] == "(", f"expected '(' after returns: {declaration}"
+                returns, i = Declaration._parse_params(tokens, i + 2)
+                continue
+            if token in (m.value for m in Mutability):
+                mutability = Mutability(token)
+            else:
+                visibility = Visibility(token)
+            i += 1
+        assert visibility is not None, f"missing visibility: {declaration}"
+        return Declaration(name, params, returns, visibility, mutability)
+
+    @staticmethod
+    def parse_params(params: str) -> list[Param]:
+        """Parses a parameter list that starts with its `(`, e.g. `(address target, bytes32 slot)`, ignoring what follows it."""
+        import re
+
+        tokens = re.findall(Declaration.TOKEN, params)
+        assert tokens[:1] == ["("], f"not a parameter list: {params}"
+        return Declaration._parse_params(tokens, 1)[0]
+
+    @staticmethod
+    def _parse_params(tokens: list[str], i: int) -> tuple[list[Param], int]:
+        """Parses the parameter list starting at `tokens[i]`, returning it and the index after its `)`."""
+        params = []
+        current: list[str] = []
+        while True:
+            token = tokens[i]
+            i += 1
+            if token in (",", ")"):
+                if current:
+                    ty, *rest = current
+                    if rest[:1] == ["payable"]:
+                        ty, rest = f"{ty} payable", rest[1:]
+                    location = rest.pop(0) if rest[:1] and rest[0] in Declaration.DATA_LOCATIONS else ""
+                    params.append(Param(ty, location, rest[0] if rest else ""))
+                    current = []
+                if token == ")":
+                    return params, i
+            else:
+                current.append(token)
+
+
 class Function:
     id: str
     description: str
@@ -187,6 +809,7 @@ class Function:
     signature: str
     selector: str
     selector_bytes: bytes
+    _parsed: Declaration | None
 
     def __init__(
         self,
@@ -207,6 +830,14 @@ class Function:
         self.signature = signature
         self.selector = selector
         self.selector_bytes = selector_bytes
+        self._parsed = None
+
+    @property
+    def parsed(self) -> Declaration:
+        """The parsed `declaration`, computed on first use."""
+        if self._parsed is None:
+            self._parsed = Declaration.parse(self.declaration)
+        return self._parsed
 
     @staticmethod
     def from_dict(d: dict) -> "Function":
@@ -244,6 +875,21 @@ class Cheatcode:
         )
 
 
+def split_status(status: str) -> tuple[str, str | None]:
+    """Returns the kind of a `Cheatcode.status`, e.g. 'deprecated', and the note that comes with it, if any.
+
+    Foundry writes some deprecations as `{"deprecated": "replaced by ..."}`,
+    which `Cheatcode.status` keeps as the repr of the dict, as Vm.sol is
+    ordered on it.
+    """
+    if not status.startswith("{"):
+        return status, None
+    import ast
+
+    ((kind, note),) = ast.literal_eval(status).items()
+    return str(kind), None if note is None else str(note)
+
+
 class Error:
     name: str
     description: str
@@ -373,6 +1019,101 @@ class Cheatcodes:
             return Cheatcodes.from_dict(json.load(f))
 
 
+class TypeIndex:
+    """The cheatcodes taking or returning each type, as written in their declarations, e.g. `bytes32[]`."""
+
+    params: dict[str, list[Cheatcode]]
+    returns: dict[str, list[Cheatcode]]
+
+    def __init__(self, cheatcodes: list[Cheatcode]):
+        self.params = {}
+        self.returns = {}
+        for cheatcode in cheatcodes:
+            parsed = cheatcode.func.parsed
+            for ty in dict.fromkeys(p.ty for p in parsed.params):
+                self.params.setdefault(ty, []).append(cheatcode)
+            for ty in dict.fromkeys(p.ty for p in parsed.returns):
+                self.returns.setdefault(ty, []).append(cheatcode)
+
+    def taking(self, ty: str) -> list[Cheatcode]:
+        return self.params.get(ty, [])
+
+    def returning(self, ty: str) -> list[Cheatcode]:
+        return self.returns.get(ty, [])
+
+
+def generator_hash() -> str:
+    """Returns the hash of this script, which determines how a given spec is rendered."""
+    import hashlib
+
+    with open(__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def content_key(obj) -> tuple:
+    """Returns a hashable summary of everything a printer can read from a model object.
+
+    Private attributes are caches derived from the public ones and are left out.
+    """
+    if isinstance(obj, list):
+        return tuple(content_key(o) for o in obj)
+    if isinstance(obj, PyEnum) or not hasattr(obj, "__dict__"):
+        return obj
+    return (type(obj).__name__, *(content_key(v) for k, v in vars(obj).items() if not k.startswith("_")))
+
+
+def section_key(item: Item, items: list) -> tuple:
+    """Returns a hashable summary of everything the printer reads from the `items` of a section.
+
+    Functions are the bulk of a spec, and only their description and
+    declaration are printed, so the rest of the model isn't walked for them.
+    """
+    if item == Item.FUNCTION:
+        return tuple((cc.func.description, cc.func.declaration) for cc in items)
+    return content_key(items)
+
+
+class SectionCache:
+    """Printer output of the sections of a render, keyed by their content.
+
+    Sections are the item lists of a contract, with functions split by group.
+    Only the entries used by the current and the previous render are kept;
+    `rotate()` starts a new render.
+    """
+
+    previous: dict[tuple, str]
+    current: dict[tuple, str]
+    hits: int
+    misses: int
+
+    def __init__(self):
+        self.previous = {}
+        self.current = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> str | None:
+        out = self.current.get(key)
+        if out is None:
+            out = self.previous.get(key)
+            if out is not None:
+                self.current[key] = out
+        if out is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return out
+
+    def put(self, key: tuple, out: str):
+        self.current[key] = out
+
+    def rotate(self):
+        self.previous = self.current
+        self.current = {}
+        self.hits = 0
+        self.misses = 0
+
+
 class Item(PyEnum):
     ERROR: str = "error"
     EVENT: str = "event"
@@ -406,8 +1147,88 @@ class ItemOrder:
         )
 
 
+class RenderContext:
+    """The settings a section is printed with, which are all its output depends on besides its items.
+
+    Contexts are never modified: the printer takes a new one whenever its
+    indentation changes, so that a section can be rendered on its own.
+    """
+
+    indent_level: int
+    indent_str: str
+    nl_str: str
+    block_doc_style: bool
+    lean: bool
+
+    def __init__(self, indent_level: int, indent_str: str, nl_str: str, block_doc_style: bool, lean: bool):
+        self.indent_level = indent_level
+        self.indent_str = indent_str
+        self.nl_str = nl_str
+        self.block_doc_style = block_doc_style
+        self.lean = lean
+
+    def key(self) -> tuple:
+        return (self.indent_level, self.indent_str, self.nl_str, self.block_doc_style, self.lean)
+
+
+def render_section(context: RenderContext, item: Item, items: list) -> str:
+    """Renders the `items` of a section with a fresh printer, as `CheatcodesPrinter` would at `context`."""
+    pp = CheatcodesPrinter(
+        prelude=False,
+        block_doc_style=context.block_doc_style,
+        indent_level=context.indent_level,
+        indent_with=context.indent_str,
+        nl_str=context.nl_str,
+        lean=context.lean,
+    )
+    getattr(pp, CheatcodesPrinter.SECTION_PRINTERS[item])(items)
+    return pp.buffer
+
+
+# The sections rendered by `render_sections`, inherited by the forked workers.
+_sections: list[tuple[RenderContext, Item, list]] = []
+
+
+def _render_section_at(i: int) -> str:
+    return render_section(*_sections[i])
+
+
+def render_sections(sections: list[tuple[RenderContext, Item, list]], jobs: int) -> list[str]:
+    """Renders every `(context, item, items)` section, in order.
+
+    The workers are forked after `sections` is set aside, so that only the
+    indices and the printed sections cross process boundaries; where fork is
+    not available, pickling the model would cost more than printing it, so
+    the sections are rendered in this process instead.
+    """
+    global _sections
+    import multiprocessing
+
+    if jobs <= 1 or len(sections) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return [render_section(*section) for section in sections]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    _sections = sections
+    try:
+        with ProcessPoolExecutor(min(jobs, len(sections)), mp_context=multiprocessing.get_context("fork")) as pool:
+            return list(pool.map(_render_section_at, range(len(sections))))
+    finally:
+        _sections = []
+
+
 class CheatcodesPrinter:
-    buffer: str
+    # The printer of each kind of section.
+    SECTION_PRINTERS = {
+        Item.ERROR: "p_errors",
+        Item.EVENT: "p_events",
+        Item.ENUM: "p_enums",
+        Item.STRUCT: "p_structs",
+        Item.FUNCTION: "p_functions",
+    }
+
+    # What was printed since the last `finish`, in pieces: appending to a single string copies it every time.
+    _parts: list[str]
 
     prelude: bool
     spdx_identifier: str
@@ -415,6 +1236,8 @@ class CheatcodesPrinter:
     abicoder_v2: bool
 
     block_doc_style: bool
+    # Leaves out comments and the blank lines between items.
+    lean: bool
 
     indent_level: int
     _indent_str: str
@@ -423,6 +1246,13 @@ class CheatcodesPrinter:
 
     items_order: ItemOrder
 
+    section_cache: SectionCache | None
+
+    emitted: list[tuple[str, Item, object]] | None
+    _contract_name: str
+    # Sections left to render by `resolve`, with the section cache key to store them under.
+    _deferred: list[tuple[RenderContext, Item, list, tuple | None]] | None
+
     def __init__(
         self,
         buffer: str = "",
@@ -434,14 +1264,19 @@ class CheatcodesPrinter:
         indent_level: int = 0,
         indent_with: int | str = 4,
         nl_str: str = "\n",
-        items_order: ItemOrder = ItemOrder.default(),
+        lean: bool = False,
+        items_order: ItemOrder | None = None,
+        section_cache: SectionCache | None = None,
+        emitted: list[tuple[str, Item, object]] | None = None,
+        defer: bool = False,
     ):
         self.prelude = prelude
         self.spdx_identifier = spdx_identifier
         self.solidity_requirement = solidity_requirement
         self.abicoder_v2 = abicoder_pragma
         self.block_doc_style = block_doc_style
-        self.buffer = buffer
+        self.lean = lean
+        self._parts = [buffer] if buffer else []
         self.indent_level = indent_level
         self.nl_str = nl_str
 
@@ -453,19 +1288,48 @@ class CheatcodesPrinter:
         else:
             assert False, "indent_with must be int or str"
 
-        self.items_order = items_order
+        self.items_order = items_order if items_order is not None else ItemOrder.default()
+        self.section_cache = section_cache
+        self.emitted = emitted
+        self._contract_name = ""
+        self._deferred = [] if defer else None
+
+    @property
+    def buffer(self) -> str:
+        buffer = "".join(self._parts)
+        self._parts = [buffer]
+        return buffer
 
     def finish(self) -> str:
         ret = self.buffer.rstrip()
-        self.buffer = ""
+        self._parts = []
         return ret
 
+    def _printed_since(self, start: int) -> str:
+        return "".join(self._parts[start:])
+
+    def context(self) -> RenderContext:
+        return RenderContext(self.indent_level, self._indent_str, self.nl_str, self.block_doc_style, self.lean)
+
+    def resolve(self, out: str, jobs: int) -> str:
+        """Renders the sections deferred in `out`, the concatenation of what `finish` returned, with `jobs` workers."""
+        import re
+
+        deferred = self._deferred
+        self._deferred = []
+        rendered = render_sections([(context, item, items) for context, item, items, _ in deferred], jobs)
+        if self.section_cache is not None:
+            for (_, _, _, key), section in zip(deferred, rendered):
+                self.section_cache.put(key, section)
+        return re.sub("\0([0-9]+)\0", lambda m: rendered[int(m.group(1))], out)
+
     def p_contract(self, contract: Cheatcodes, name: str, inherits: str = ""):
         if self.prelude:
             self.p_prelude(contract)
 
         self._p_str("interface ")
         name = name.strip()
+        self._contract_name = name
         if name != "":
             self._p_str(name)
             self._p_str(" ")
@@ -482,18 +1346,51 @@ class CheatcodesPrinter:
     def _p_items(self, contract: Cheatcodes):
         for item in self.items_order.get_list():
             if item == Item.ERROR:
-                self.p_errors(contract.errors)
+                self._p_section(item, contract.errors, self.p_errors)
             elif item == Item.EVENT:
-                self.p_events(contract.events)
+                self._p_section(item, contract.events, self.p_events)
             elif item == Item.ENUM:
-                self.p_enums(contract.enums)
+                self._p_section(item, contract.enums, self.p_enums)
             elif item == Item.STRUCT:
-                self.p_structs(contract.structs)
+                self._p_section(item, contract.structs, self.p_structs)
             elif item == Item.FUNCTION:
-                self.p_functions(contract.cheatcodes)
+                self._p_section(item, contract.cheatcodes, self.p_functions)
             else:
                 assert False, f"unknown item {item}"
 
+    def _p_section(self, item: Item, items: list, f: Callable[[list], None]):
+        if self.emitted is not None:
+            self.emitted.extend((self._contract_name, item, i) for i in items)
+
+        if self.section_cache is None and self._deferred is None:
+            f(items)
+            return
+
+        if item == Item.FUNCTION:
+            from itertools import groupby
+
+            sections = [list(g) for _, g in groupby(items, key=lambda cc: cc.group)]
+        else:
+            sections = [items]
+
+        context = self.context()
+        for section in sections:
+            key = None
+            if self.section_cache is not None:
+                key = (item, *context.key(), section_key(item, section))
+                out = self.section_cache.get(key)
+                if out is not None:
+                    self._p_str(out)
+                    continue
+            if self._deferred is not None:
+                # A placeholder for `resolve`; NUL is not valid in Solidity sources, so it can't clash with an item.
+                self._p_str(f"\0{len(self._deferred)}\0")
+                self._deferred.append((context, item, section, key))
+            else:
+                start = len(self._parts)
+                f(section)
+                self.section_cache.put(key, self._printed_since(start))
+
     def p_prelude(self, contract: Cheatcodes | None = None):
         self._p_str(f"// SPDX-License-Identifier: {self.spdx_identifier}")
         self._p_nl()
@@ -515,7 +1412,7 @@ class CheatcodesPrinter:
 
     def p_errors(self, errors: list[Error]):
         for error in errors:
-            self._p_line(lambda: self.p_error(error))
+            self._p_item(lambda: self.p_error(error))
 
     def p_error(self, error: Error):
         self._p_comment(error.description, doc=True)
@@ -523,7 +1420,7 @@ class CheatcodesPrinter:
 
     def p_events(self, events: list[Event]):
         for event in events:
-            self._p_line(lambda: self.p_event(event))
+            self._p_item(lambda: self.p_event(event))
 
     def p_event(self, event: Event):
         self._p_comment(event.description, doc=True)
@@ -531,7 +1428,7 @@ class CheatcodesPrinter:
 
     def p_enums(self, enums: list[Enum]):
         for enum in enums:
-            self._p_line(lambda: self.p_enum(enum))
+            self._p_item(lambda: self.p_enum(enum))
 
     def p_enum(self, enum: Enum):
         self._p_comment(enum.description, doc=True)
@@ -552,7 +1449,7 @@ class CheatcodesPrinter:
 
     def p_structs(self, structs: list[Struct]):
         for struct in structs:
-            self._p_line(lambda: self.p_struct(struct))
+            self._p_item(lambda: self.p_struct(struct))
 
     def p_struct(self, struct: Struct):
         self._p_comment(struct.description, doc=True)
@@ -570,7 +1467,7 @@ class CheatcodesPrinter:
 
     def p_functions(self, cheatcodes: list[Cheatcode]):
         for cheatcode in cheatcodes:
-            self._p_line(lambda: self.p_function(cheatcode.func))
+            self._p_item(lambda: self.p_function(cheatcode.func))
 
     def p_function(self, func: Function):
         self._p_comment(func.description, doc=True)
@@ -578,7 +1475,7 @@ class CheatcodesPrinter:
 
     def _p_comment(self, s: str, doc: bool = False):
         s = s.strip()
-        if s == "":
+        if s == "" or self.lean:
             return
 
         s = map(lambda line: line.lstrip(), s.split("\n"))
@@ -611,6 +1508,14 @@ class CheatcodesPrinter:
                 self._p_str(line)
                 self._p_nl()
 
+    def _p_item(self, f: VoidFn):
+        """Prints `f` on its own line, followed by a blank line unless the printer is lean."""
+        if self.lean:
+            f()
+        else:
+            # `f` ends its last line, so `_p_line` leaves a blank line after it.
+            self._p_line(f)
+
     def _with_indent(self, f: VoidFn):
         self._inc_indent()
         f()
@@ -633,7 +1538,7 @@ class CheatcodesPrinter:
         self._p_str(self.nl_str)
 
     def _p_str(self, txt: str):
-        self.buffer += txt
+        self._parts.append(txt)
 
     def _inc_indent(self):
         self.indent_level += 1
@@ -643,4 +1548,6 @@ class CheatcodesPrinter:
 
 
 if __name__ == "__main__":
+    # Let the lazily imported `vm_*` modules share this module instead of loading vm.py a second time.
+    sys.modules.setdefault("vm", sys.modules[__name__])
     main()
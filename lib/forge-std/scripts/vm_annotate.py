@@ -0,0 +1,110 @@
+"""Names the raw cheatcode calls of forge traces, see `vm.py annotate`."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from vm import Cheatcodes, read_cheatcodes
+
+VM_ADDRESS = "0x7109709ECfa91a80626fF3989D68f67F5b1DD12D"
+BLOCK_SIZE = 4 * 1024 * 1024
+# Calls that forge couldn't decode are printed as `<address>::<selector>(<calldata>)`.
+RAW_CALL = re.compile(rb"0x(?:" + VM_ADDRESS[2:].encode() + rb"|" + VM_ADDRESS[2:].lower().encode() + rb")::([0-9a-fA-F]{8})(?=\()")
+
+# Set in every worker process by `_init_worker`.
+_names: dict[bytes, bytes] = {}
+
+
+def cmd_annotate(args: argparse.Namespace):
+    names = selector_names(read_cheatcodes(args.path))
+    src = sys.stdin.buffer if args.trace == "-" else open(args.trace, "rb")
+    dst = sys.stdout.buffer if args.out is None else open(args.out, "wb")
+    try:
+        count = annotate(src, dst, names, args.jobs or os.cpu_count() or 1)
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+        if dst is not sys.stdout.buffer:
+            dst.close()
+    print(f"Annotated {count} cheatcode calls", file=sys.stderr)
+
+
+def selector_names(contract: Cheatcodes) -> dict[bytes, bytes]:
+    """Returns the replacement of every raw cheatcode call, keyed by its lowercase hex selector."""
+    return {
+        cc.func.selector_bytes.hex().encode(): b"VM::" + cc.func.signature.encode()
+        for cc in contract.cheatcodes
+    }
+
+
+def annotate(src, dst, names: dict[bytes, bytes], jobs: int) -> int:
+    """Copies `src` to `dst`, naming the raw cheatcode calls, and returns how many were named.
+
+    The input is split into blocks of whole lines; with several `jobs` they are
+    annotated by a process pool and written back in order, with at most
+    `2 * jobs` blocks in flight.
+    """
+    count = 0
+    if jobs <= 1:
+        _init_worker(names)
+        for block in blocks(src):
+            out, n = annotate_block(block)
+            dst.write(out)
+            count += n
+        return count
+
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(names,)) as pool:
+        pending: deque = deque()
+        for block in blocks(src):
+            pending.append(pool.submit(annotate_block, block))
+            if len(pending) >= 2 * jobs:
+                out, n = pending.popleft().result()
+                dst.write(out)
+                count += n
+        while pending:
+            out, n = pending.popleft().result()
+            dst.write(out)
+            count += n
+    return count
+
+
+def blocks(src, size: int = BLOCK_SIZE):
+    """Yields `src` in blocks of about `size` bytes that end on a line boundary."""
+    rest = b""
+    while True:
+        chunk = src.read(size)
+        if not chunk:
+            if rest:
+                yield rest
+            return
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            rest += chunk
+            continue
+        yield rest + chunk[: end + 1]
+        rest = chunk[end + 1 :]
+
+
+def _init_worker(names: dict[bytes, bytes]):
+    global _names
+    _names = names
+
+
+def annotate_block(block: bytes) -> tuple[bytes, int]:
+    """Names the raw cheatcode calls in `block`, returning it and how many were named."""
+    count = 0
+
+    def name(m: re.Match) -> bytes:
+        nonlocal count
+        replacement = _names.get(m.group(1).lower())
+        if replacement is None:
+            return m.group(0)
+        count += 1
+        return replacement
+
+    return RAW_CALL.sub(name, block), count
@@ -0,0 +1,285 @@
+"""SQLite catalog of the cheatcodes, see `vm.py catalog`, `vm.py search` and `vm.py query`."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import sqlite3
+from pathlib import Path
+
+from vm import Cheatcodes, read_cheatcodes_json, split_status
+
+
+def cmd_catalog(args: argparse.Namespace):
+    catalog = CheatcodesCatalog.open(args.db, read_cheatcodes_json(args.path))
+    catalog.close()
+    print(f"Wrote to {args.db}")
+
+
+def cmd_search(args: argparse.Namespace):
+    catalog = open_catalog(args)
+    for kind, name, text in catalog.search(args.text, args.limit):
+        print(f"{kind}\t{name}\t{text}")
+    catalog.close()
+
+
+def cmd_query(args: argparse.Namespace):
+    catalog = open_catalog(args)
+    rows = catalog.query(
+        name=args.name,
+        group=args.group,
+        status=args.status,
+        safety=args.safety,
+        selector=args.selector,
+        param_type=args.param_type,
+        returns=args.returns,
+    )
+    for selector, safety, group, status, signature in rows:
+        print(f"{selector}\t{safety}\t{group}\t{status}\t{signature}")
+    catalog.close()
+
+
+def open_catalog(args: argparse.Namespace) -> "CheatcodesCatalog":
+    """Opens the catalog at `args.db` as it is, unless a spec is given, it is missing or outdated, or `--refresh` is set."""
+    if args.path is None and not args.refresh:
+        catalog = CheatcodesCatalog.open_existing(args.db)
+        if catalog is not None:
+            return catalog
+    return CheatcodesCatalog.open(args.db, read_cheatcodes_json(args.path))
+
+
+class CheatcodesCatalog:
+    """A SQLite catalog of a cheatcodes spec.
+
+    Functions, structs, enums, events and errors are stored in indexed tables,
+    along with the parameter and return types of every function declaration,
+    and every description is indexed for full-text search with FTS5 (or a
+    plain `LIKE` scan when SQLite was built without it). The catalog records
+    the hash of the json it was built from and is only rebuilt when it changes.
+    """
+
+    SCHEMA_VERSION = 3
+
+    SCHEMA = """
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    CREATE TABLE functions (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        signature TEXT NOT NULL,
+        selector TEXT NOT NULL,
+        selector_int INTEGER NOT NULL,
+        declaration TEXT NOT NULL,
+        description TEXT NOT NULL,
+        visibility TEXT NOT NULL,
+        mutability TEXT NOT NULL,
+        "group" TEXT NOT NULL,
+        status TEXT NOT NULL,
+        status_note TEXT,
+        safety TEXT NOT NULL
+    );
+    CREATE INDEX functions_name ON functions (name);
+    CREATE INDEX functions_selector ON functions (selector_int);
+    CREATE INDEX functions_group ON functions ("group", status, safety);
+    CREATE INDEX functions_safety ON functions (safety, status);
+    CREATE TABLE params (
+        function TEXT NOT NULL REFERENCES functions (id),
+        kind TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        ty TEXT NOT NULL,
+        location TEXT NOT NULL,
+        name TEXT NOT NULL,
+        PRIMARY KEY (function, kind, position)
+    );
+    CREATE INDEX params_ty ON params (kind, ty);
+    CREATE TABLE structs (name TEXT PRIMARY KEY, description TEXT NOT NULL);
+    CREATE TABLE struct_fields (
+        struct TEXT NOT NULL REFERENCES structs (name),
+        position INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        ty TEXT NOT NULL,
+        description TEXT NOT NULL,
+        PRIMARY KEY (struct, position)
+    );
+    CREATE INDEX struct_fields_ty ON struct_fields (ty);
+    CREATE TABLE enums (name TEXT PRIMARY KEY, description TEXT NOT NULL);
+    CREATE TABLE enum_variants (
+        enum TEXT NOT NULL REFERENCES enums (name),
+        position INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        PRIMARY KEY (enum, position)
+    );
+    CREATE TABLE events (name TEXT NOT NULL, description TEXT NOT NULL, declaration TEXT NOT NULL);
+    CREATE INDEX events_name ON events (name);
+    CREATE TABLE errors (name TEXT NOT NULL, description TEXT NOT NULL, declaration TEXT NOT NULL);
+    CREATE INDEX errors_name ON errors (name);
+    """
+
+    conn: sqlite3.Connection
+    fts: bool
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'descriptions'").fetchone()
+        self.fts = row is not None and "fts5" in row[0].lower()
+
+    @staticmethod
+    def open(path: str, json_str: str) -> "CheatcodesCatalog":
+        """Opens the catalog at `path`, (re)building it if `json_str` changed."""
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        catalog = CheatcodesCatalog(sqlite3.connect(path))
+        input_hash = f"{CheatcodesCatalog.SCHEMA_VERSION}:{hashlib.sha256(json_str.encode()).hexdigest()}"
+        if catalog.input_hash() != input_hash:
+            catalog.rebuild(Cheatcodes.from_json(json_str), input_hash)
+        return catalog
+
+    @staticmethod
+    def open_existing(path: str) -> "CheatcodesCatalog | None":
+        """Opens the catalog at `path` without checking it against a spec, or returns None if it isn't up to date with this schema."""
+        if not Path(path).is_file():
+            return None
+        catalog = CheatcodesCatalog(sqlite3.connect(path))
+        input_hash = catalog.input_hash()
+        if input_hash is None or not input_hash.startswith(f"{CheatcodesCatalog.SCHEMA_VERSION}:"):
+            catalog.close()
+            return None
+        return catalog
+
+    def close(self):
+        self.conn.close()
+
+    def input_hash(self) -> str | None:
+        try:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'input_hash'").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def rebuild(self, contract: Cheatcodes, input_hash: str):
+        conn = self.conn
+        # Dropping the FTS table first also drops its shadow tables.
+        conn.execute("DROP TABLE IF EXISTS descriptions")
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            conn.execute(f'DROP TABLE "{name}"')
+        conn.executescript(self.SCHEMA)
+        try:
+            conn.execute("CREATE VIRTUAL TABLE descriptions USING fts5(kind, name, description, tokenize = 'porter')")
+            self.fts = True
+        except sqlite3.OperationalError:
+            conn.execute("CREATE TABLE descriptions (kind TEXT NOT NULL, name TEXT NOT NULL, description TEXT NOT NULL)")
+            self.fts = False
+
+        with conn:
+            descriptions = []
+            for cc in contract.cheatcodes:
+                f = cc.func
+                status, status_note = split_status(cc.status)
+                conn.execute(
+                    "INSERT INTO functions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        f.id,
+                        f.signature.split("(", 1)[0],
+                        f.signature,
+                        f.selector,
+                        int.from_bytes(f.selector_bytes, "big"),
+                        f.declaration,
+                        f.description,
+                        str(f.visibility),
+                        str(f.mutability),
+                        cc.group,
+                        status,
+                        status_note,
+                        cc.safety,
+                    ),
+                )
+                parsed = f.parsed
+                conn.executemany(
+                    "INSERT INTO params VALUES (?, ?, ?, ?, ?, ?)",
+                    [(f.id, "param", i, p.ty, p.location, p.name) for i, p in enumerate(parsed.params)]
+                    + [(f.id, "return", i, p.ty, p.location, p.name) for i, p in enumerate(parsed.returns)],
+                )
+                descriptions.append(("function", f.signature, f.description))
+            for struct in contract.structs:
+                conn.execute("INSERT INTO structs VALUES (?, ?)", (struct.name, struct.description))
+                conn.executemany(
+                    "INSERT INTO struct_fields VALUES (?, ?, ?, ?, ?)",
+                    [(struct.name, i, fl.name, fl.ty, fl.description) for i, fl in enumerate(struct.fields)],
+                )
+                descriptions.append(("struct", struct.name, struct.description))
+            for enum in contract.enums:
+                conn.execute("INSERT INTO enums VALUES (?, ?)", (enum.name, enum.description))
+                conn.executemany(
+                    "INSERT INTO enum_variants VALUES (?, ?, ?, ?)",
+                    [(enum.name, i, v.name, v.description) for i, v in enumerate(enum.variants)],
+                )
+                descriptions.append(("enum", enum.name, enum.description))
+            for event in contract.events:
+                conn.execute("INSERT INTO events VALUES (?, ?, ?)", (event.name, event.description, event.declaration))
+                descriptions.append(("event", event.name, event.description))
+            for error in contract.errors:
+                conn.execute("INSERT INTO errors VALUES (?, ?, ?)", (error.name, error.description, error.declaration))
+                descriptions.append(("error", error.name, error.description))
+            conn.executemany("INSERT INTO descriptions VALUES (?, ?, ?)", descriptions)
+            conn.execute("INSERT INTO meta VALUES ('input_hash', ?)", (input_hash,))
+
+    def search(self, text: str, limit: int = 20) -> list[tuple[str, str, str]]:
+        """Returns `(kind, name, excerpt)` for the best matching descriptions.
+
+        `text` is an FTS5 query; if it isn't valid, e.g. `vm.prank`, it is
+        searched for as a phrase.
+        """
+        if self.fts:
+            sql = """
+                SELECT kind, name, snippet(descriptions, 2, '[', ']', '...', 16)
+                FROM descriptions WHERE descriptions MATCH ? ORDER BY rank LIMIT ?
+            """
+            try:
+                return self.conn.execute(sql, (text, limit)).fetchall()
+            except sqlite3.OperationalError:
+                phrase = '"' + text.replace('"', '""') + '"'
+                return self.conn.execute(sql, (phrase, limit)).fetchall()
+
+        sql = "SELECT kind, name, description FROM descriptions WHERE description LIKE ? LIMIT ?"
+        return self.conn.execute(sql, (f"%{text}%", limit)).fetchall()
+
+    def query(
+        self,
+        name: str | None = None,
+        group: str | None = None,
+        status: str | None = None,
+        safety: str | None = None,
+        selector: str | None = None,
+        param_type: str | None = None,
+        returns: str | None = None,
+    ) -> list[tuple[str, str, str, str, str]]:
+        """Returns `(selector, safety, group, status, signature)` of the matching functions."""
+        where = []
+        params: list = []
+        if name is not None:
+            where.append("name = ?")
+            params.append(name)
+        if group is not None:
+            where.append('"group" = ?')
+            params.append(group)
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        if safety is not None:
+            where.append("safety = ?")
+            params.append(safety)
+        if selector is not None:
+            where.append("selector_int = ?")
+            params.append(int(selector, 16))
+        if param_type is not None:
+            where.append("id IN (SELECT function FROM params WHERE kind = 'param' AND ty = ?)")
+            params.append(param_type)
+        if returns is not None:
+            where.append("id IN (SELECT function FROM params WHERE kind = 'return' AND ty = ?)")
+            params.append(returns)
+
+        sql = 'SELECT selector, safety, "group", status, signature FROM functions'
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += ' ORDER BY "group", status, safety, id'
+        return self.conn.execute(sql, params).fetchall()
@@ -0,0 +1,151 @@
+"""Selector drift check between the spec, Vm.sol and its artifacts, see `vm.py check`."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+from vm import HIDDEN_STATUSES, Cheatcodes, read_cheatcodes
+
+COMMENT = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+INTERFACE = re.compile(r"\binterface\s+(\w+)[^{]*\{")
+FUNCTION = re.compile(r"\bfunction\s+(\w+)\s*\(([^)]*)\)")
+# The contracts of Vm.sol and the safety of the cheatcodes each one declares.
+CONTRACTS = {"VmSafe": {"safe"}, "Vm": {"safe", "unsafe"}}
+
+
+def cmd_check(args: argparse.Namespace):
+    contract = read_cheatcodes(args.path)
+    report = check(contract, Path(args.vm_sol), Path(args.artifacts))
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    if report["drift"]:
+        sys.exit(1)
+
+
+def check(contract: Cheatcodes, vm_sol: Path, artifacts: Path) -> dict:
+    """Compares the selectors of the spec against `vm_sol` and, when present, the artifacts in `artifacts`.
+
+    `Vm.sol` declares each cheatcode once, in `VmSafe` or `Vm`, while the `Vm`
+    artifact also holds the functions it inherits from `VmSafe`.
+    """
+    expected = {"safe": {}, "unsafe": {}}
+    for cheatcode in contract.cheatcodes:
+        if cheatcode.status not in HIDDEN_STATUSES:
+            expected[cheatcode.safety][cheatcode.func.signature] = cheatcode.func.selector
+    by_signature = {**expected["safe"], **expected["unsafe"]}
+    canonical = CanonicalTypes(contract)
+
+    compiled = {}
+    for name in CONTRACTS:
+        path = artifacts / f"{name}.json"
+        if path.is_file():
+            with open(path) as f:
+                compiled[name] = (path, artifact_selectors(json.load(f)))
+
+    # Declarations that aren't in the spec can still be given the selector they were compiled to.
+    known = {sig: sel for _, selectors in compiled.values() for sig, sel in selectors.items()}
+    known.update(by_signature)
+
+    results = []
+    declared = declared_functions(vm_sol.read_text(), canonical)
+    for name, safety in (("VmSafe", "safe"), ("Vm", "unsafe")):
+        found = {sig: known.get(sig) for sig in declared.get(name, [])}
+        results.append(compare(f"{vm_sol}:{name}", expected[safety], found, by_signature=True))
+
+    for name, (path, found) in compiled.items():
+        want = {sig: sel for safety in CONTRACTS[name] for sig, sel in expected[safety].items()}
+        results.append(compare(str(path), want, found, by_signature=False))
+
+    return {
+        "spec": {"functions": len(by_signature)},
+        "checks": results,
+        "drift": any(r["missing"] or r["extra"] or r["changed"] for r in results),
+    }
+
+
+def compare(target: str, expected: dict[str, str], found: dict[str, str | None], by_signature: bool) -> dict:
+    """Diffs two `signature -> selector` maps.
+
+    Functions are matched by signature when `by_signature`, because a `Vm.sol`
+    declaration has no selector of its own, and by selector otherwise.
+    """
+    if by_signature:
+        missing = [(sig, sel) for sig, sel in expected.items() if sig not in found]
+        extra = [(sig, sel) for sig, sel in found.items() if sig not in expected]
+        changed = []
+    else:
+        found_selectors = {sel: sig for sig, sel in found.items()}
+        expected_selectors = {sel: sig for sig, sel in expected.items()}
+        missing = [(sig, sel) for sig, sel in expected.items() if sel not in found_selectors]
+        extra = [(sig, sel) for sig, sel in found.items() if sel not in expected_selectors]
+        # The same selector under another signature, e.g. a struct whose fields changed.
+        changed = [
+            {"selector": sel, "expected": sig, "found": found_selectors[sel]}
+            for sig, sel in expected.items()
+            if sel in found_selectors and found_selectors[sel] != sig
+        ]
+    return {
+        "target": target,
+        "expected": len(expected),
+        "found": len(found),
+        "missing": [{"signature": sig, "selector": sel} for sig, sel in sorted(missing)],
+        "extra": [{"signature": sig, "selector": sel} for sig, sel in sorted(extra)],
+        "changed": changed,
+    }
+
+
+def declared_functions(source: str, canonical: "CanonicalTypes") -> dict[str, list[str]]:
+    """Returns the canonical signatures of the functions declared by each interface of `source`."""
+    source = COMMENT.sub("", source)
+    interfaces = [(m.start(), m.group(1)) for m in INTERFACE.finditer(source)]
+    declared: dict[str, list[str]] = {name: [] for _, name in interfaces}
+    i = -1
+    for m in FUNCTION.finditer(source):
+        while i + 1 < len(interfaces) and interfaces[i + 1][0] < m.start():
+            i += 1
+        if i < 0:
+            continue
+        params = [p.split() for p in m.group(2).split(",") if p.strip()]
+        types = [canonical.of(p[0]) for p in params]
+        declared[interfaces[i][1]].append(f"{m.group(1)}({','.join(types)})")
+    return declared
+
+
+def artifact_selectors(artifact: dict) -> dict[str, str]:
+    """Returns `signature -> selector` of the functions of a forge artifact."""
+    return {sig: "0x" + sel.lower() for sig, sel in artifact.get("methodIdentifiers", {}).items()}
+
+
+class CanonicalTypes:
+    """Maps the Solidity types of the spec to their canonical ABI form, e.g. `Log[]` to `(bytes32[],bytes,address)[]`."""
+
+    structs: dict[str, list[str]]
+    enums: set[str]
+    _cache: dict[str, str]
+
+    def __init__(self, contract: Cheatcodes):
+        self.structs = {s.name: [f.ty for f in s.fields] for s in contract.structs}
+        self.enums = {e.name for e in contract.enums}
+        self._cache = {}
+
+    def of(self, ty: str) -> str:
+        canonical = self._cache.get(ty)
+        if canonical is None:
+            canonical = self._cache[ty] = self._canonical(ty)
+        return canonical
+
+    def _canonical(self, ty: str) -> str:
+        bracket = ty.find("[")
+        base, suffix = (ty, "") if bracket < 0 else (ty[:bracket], ty[bracket:])
+        base = base.rsplit(".", 1)[-1]
+        if base in self.structs:
+            base = "(" + ",".join(self.of(field) for field in self.structs[base]) + ")"
+        elif base in self.enums:
+            base = "uint8"
+        elif base in ("uint", "int"):
+            base += "256"
+        return base + suffix
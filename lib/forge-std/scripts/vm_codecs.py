@@ -0,0 +1,352 @@
+"""Generates Python codecs for the structs of the spec, see `vm.py codecs`.
+
+Every struct gets `encode_<Name>` and `decode_<Name>` functions, and the same
+for arrays of it, with the layout worked out once at generation time: the
+head of a struct, its static fields and the offsets of its dynamic ones, is
+unpacked by a single precompiled `struct.Struct`, arrays of static values
+are walked with `iter_unpack`, and `bytes` are decoded as memoryviews of the
+input rather than copies.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import types
+
+import abi
+from vm import Cheatcodes, Struct, read_cheatcodes
+
+# The format of an offset or length word; they are assumed to fit in 64 bits.
+WORD = "24xQ"
+# `struct` formats of the integer widths it can unpack directly.
+INT_FORMATS = {8: "B", 16: "H", 32: "I", 64: "Q"}
+
+PRELUDE = '''\
+"""Codecs for the structs of the cheatcodes spec, generated by `vm.py codecs`; do not edit.
+
+`decode_<Struct>(data)` decodes `abi.encode(value)`, e.g. the return data of a
+cheatcode, and `encode_<Struct>(value)` encodes it; the `_array` variants do
+the same for `<Struct>[]`. Structs are dicts of their fields, integers and
+enums are ints, addresses and fixed-size bytes are `0x`-prefixed hex strings,
+and `bytes` are decoded as memoryviews of `data`.
+"""
+
+from struct import Struct
+
+_WORD = Struct(">24xQ")
+
+
+def _bytes_at(mv, pos):
+    n, = _WORD.unpack_from(mv, pos)
+    value = mv[pos + 32 : pos + 32 + n]
+    assert len(value) == n, "bytes run past the end of the data"
+    return value
+
+
+def _string_at(mv, pos):
+    return str(_bytes_at(mv, pos), "utf-8", "replace")
+
+
+def _enc_bytes(value):
+    if isinstance(value, str):
+        value = bytes.fromhex(value[2:])
+    n = len(value)
+    return b"".join((_WORD.pack(n), value, bytes(-n % 32)))
+
+
+def _enc_string(value):
+    return _enc_bytes(value.encode())
+
+
+def _join_tails(tails):
+    """Returns the offsets of `tails`, followed by the tails."""
+    parts = []
+    offset = 32 * len(tails)
+    for tail in tails:
+        parts.append(_WORD.pack(offset))
+        offset += len(tail)
+    parts += tails
+    return b"".join(parts)
+'''
+
+
+def cmd_codecs(args: argparse.Namespace):
+    contract = read_cheatcodes(args.path)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    tmp = f"{args.out}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render_codecs(contract))
+    os.replace(tmp, args.out)
+    print(f"Wrote codecs of {len(contract.structs)} structs to {args.out}")
+
+
+def render_codecs(contract: Cheatcodes) -> str:
+    """Returns the source of a module with the codecs of every struct of `contract`."""
+    return CodecWriter(contract).render()
+
+
+def load_codecs(contract: Cheatcodes) -> types.ModuleType:
+    """Builds the codecs of `contract` as a module, without writing them out."""
+    module = types.ModuleType("vm_structs")
+    exec(compile(render_codecs(contract), "<vm_structs>", "exec"), module.__dict__)
+    return module
+
+
+def slug(ty: str) -> str:
+    """Returns the part of a function name standing for `ty`, e.g. `Log_array` for `Log[]`."""
+    return re.sub(r"\[(\d*)\]", r"_array\1", ty)
+
+
+class CodecWriter:
+    """Writes the decoder and encoder of every type the structs of a spec need, once each."""
+
+    structs: dict[str, Struct]
+    enums: set[str]
+    _formats: dict[str, str]
+    _decoders: dict[str, str]
+    _encoders: dict[str, str]
+    _functions: list[str]
+    _dynamic: dict[str, bool]
+
+    def __init__(self, contract: Cheatcodes):
+        self.structs = {s.name: s for s in contract.structs}
+        self.enums = {e.name for e in contract.enums}
+        self._formats = {WORD: "_WORD"}
+        self._decoders = {"bytes": "_bytes_at", "string": "_string_at"}
+        self._encoders = {"bytes": "_enc_bytes", "string": "_enc_string"}
+        self._functions = []
+        self._dynamic = {}
+
+    def render(self) -> str:
+        public = []
+        names = []
+        for s in self.structs.values():
+            for ty in (s.name, f"{s.name}[]"):
+                public.append(self._public_codecs(ty))
+                names.append(ty)
+
+        formats = "".join(f"{name} = Struct(\">{fmt}\")\n" for fmt, name in self._formats.items() if name != "_WORD")
+        decoders = "".join(f'    "{ty}": decode_{slug(ty)},\n' for ty in names)
+        encoders = "".join(f'    "{ty}": encode_{slug(ty)},\n' for ty in names)
+        return "\n\n".join([
+            PRELUDE + formats,
+            *self._functions,
+            *public,
+            f"DECODERS = {{\n{decoders}}}\nENCODERS = {{\n{encoders}}}\n",
+        ])
+
+    def _public_codecs(self, ty: str) -> str:
+        name = slug(ty)
+        decoder = self.decoder(ty)
+        encoder = self.encoder(ty)
+        if not self.is_dynamic(ty):
+            return (
+                f"def decode_{name}(data):\n    return {decoder}(memoryview(data), 0)\n\n\n"
+                f"def encode_{name}(value):\n    return {encoder}(value)\n"
+            )
+        return (
+            f"def decode_{name}(data):\n"
+            f"    mv = memoryview(data)\n"
+            f"    return {decoder}(mv, _WORD.unpack_from(mv)[0])\n\n\n"
+            f"def encode_{name}(value):\n"
+            f"    return _WORD.pack(32) + {encoder}(value)\n"
+        )
+
+    def base(self, ty: str) -> str:
+        """Returns `ty` without the contract it is declared in, e.g. `Log[]` for `Vm.Log[]`."""
+        return ty.rsplit(".", 1)[-1]
+
+    def is_dynamic(self, ty: str) -> bool:
+        ty = self.base(ty)
+        dynamic = self._dynamic.get(ty)
+        if dynamic is None:
+            array = abi.array_of(ty)
+            if array is not None:
+                dynamic = array[1] is None or self.is_dynamic(array[0])
+            elif ty in self.structs:
+                dynamic = any(self.is_dynamic(f.ty) for f in self.structs[ty].fields)
+            else:
+                dynamic = ty in ("bytes", "string")
+            self._dynamic[ty] = dynamic
+        return dynamic
+
+    def value_type(self, ty: str) -> tuple[str, str, str, str]:
+        """Returns the decoding format and conversion of a value type's word, and those of its encoding.
+
+        The conversions are templates of the unpacked word, respectively the value.
+        """
+        ty = self.base(ty)
+        if ty in self.enums:
+            ty = "uint8"
+        elif ty in ("uint", "int"):
+            ty += "256"
+        if ty == "bool":
+            return "31x?", "{}", "31x?", "{}"
+        if ty == "address":
+            return "12x20s", '"0x" + {}.hex()', "12x20s", "bytes.fromhex({}[2:])"
+        if ty.startswith("bytes"):
+            size = int(ty[len("bytes") :])
+            fmt = f"{size}s{32 - size}x" if size < 32 else "32s"
+            return fmt, '"0x" + {}.hex()', fmt, "bytes.fromhex({}[2:])"
+        if ty.startswith("uint"):
+            bits = int(ty[len("uint") :])
+            if bits in INT_FORMATS:
+                fmt = f"{32 - bits // 8}x{INT_FORMATS[bits]}"
+                return fmt, "{}", fmt, "{}"
+            return "32s", 'int.from_bytes({}, "big")', "32s", '{}.to_bytes(32, "big")'
+        if ty.startswith("int"):
+            # Negative values are sign-extended over the whole word, so they are always encoded from an int.
+            encoding = ("32s", '{}.to_bytes(32, "big", signed=True)')
+            bits = int(ty[len("int") :])
+            if bits in INT_FORMATS:
+                return f"{32 - bits // 8}x{INT_FORMATS[bits].lower()}", "{}", *encoding
+            return "32s", 'int.from_bytes({}, "big", signed=True)', *encoding
+        assert False, f"unknown type: {ty}"
+
+    def static_leaves(self, ty: str) -> list[str]:
+        """Returns the value types of the words of a static type, in order."""
+        ty = self.base(ty)
+        array = abi.array_of(ty)
+        if array is not None:
+            return self.static_leaves(array[0]) * array[1]
+        if ty in self.structs:
+            return [leaf for f in self.structs[ty].fields for leaf in self.static_leaves(f.ty)]
+        return [ty]
+
+    def static_value(self, ty: str, words) -> str:
+        """Returns the expression of a static value, from the names of its unpacked `words`."""
+        ty = self.base(ty)
+        array = abi.array_of(ty)
+        if array is not None:
+            return "[" + ", ".join(self.static_value(array[0], words) for _ in range(array[1])) + "]"
+        if ty in self.structs:
+            fields = (f'"{f.name}": {self.static_value(f.ty, words)}' for f in self.structs[ty].fields)
+            return "{" + ", ".join(fields) + "}"
+        return self.value_type(ty)[1].format(next(words))
+
+    def static_args(self, ty: str, value: str) -> list[str]:
+        """Returns the expressions packed into the words of a static `value`."""
+        ty = self.base(ty)
+        array = abi.array_of(ty)
+        if array is not None:
+            return [arg for i in range(array[1]) for arg in self.static_args(array[0], f"{value}[{i}]")]
+        if ty in self.structs:
+            return [arg for f in self.structs[ty].fields for arg in self.static_args(f.ty, f'{value}["{f.name}"]')]
+        return [self.value_type(ty)[3].format(value)]
+
+    def format(self, fmt: str) -> str:
+        """Returns the name of the precompiled `Struct` of `fmt`."""
+        name = self._formats.get(fmt)
+        if name is None:
+            name = self._formats[fmt] = f"_F{len(self._formats) - 1}"
+        return name
+
+    def decoder(self, ty: str) -> str:
+        """Returns the name of the function decoding `ty` from `(mv, pos)`.
+
+        `pos` is where a static value is encoded, or where the offset of a
+        dynamic one points.
+        """
+        ty = self.base(ty)
+        name = self._decoders.get(ty)
+        if name is not None:
+            return name
+        name = self._decoders[ty] = f"_dec_{slug(ty)}"
+        array = abi.array_of(ty)
+        if array is not None and self.is_dynamic(ty):
+            body = self._array_decoder(*array)
+        elif array is not None:
+            body = self._head_decoder([array[0]] * array[1], lambda values: "[" + ", ".join(values) + "]")
+        else:
+            fields = self.structs[ty].fields
+            body = self._head_decoder(
+                [f.ty for f in fields],
+                lambda values: "{\n" + "".join(f'        "{f.name}": {v},\n' for f, v in zip(fields, values)) + "    }",
+            )
+        self._functions.append(f"def {name}(mv, pos):\n{body}")
+        return name
+
+    def _head_decoder(self, types: list[str], build) -> str:
+        fmt = []
+        words = []
+        values = []
+        for ty in types:
+            if self.is_dynamic(ty):
+                word = f"w{len(words)}"
+                fmt.append(WORD)
+                words.append(word)
+                values.append(f"{self.decoder(ty)}(mv, pos + {word})")
+            else:
+                leaves = self.static_leaves(ty)
+                names = [f"w{len(words) + i}" for i in range(len(leaves))]
+                fmt += [self.value_type(leaf)[0] for leaf in leaves]
+                words += names
+                values.append(self.static_value(ty, iter(names)))
+        unpacked = ", ".join(words) + ("," if len(words) == 1 else "")
+        return (
+            f"    {unpacked} = {self.format(''.join(fmt))}.unpack_from(mv, pos)\n"
+            f"    return {build(values)}\n"
+        )
+
+    def _array_decoder(self, elem: str, size: int | None) -> str:
+        if size is None:
+            body = "    n, = _WORD.unpack_from(mv, pos)\n    pos += 32\n"
+        else:
+            body = f"    n = {size}\n"
+        if self.is_dynamic(elem):
+            return body + f"    return [{self.decoder(elem)}(mv, pos + o) for o, in _WORD.iter_unpack(mv[pos : pos + 32 * n])]\n"
+        leaves = self.static_leaves(elem)
+        names = [f"e{i}" for i in range(len(leaves))]
+        fmt = self.format("".join(self.value_type(leaf)[0] for leaf in leaves))
+        unpacked = ", ".join(names) + ("," if len(names) == 1 else "")
+        value = self.static_value(elem, iter(names))
+        return body + f"    return [{value} for {unpacked} in {fmt}.iter_unpack(mv[pos : pos + {32 * len(leaves)} * n])]\n"
+
+    def encoder(self, ty: str) -> str:
+        """Returns the name of the function encoding `ty`: inline if static, or the part its offset points to."""
+        ty = self.base(ty)
+        name = self._encoders.get(ty)
+        if name is not None:
+            return name
+        name = self._encoders[ty] = f"_enc_{slug(ty)}"
+        array = abi.array_of(ty)
+        if array is not None and self.is_dynamic(ty):
+            body = self._array_encoder(*array)
+        elif array is not None:
+            body = self._head_encoder([(array[0], f"v[{i}]") for i in range(array[1])])
+        else:
+            body = self._head_encoder([(f.ty, f'v["{f.name}"]') for f in self.structs[ty].fields])
+        self._functions.append(f"def {name}(v):\n{body}")
+        return name
+
+    def _head_encoder(self, items: list[tuple[str, str]]) -> str:
+        fmt = []
+        args = []
+        tails = []
+        head_size = 32 * sum(1 if self.is_dynamic(ty) else len(self.static_leaves(ty)) for ty, _ in items)
+        for ty, value in items:
+            if self.is_dynamic(ty):
+                fmt.append(WORD)
+                args.append(" + ".join([str(head_size)] + [f"len(t{i})" for i in range(len(tails))]))
+                tails.append(f"{self.encoder(ty)}({value})")
+            else:
+                fmt += [self.value_type(leaf)[2] for leaf in self.static_leaves(ty)]
+                args += self.static_args(ty, value)
+        head = f"{self.format(''.join(fmt))}.pack(\n" + "".join(f"        {arg},\n" for arg in args) + "    )"
+        if not tails:
+            return f"    return {head}\n"
+        body = "".join(f"    t{i} = {tail}\n" for i, tail in enumerate(tails))
+        parts = ", ".join(["head"] + [f"t{i}" for i in range(len(tails))])
+        return body + f"    head = {head}\n    return b\"\".join(({parts}))\n"
+
+    def _array_encoder(self, elem: str, size: int | None) -> str:
+        if self.is_dynamic(elem):
+            items = f"_join_tails([{self.encoder(elem)}(e) for e in v])"
+        else:
+            fmt = self.format("".join(self.value_type(leaf)[2] for leaf in self.static_leaves(elem)))
+            items = f'b"".join([{fmt}.pack({", ".join(self.static_args(elem, "e"))}) for e in v])'
+        if size is None:
+            return f"    return _WORD.pack(len(v)) + {items}\n"
+        return f'    assert len(v) == {size}, f"expected {size} elements, got {{len(v)}}"\n    return {items}\n'
@@ -0,0 +1,213 @@
+"""Downloads the cheatcodes spec while decoding it, see `vm.read_cheatcodes`."""
+
+from __future__ import annotations
+
+import codecs
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from http.client import HTTPException, IncompleteRead
+from urllib import request
+
+from vm import Cheatcode, Cheatcodes, Enum, Error, Event, Struct
+
+FETCH_TIMEOUT = 30
+FETCH_RETRIES = 3
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# The record type of each top-level array of the spec.
+BUILDERS = {
+    "errors": Error.from_dict,
+    "events": Event.from_dict,
+    "enums": Enum.from_dict,
+    "structs": Struct.from_dict,
+    "cheatcodes": Cheatcode.from_dict,
+}
+
+
+class FetchedSpec:
+    text: str
+    contract: Cheatcodes | None
+
+    def __init__(self, text: str, contract: Cheatcodes | None):
+        self.text = text
+        self.contract = contract
+
+
+def fetch_spec(
+    url: str,
+    build: bool = True,
+    timeout: float = FETCH_TIMEOUT,
+    retries: int = FETCH_RETRIES,
+) -> FetchedSpec:
+    """Downloads the spec at `url`, building its model from each chunk as it arrives when `build`.
+
+    A background thread reads the response so that decoding overlaps with the
+    download. `timeout` bounds both the connection and every wait for the
+    next chunk; failed attempts are retried from scratch `retries` times.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return _fetch_once(url, build, timeout)
+        except (OSError, ValueError, HTTPException) as e:
+            if attempt == retries:
+                raise
+            delay = 0.5 * 2**attempt
+            print(f"Fetching {url} failed ({e!r}), retrying in {delay:g}s", file=sys.stderr)
+            time.sleep(delay)
+    assert False, "unreachable"
+
+
+def _fetch_once(url: str, build: bool, timeout: float) -> FetchedSpec:
+    response = request.urlopen(url, timeout=timeout)
+    chunks: queue.Queue = queue.Queue()
+    reader = threading.Thread(target=_read_chunks, args=(response, chunks), daemon=True)
+    reader.start()
+
+    text = codecs.getincrementaldecoder("utf-8")()
+    decoder = SpecDecoder() if build else None
+    parts = []
+    try:
+        while True:
+            try:
+                chunk = chunks.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"no data received for {timeout}s") from None
+            if isinstance(chunk, BaseException):
+                raise chunk
+            part = text.decode(chunk or b"", final=chunk is None)
+            parts.append(part)
+            if decoder is not None:
+                decoder.feed(part)
+            if chunk is None:
+                break
+    finally:
+        response.close()
+
+    return FetchedSpec("".join(parts), decoder.finish() if decoder is not None else None)
+
+
+def _read_chunks(response, chunks: queue.Queue):
+    """Puts every chunk of `response` into `chunks` as soon as it arrives, then None (or the error)."""
+    try:
+        while True:
+            chunk = response.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.put(chunk)
+        if response.length:
+            raise IncompleteRead(b"", response.length)
+        chunks.put(None)
+    except BaseException as e:
+        chunks.put(e)
+
+
+class SpecDecoder:
+    """Incrementally decodes the spec, building each record of its top-level arrays once it is complete.
+
+    Fed with text as it arrives; the spec is only held until each record has
+    been decoded. Like `Cheatcodes.from_json`, it requires every top-level
+    array, and a repeated member replaces the earlier one.
+    """
+
+    records: dict[str, list]
+    _seen: set[str]
+    _buf: str
+    _pos: int
+    _state: str
+    _key: str | None
+    _decoder: json.JSONDecoder
+
+    def __init__(self):
+        self.records = {key: [] for key in BUILDERS}
+        self._seen = set()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, text: str, final: bool = False):
+        if self._pos > CHUNK_SIZE:
+            self._buf = self._buf[self._pos :]
+            self._pos = 0
+        self._buf += text
+        while self._step(final):
+            pass
+
+    def finish(self) -> Cheatcodes:
+        self.feed("", final=True)
+        assert self._state == "done", f"truncated spec, stopped in state {self._state!r}"
+        missing = [key for key in BUILDERS if key not in self._seen]
+        assert not missing, f"the spec has no {', '.join(missing)}"
+        return Cheatcodes(**self.records)
+
+    def _step(self, final: bool) -> bool:
+        """Consumes one token or value, returning False when more input is needed."""
+        buf = self._buf
+        pos = WHITESPACE.match(buf, self._pos).end()
+        if pos == len(buf):
+            return False
+        c = buf[pos]
+
+        if self._state == "start":
+            assert c == "{", f"expected the spec to be an object, found {c!r}"
+            self._state, self._pos = "key", pos + 1
+        elif self._state == "key":
+            if c == "}":
+                self._state, self._pos = "done", pos + 1
+            elif c == ",":
+                self._pos = pos + 1
+            else:
+                decoded = self._decode(pos, final)
+                if decoded is None:
+                    return False
+                key, end = decoded
+                end = WHITESPACE.match(buf, end).end()
+                if end == len(buf):
+                    return False
+                assert buf[end] == ":", f"expected ':' after {key!r}"
+                self._key, self._state, self._pos = key, "value", end + 1
+        elif self._state == "value":
+            if self._key in BUILDERS:
+                assert c == "[", f"expected {self._key!r} to be an array, found {c!r}"
+                self.records[self._key] = []
+                self._seen.add(self._key)
+                self._state, self._pos = "array", pos + 1
+            else:
+                # Any other member is skipped.
+                decoded = self._decode(pos, final)
+                if decoded is None:
+                    return False
+                self._state, self._pos = "key", decoded[1]
+        elif self._state == "array":
+            if c == "]":
+                self._state, self._pos = "key", pos + 1
+            elif c == ",":
+                self._pos = pos + 1
+            else:
+                decoded = self._decode(pos, final)
+                if decoded is None:
+                    return False
+                self.records[self._key].append(BUILDERS[self._key](decoded[0]))
+                self._pos = decoded[1]
+        else:
+            assert False, f"unexpected data after the spec at offset {pos}"
+        return True
+
+    def _decode(self, pos: int, final: bool):
+        """Decodes the value at `pos`, or returns None if it may not have fully arrived yet."""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None
+        # A number at the end of the buffer may still have more digits coming.
+        if end == len(self._buf) and not final:
+            return None
+        return value, end
@@ -0,0 +1,223 @@
+"""Deduplicated history store of cheatcodes specs, see `vm.py history`."""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import hashlib
+import json
+import sqlite3
+import zlib
+from pathlib import Path
+
+from vm import Cheatcodes, read_cheatcodes_json, render_vm_sol, write_vm_sol
+
+
+def cmd_history_record(args: argparse.Namespace):
+    history = SpecHistory.open(args.store)
+    version, same_as = history.record(json.loads(read_cheatcodes_json(args.path)), args.label)
+    history.close()
+    print(f"Recorded version {version}" + (f" (same spec as version {same_as})" if same_as is not None else ""))
+
+
+def cmd_history_log(args: argparse.Namespace):
+    history = SpecHistory.open(args.store)
+    for version, recorded_at, label, spec_hash, changes in history.log():
+        print(f"{version}\t{recorded_at}\t{spec_hash[:12]}\t{changes} changes\t{label}")
+    history.close()
+
+
+def cmd_history_selector(args: argparse.Namespace):
+    history = SpecHistory.open(args.store)
+    for version, change, key in history.selector_changes(args.selector):
+        print(f"{version}\t{change}\t{key}")
+    history.close()
+
+
+def cmd_history_show(args: argparse.Namespace):
+    history = SpecHistory.open(args.store)
+    out = render_vm_sol(history.cheatcodes_at(args.version))
+    history.close()
+    if args.out is None:
+        print(out)
+    else:
+        write_vm_sol(out, args.out)
+
+
+class SpecHistory:
+    """A deduplicated store of every cheatcodes spec that has been recorded.
+
+    Each error, event, enum, struct and cheatcode is stored once as a
+    zlib-compressed canonical json object under `objects/`, addressed by its
+    sha256. `index.sqlite` maps every record to the span of consecutive
+    versions it was part of, so a version that changes a handful of cheatcodes
+    only adds a handful of objects and spans. Every recording is a new
+    version, even of a spec that was recorded before, so that spans follow
+    the order in which specs were recorded; only the objects are shared.
+    """
+
+    SCHEMA_VERSION = 1
+
+    KINDS = ["errors", "events", "enums", "structs", "cheatcodes"]
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS versions (
+        version INTEGER PRIMARY KEY,
+        spec_hash TEXT NOT NULL,
+        layout_hash TEXT NOT NULL,
+        label TEXT NOT NULL,
+        recorded_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS records (
+        hash TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        selector_int INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS versions_spec_hash ON versions (spec_hash);
+    CREATE INDEX IF NOT EXISTS records_selector ON records (selector_int);
+    CREATE TABLE IF NOT EXISTS spans (
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        hash TEXT NOT NULL REFERENCES records (hash),
+        first_version INTEGER NOT NULL,
+        last_version INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS spans_key ON spans (kind, key, last_version);
+    CREATE INDEX IF NOT EXISTS spans_hash ON spans (hash);
+    CREATE INDEX IF NOT EXISTS spans_versions ON spans (first_version, last_version);
+    """
+
+    root: Path
+    conn: sqlite3.Connection
+
+    def __init__(self, root: Path, conn: sqlite3.Connection):
+        self.root = root
+        self.conn = conn
+
+    @staticmethod
+    def open(path: str) -> "SpecHistory":
+        root = Path(path)
+        (root / "objects").mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(root / "index.sqlite")
+        (schema_version,) = conn.execute("PRAGMA user_version").fetchone()
+        if schema_version < 1 and conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'versions'").fetchone():
+            # Version 0 kept `spec_hash` unique, as it didn't record a spec twice.
+            conn.executescript(
+                "BEGIN; ALTER TABLE versions RENAME TO versions_0;"
+                + SpecHistory.SCHEMA
+                + "INSERT INTO versions SELECT * FROM versions_0; DROP TABLE versions_0; COMMIT;"
+            )
+        conn.executescript(SpecHistory.SCHEMA)
+        conn.execute(f"PRAGMA user_version = {SpecHistory.SCHEMA_VERSION}")
+        return SpecHistory(root, conn)
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def key(kind: str, d: dict) -> str:
+        if kind == "cheatcodes":
+            return d["func"]["id"]
+        if kind in ("errors", "events"):
+            return d["declaration"]
+        return d["name"]
+
+    def put(self, obj) -> str:
+        data = json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.root / "objects" / digest[:2] / digest[2:]
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(zlib.compress(data))
+            tmp.replace(path)
+        return digest
+
+    def get(self, digest: str):
+        path = self.root / "objects" / digest[:2] / digest[2:]
+        return json.loads(zlib.decompress(path.read_bytes()))
+
+    def record(self, spec: dict, label: str = "") -> tuple[int, int | None]:
+        """Records `spec` as a new version, returning it and the latest earlier version of the same spec, if any."""
+        spec_hash = hashlib.sha256(json.dumps(spec, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+        conn = self.conn
+        (same_as,) = conn.execute("SELECT MAX(version) FROM versions WHERE spec_hash = ?", (spec_hash,)).fetchone()
+
+        (last,) = conn.execute("SELECT COALESCE(MAX(version), 0) FROM versions").fetchone()
+        version = last + 1
+        # Declaration order matters for everything but the cheatcodes, which are sorted when rendering.
+        layout = {kind: [self.key(kind, d) for d in spec[kind]] for kind in self.KINDS if kind != "cheatcodes"}
+        with conn:
+            for kind in self.KINDS:
+                for d in spec[kind]:
+                    key = self.key(kind, d)
+                    digest = self.put(d)
+                    selector = int.from_bytes(bytes(d["func"]["selectorBytes"]), "big") if kind == "cheatcodes" else None
+                    conn.execute("INSERT OR IGNORE INTO records VALUES (?, ?, ?, ?)", (digest, kind, key, selector))
+                    span = conn.execute(
+                        "SELECT rowid, hash FROM spans WHERE kind = ? AND key = ? AND last_version = ?",
+                        (kind, key, last),
+                    ).fetchone()
+                    if span is not None and span[1] == digest:
+                        conn.execute("UPDATE spans SET last_version = ? WHERE rowid = ?", (version, span[0]))
+                    else:
+                        conn.execute("INSERT INTO spans VALUES (?, ?, ?, ?, ?)", (kind, key, digest, version, version))
+            conn.execute(
+                "INSERT INTO versions VALUES (?, ?, ?, ?, ?)",
+                (version, spec_hash, self.put(layout), label, datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+        return version, same_as
+
+    def log(self) -> list[tuple[int, str, str, str, int]]:
+        """Returns `(version, recorded_at, label, spec_hash, changes)` for every version."""
+        sql = """
+            SELECT v.version, v.recorded_at, v.label, v.spec_hash,
+                (SELECT COUNT(*) FROM spans WHERE first_version = v.version)
+                + (SELECT COUNT(*) FROM spans s WHERE last_version = v.version - 1 AND NOT EXISTS (
+                    SELECT 1 FROM spans n WHERE n.kind = s.kind AND n.key = s.key AND n.first_version = v.version))
+            FROM versions v ORDER BY v.version
+        """
+        return self.conn.execute(sql).fetchall()
+
+    def selector_changes(self, selector: str) -> list[tuple[int, str, str]]:
+        """Returns `(version, change, id)` for every version that added, changed or removed `selector`."""
+        (latest,) = self.conn.execute("SELECT COALESCE(MAX(version), 0) FROM versions").fetchone()
+        sql = """
+            SELECT s.key, s.first_version, s.last_version FROM spans s
+            WHERE s.kind = 'cheatcodes' AND s.key IN (
+                SELECT key FROM records WHERE kind = 'cheatcodes' AND selector_int = ?)
+            ORDER BY s.key, s.first_version
+        """
+        changes = []
+        prev: tuple[str, int] | None = None
+        for key, first, last in self.conn.execute(sql, (int(selector, 16),)).fetchall():
+            if prev is not None and prev[0] == key and prev[1] + 1 == first:
+                changes.append((first, "changed", key))
+            else:
+                if prev is not None and prev[1] < latest:
+                    changes.append((prev[1] + 1, "removed", prev[0]))
+                changes.append((first, "added", key))
+            prev = (key, last)
+        if prev is not None and prev[1] < latest:
+            changes.append((prev[1] + 1, "removed", prev[0]))
+        changes.sort()
+        return changes
+
+    def cheatcodes_at(self, version: int) -> Cheatcodes:
+        """Rebuilds the model of `version` from the records alive in it."""
+        row = self.conn.execute("SELECT layout_hash FROM versions WHERE version = ?", (version,)).fetchone()
+        assert row is not None, f"unknown version {version}"
+        layout = self.get(row[0])
+
+        spans = self.conn.execute(
+            "SELECT kind, key, hash FROM spans WHERE first_version <= ? AND last_version >= ?",
+            (version, version),
+        ).fetchall()
+        items: dict[str, dict[str, dict]] = {kind: {} for kind in self.KINDS}
+        for kind, key, digest in spans:
+            items[kind][key] = self.get(digest)
+
+        d = {kind: [items[kind][key] for key in layout[kind]] for kind in layout}
+        d["cheatcodes"] = [items["cheatcodes"][key] for key in sorted(items["cheatcodes"])]
+        return Cheatcodes.from_dict(d)
@@ -0,0 +1,169 @@
+"""Byte and line ranges of the declarations of Vm.sol, see `vm.py --index` and `vm.py locate`."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+
+from vm import OUT_PATH, Cheatcode, Item
+
+# The columns of every entry of the index.
+FIELDS = ["kind", "name", "contract", "doc_start", "start", "end", "doc_line", "line", "end_line"]
+
+
+def cmd_locate(args: argparse.Namespace):
+    index = DeclarationIndex.load(args.index)
+    entry = index.find(args.key)
+    assert entry is not None, f"{args.key} is not in {args.index}"
+    with open(index.path, "rb") as f:
+        f.seek(entry["doc_start"] if args.doc else entry["start"])
+        source = f.read(entry["end"] - f.tell()).decode()
+    if args.doc:
+        print(source)
+    else:
+        print(f"{index.path}:{entry['line']}-{entry['end_line']}\t{entry['kind']}\t{entry['contract']}.{entry['name']}")
+
+
+def write_declaration_index(emitted: list[tuple[str, Item, object]], vm_sol: str, index_path: str):
+    """Writes the ranges of the `emitted` items of a render in the formatted `vm_sol` to `index_path`.
+
+    `forge fmt` rewraps declarations after rendering, so the printer only
+    records what it emitted and in which order, and the ranges are found
+    with a single forward scan of the formatted file.
+    """
+    with open(vm_sol, "rb") as f:
+        source = f.read()
+
+    entries = []
+    by_id = {}
+    by_selector = {}
+    scanner = Scanner(source)
+    for contract, kind, obj in emitted:
+        if isinstance(obj, Cheatcode):
+            if obj.func.declaration.startswith("//"):
+                kind_name, name, head = "group", obj.group, obj.func.declaration.encode()
+            else:
+                kind_name, name = "function", obj.func.parsed.name
+                head = f"function {name}(".encode()
+                by_id[obj.func.id] = len(entries)
+                by_selector[obj.func.selector] = len(entries)
+        else:
+            kind_name, name = kind.value, obj.name
+            head = f"{kind.value} {name}{'(' if kind in (Item.EVENT, Item.ERROR) else ' {'}".encode()
+        entries.append([kind_name, name, contract, *scanner.find(head, kind_name)])
+
+    index = {
+        "version": DeclarationIndex.VERSION,
+        "path": vm_sol,
+        "sha256": hashlib.sha256(source).hexdigest(),
+        "fields": FIELDS,
+        "entries": entries,
+        "ids": by_id,
+        "selectors": by_selector,
+    }
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    tmp = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp, index_path)
+
+
+class Scanner:
+    """Finds consecutive declarations in a formatted source, keeping track of line numbers."""
+
+    source: bytes
+    pos: int
+    _line_pos: int
+    _line: int
+
+    def __init__(self, source: bytes):
+        self.source = source
+        self.pos = 0
+        self._line_pos = 0
+        self._line = 1
+
+    def find(self, head: bytes, kind: str) -> tuple[int, int, int, int, int, int]:
+        """Returns `(doc_start, start, end, doc_line, line, end_line)` of the next declaration starting with `head`.
+
+        Lines are 1-based and inclusive; byte offsets are half-open.
+        """
+        source = self.source
+        start = self._find_line_start(head)
+        if kind == "group":
+            end = source.index(b"\n", start)
+        elif kind in ("struct", "enum"):
+            # The closing brace is the first one at the same indentation.
+            first_line = source[start : source.index(b"\n", start)]
+            indent = first_line[: len(first_line) - len(first_line.lstrip())]
+            end = source.index(b"\n" + indent + b"}", start) + len(indent) + 2
+        else:
+            end = source.index(b";", start) + 1
+
+        # The doc comment is the run of `///` lines right above.
+        doc_start = start
+        while doc_start > 0:
+            prev = source.rfind(b"\n", 0, doc_start - 1) + 1
+            if not source[prev:doc_start].lstrip().startswith(b"///"):
+                break
+            doc_start = prev
+
+        doc_line = self._line_at(doc_start)
+        line = self._line_at(start)
+        end_line = self._line_at(end)
+        self.pos = end
+        return doc_start, start, end, doc_line, line, end_line
+
+    def _find_line_start(self, head: bytes) -> int:
+        """Returns the start of the next line whose first token starts with `head`."""
+        source = self.source
+        pos = self.pos
+        while True:
+            found = source.find(head, pos)
+            assert found >= 0, f"{head.decode()!r} not found after offset {self.pos}"
+            line_start = source.rfind(b"\n", 0, found) + 1
+            if not source[line_start:found].strip():
+                return line_start
+            pos = found + len(head)
+
+    def _line_at(self, pos: int) -> int:
+        # Only called with increasing positions.
+        self._line += self.source.count(b"\n", self._line_pos, pos)
+        self._line_pos = pos
+        return self._line
+
+
+class DeclarationIndex:
+    VERSION = 1
+
+    path: str
+    entries: list[list]
+    ids: dict[str, int]
+    selectors: dict[str, int]
+    names: dict[str, int]
+
+    def __init__(self, path: str, entries: list[list], ids: dict[str, int], selectors: dict[str, int]):
+        self.path = path
+        self.entries = entries
+        self.ids = ids
+        self.selectors = selectors
+        # Structs, enums, events, errors and group headers, by name.
+        self.names = {e[1]: i for i, e in enumerate(entries) if e[0] != "function"}
+
+    @staticmethod
+    def load(index_path: str) -> "DeclarationIndex":
+        with open(index_path) as f:
+            d = json.load(f)
+        assert d.get("version") == DeclarationIndex.VERSION, f"unsupported index version in {index_path}"
+        assert d["fields"] == FIELDS, f"unexpected fields in {index_path}"
+        return DeclarationIndex(d.get("path", OUT_PATH), d["entries"], d["ids"], d["selectors"])
+
+    def find(self, key: str) -> dict | None:
+        """Returns the entry of a function id (e.g. `prank_1`), a selector, or the name of another declaration."""
+        i = self.ids.get(key)
+        if i is None:
+            i = self.selectors.get(key.lower())
+        if i is None:
+            i = self.names.get(key)
+        return None if i is None else dict(zip(FIELDS, self.entries[i]))
@@ -0,0 +1,172 @@
+"""Builds the model of very large specs across processes, see `vm.py --load-jobs`."""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from vm import Cheatcode, Cheatcodes, Enum, Error, Event, Function, Mutability, Struct, Visibility
+
+# Below this size the pool costs more than it saves.
+MIN_PARALLEL_SIZE = 2 * 1024 * 1024
+# Number of chunks per worker, so that a slow chunk doesn't hold up the others.
+CHUNKS_PER_JOB = 4
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# A record of the cheatcodes array starts after a comma; inside a record objects only follow a colon.
+RECORD_START = re.compile(r",[ \t\n\r]*\{")
+BUILDERS = {
+    "errors": Error.from_dict,
+    "events": Event.from_dict,
+    "enums": Enum.from_dict,
+    "structs": Struct.from_dict,
+}
+VISIBILITIES = {v.value: v for v in Visibility}
+MUTABILITIES = {m.value: m for m in Mutability}
+
+# Set in every worker process by `_init_worker`.
+_text = ""
+
+
+def load_parallel(text: str, jobs: int, min_size: int = MIN_PARALLEL_SIZE) -> Cheatcodes:
+    """Builds the model of the spec `text`, decoding its cheatcodes in chunks across `jobs` processes.
+
+    The cheatcodes array is cut at approximate offsets that are then moved to
+    the next record; workers decode their chunk and send each record back as
+    a flat tuple, which is much cheaper to pickle than the model objects.
+    Chunks are merged in order, and if they don't tile the array exactly
+    (e.g. a cut landed inside a string) the spec is loaded sequentially.
+    """
+    if jobs <= 1 or len(text) < min_size:
+        return Cheatcodes.from_json(text)
+
+    records: dict[str, list] = {key: [] for key in (*BUILDERS, "cheatcodes")}
+    seen = set()
+    decoder = json.JSONDecoder()
+    pos = WHITESPACE.match(text, 0).end()
+    assert text[pos : pos + 1] == "{", "expected the spec to be an object"
+    pos += 1
+    while True:
+        pos = WHITESPACE.match(text, pos).end()
+        c = text[pos : pos + 1]
+        if c == "}":
+            break
+        if c == ",":
+            pos += 1
+            continue
+        key, pos = decoder.raw_decode(text, pos)
+        pos = WHITESPACE.match(text, pos).end()
+        assert text[pos : pos + 1] == ":", f"expected ':' after {key!r}"
+        pos = WHITESPACE.match(text, pos + 1).end()
+        if key in records:
+            c = text[pos : pos + 1]
+            assert c == "[", f"expected {key!r} to be an array, found {c!r}"
+            seen.add(key)
+        if key == "cheatcodes":
+            cheatcodes, pos = _load_cheatcodes(text, pos + 1, jobs)
+            if cheatcodes is None:
+                return Cheatcodes.from_json(text)
+            records[key] = cheatcodes
+        else:
+            value, pos = decoder.raw_decode(text, pos)
+            if key in BUILDERS:
+                records[key] = [BUILDERS[key](d) for d in value]
+    missing = [key for key in records if key not in seen]
+    assert not missing, f"the spec has no {', '.join(missing)}"
+    return Cheatcodes(**records)
+
+
+def _load_cheatcodes(text: str, start: int, jobs: int) -> tuple[list[Cheatcode] | None, int]:
+    """Decodes the array whose body starts at `start`, returning its records (None if the chunks don't tile it) and end."""
+    step = max((len(text) - start) // (jobs * CHUNKS_PER_JOB), 1)
+    bounds = [start]
+    for offset in range(start + step, len(text), step):
+        m = RECORD_START.search(text, max(offset, bounds[-1] + 1))
+        if m is None:
+            break
+        bounds.append(m.end() - 1)
+    bounds = sorted(set(bounds))
+    stops = [*bounds[1:], None]
+
+    # Forked workers share the text; on other platforms it is sent to each worker once.
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(jobs, mp_context=context, initializer=_init_worker, initargs=(text,)) as pool:
+        chunks = list(pool.map(_decode_chunk, bounds, stops))
+
+    cheatcodes = []
+    for chunk, stop in zip(chunks, stops):
+        if chunk is None:
+            return None, start
+        rows, end, closed = chunk
+        cheatcodes.extend(_build(row) for row in rows)
+        if closed:
+            # Any later chunk was cut past the end of the array.
+            return cheatcodes, end
+        if end != stop:
+            return None, start
+    return None, start
+
+
+def _build(row: tuple) -> Cheatcode:
+    id, description, declaration, visibility, mutability, signature, selector, selector_bytes, group, status, safety = row
+    func = Function(
+        id,
+        description,
+        declaration,
+        VISIBILITIES[visibility],
+        MUTABILITIES[mutability],
+        signature,
+        selector,
+        selector_bytes,
+    )
+    return Cheatcode(func, group, status, safety)
+
+
+def _init_worker(text: str):
+    global _text
+    _text = text
+
+
+def _decode_chunk(start: int, stop: int | None) -> tuple[list[tuple], int, bool] | None:
+    """Decodes the records from `start` up to the first one at or past `stop`.
+
+    Returns them as flat tuples with the offset where decoding stopped and
+    whether the array ended there, or None if `start` isn't a record.
+    """
+    text = _text
+    decoder = json.JSONDecoder()
+    rows = []
+    pos = start
+    try:
+        while True:
+            pos = WHITESPACE.match(text, pos).end()
+            c = text[pos : pos + 1]
+            if c == "]":
+                return rows, pos + 1, True
+            if c == ",":
+                pos += 1
+                continue
+            if stop is not None and pos >= stop:
+                return rows, pos, False
+            d, pos = decoder.raw_decode(text, pos)
+            f = d["func"]
+            if f["visibility"] not in VISIBILITIES or f["mutability"] not in MUTABILITIES:
+                return None
+            rows.append((
+                f["id"],
+                f["description"],
+                f["declaration"],
+                f["visibility"],
+                f["mutability"],
+                f["signature"],
+                f["selector"],
+                bytes(f["selectorBytes"]),
+                str(d["group"]),
+                str(d["status"]),
+                str(d["safety"]),
+            ))
+    except (ValueError, KeyError, TypeError, IndexError):
+        # Not a record: the sequential fallback reports the errors of a malformed spec.
+        return None
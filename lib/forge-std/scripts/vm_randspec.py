@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Generates random cheatcodes specs that exercise the corners of the Vm.sol generator.
+
+The specs have the shape of Foundry's `cheatcodes.json` and vary what the
+generator sorts and prints on: groups (including the `evm` and `json` ones
+with special titles), every status (including Foundry's `{"deprecated": ...}`
+form), both safeties, overloads, empty and multi-line descriptions with
+indentation and blank lines, and long declarations with `memory` parameters
+before and after `returns`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+
+from keccak import selector
+
+GROUPS = ["evm", "json", "testing", "scripting", "filesystem", "environment", "string", "utilities", "toml", "crypto"]
+STATUSES = ["stable", "stable", "stable", "experimental", "internal", "deprecated"]
+VALUE_TYPES = ["uint256", "int256", "address", "bytes32", "bool", "uint64", "uint8", "bytes4"]
+REFERENCE_TYPES = ["string", "bytes", "uint256[]", "address[]", "bytes32[]", "string[]", "bytes[]"]
+WORDS = [
+    "the", "cheatcode", "returns", "sets", "value", "of", "a", "storage", "slot", "`target`", "for", "next",
+    "call", "fork", "balance", "nonce", "gas", "see", "[docs](https://book.getfoundry.sh)", "and", "or", "EVM",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a random cheatcodes spec")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the spec")
+    parser.add_argument("--cheatcodes", type=int, default=300, help="number of cheatcodes (default: 300)")
+    parser.add_argument("--out", metavar="PATH", help="write the spec to PATH instead of stdout")
+    args = parser.parse_args()
+
+    text = json.dumps(random_spec(random.Random(args.seed), args.cheatcodes), indent=2)
+    if args.out is None:
+        print(text)
+    else:
+        with open(args.out, "w") as f:
+            f.write(text)
+
+
+def random_spec(rng: random.Random, cheatcodes: int = 300) -> dict:
+    """Returns a random spec with about `cheatcodes` cheatcodes, as decoded from its JSON."""
+    gen = SpecGenerator(rng)
+    structs = [gen.struct(f"Struct{i}") for i in range(rng.randrange(1, 6))]
+    enums = [gen.enum(f"Enum{i}") for i in range(rng.randrange(1, 4))]
+    for s in structs:
+        gen.canonical[s["name"]] = "(" + ",".join(f["ty"] for f in s["fields"]) + ")"
+    for e in enums:
+        gen.canonical[e["name"]] = "uint8"
+    gen.types += list(gen.canonical)
+    return {
+        "errors": [gen.error(f"Error{i}") for i in range(rng.randrange(3))],
+        "events": [gen.event(f"Event{i}") for i in range(rng.randrange(1, 4))],
+        "enums": enums,
+        "structs": structs,
+        "cheatcodes": gen.cheatcodes(cheatcodes),
+    }
+
+
+class SpecGenerator:
+    rng: random.Random
+    # Types that declarations may use besides the built-in ones, i.e. the generated structs and enums.
+    types: list[str]
+    # The ABI types of `types`, for the signatures.
+    canonical: dict[str, str]
+    groups: list[str]
+    # Names already given to cheatcodes and groups, which Foundry never repeats.
+    names: set[str]
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.types = []
+        self.canonical = {}
+        self.names = set(GROUPS)
+        # Some groups that Foundry doesn't have, to vary the order and the titles.
+        self.groups = GROUPS + [self.new_name() for _ in range(rng.randrange(4))]
+
+    def identifier(self, size: int = 8) -> str:
+        rng = self.rng
+        return rng.choice("abcdefghijklmnopqrstuvwxyz") + "".join(
+            rng.choices("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", k=rng.randrange(size))
+        )
+
+    def new_name(self) -> str:
+        """Returns an identifier that no other cheatcode or group of the spec has."""
+        while True:
+            name = self.identifier()
+            if name not in self.names:
+                self.names.add(name)
+                return name
+
+    def description(self) -> str:
+        """Returns an empty, single-line or multi-line description, with the odd indentation and blank line."""
+        rng = self.rng
+        shape = rng.random()
+        if shape < 0.15:
+            return ""
+        lines = []
+        for _ in range(1 if shape < 0.6 else rng.randrange(2, 6)):
+            line = " ".join(rng.choices(WORDS, k=rng.randrange(1, 25)))
+            if rng.random() < 0.1:
+                line = " " * rng.randrange(1, 5) + line
+            if rng.random() < 0.1:
+                line += " "
+            lines.append(line)
+            if rng.random() < 0.1:
+                lines.append("")
+        return "\n".join(lines)
+
+    def param(self, location: str) -> tuple[str, str]:
+        """Returns the declaration and the canonical type of a random parameter."""
+        rng = self.rng
+        ty = rng.choice(VALUE_TYPES + REFERENCE_TYPES + self.types)
+        name = self.identifier(rng.choice([4, 4, 4, 30]))
+        if ty in REFERENCE_TYPES or ty.startswith("Struct"):
+            return f"{ty} {location} {name}", self.canonical.get(ty, ty)
+        return f"{ty} {name}", self.canonical.get(ty, ty)
+
+    def error(self, name: str) -> dict:
+        params = [self.param("memory")[0] for _ in range(self.rng.randrange(3))]
+        return {"name": name, "description": self.description(), "declaration": f"error {name}({', '.join(params)});"}
+
+    def event(self, name: str) -> dict:
+        params = [self.param("")[0].replace("  ", " ") for _ in range(self.rng.randrange(4))]
+        params = [p.replace(" ", " indexed ", 1) if self.rng.random() < 0.3 else p for p in params]
+        return {"name": name, "description": self.description(), "declaration": f"event {name}({', '.join(params)});"}
+
+    def enum(self, name: str) -> dict:
+        variants = [{"name": f"Variant{i}", "description": self.description()} for i in range(self.rng.randrange(1, 6))]
+        return {"name": name, "description": self.description(), "variants": variants}
+
+    def struct(self, name: str) -> dict:
+        rng = self.rng
+        fields = [
+            {"name": self.identifier(), "ty": rng.choice(VALUE_TYPES + REFERENCE_TYPES), "description": self.description()}
+            for _ in range(rng.randrange(1, 6))
+        ]
+        return {"name": name, "description": self.description(), "fields": fields}
+
+    def cheatcodes(self, count: int) -> list[dict]:
+        rng = self.rng
+        out = []
+        while len(out) < count:
+            name = self.new_name()
+            # Overloads share a name and get Foundry's `name_0`, `name_1`, ... ids.
+            overloads = 1 if rng.random() < 0.7 else rng.randrange(2, 5)
+            signatures = set()
+            for i in range(overloads):
+                fid = name if overloads == 1 else f"{name}_{i}"
+                # Overloads with the same parameter types would share a signature and a selector.
+                cheatcode = self.cheatcode(fid, name)
+                while cheatcode["func"]["signature"] in signatures:
+                    cheatcode = self.cheatcode(fid, name)
+                signatures.add(cheatcode["func"]["signature"])
+                out.append(cheatcode)
+        rng.shuffle(out)
+        return out
+
+    def cheatcode(self, fid: str, name: str) -> dict:
+        rng = self.rng
+        # Long declarations have many parameters with long names, as `forge fmt` has to wrap them.
+        params = [self.param(rng.choice(["calldata", "memory"])) for _ in range(rng.choice([0, 1, 2, 3, 12]))]
+        returns = [self.param("memory") for _ in range(rng.choice([0, 0, 1, 2]))]
+        mutability = rng.choice(["", "", "view", "pure"])
+        declaration = f"function {name}({', '.join(p for p, _ in params)}) external"
+        if mutability:
+            declaration += f" {mutability}"
+        if returns:
+            declaration += f" returns ({', '.join(p for p, _ in returns)})"
+        declaration += ";"
+        signature = f"{name}({','.join(ty for _, ty in params)})"
+        selector_bytes = selector(signature)
+
+        status = rng.choice(STATUSES)
+        if status == "deprecated" and rng.random() < 0.5:
+            status = {"deprecated": rng.choice([None, f"replaced by `{self.identifier()}`"])}
+        return {
+            "func": {
+                "id": fid,
+                "description": self.description(),
+                "declaration": declaration,
+                "visibility": "external",
+                "mutability": mutability,
+                "signature": signature,
+                "selector": "0x" + selector_bytes.hex(),
+                "selectorBytes": list(selector_bytes),
+            },
+            "group": rng.choice(self.groups),
+            "status": status,
+            "safety": rng.choice(["safe", "unsafe"]),
+        }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Flags the unsafe cheatcodes that Forge scripts call, see `vm.py safety`."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+from vm import HIDDEN_STATUSES, Cheatcode, Cheatcodes, read_cheatcodes_json
+from vm_usage import UsageCache
+
+
+def cmd_safety(args: argparse.Namespace):
+    root = Path(args.root)
+    dirs = [root / d for d in args.dirs] if args.dirs else [script_dir(root)]
+    cache_path = root / args.cache
+    index = SafetyIndex.for_spec(args.path, cache_path.with_suffix(".index.json"))
+    cache = UsageCache.load(cache_path)
+    scanned = cache.update(root, dirs, suffix=".s.sol")
+    cache.save()
+
+    findings = index.check(cache.calls())
+    for path, line, name, signatures in findings:
+        print(f"{path}:{line}: vm.{name} is not in VmSafe: {', '.join(signatures)}")
+    print(
+        f"{len(findings)} unsafe calls in {len({f[0] for f in findings})} of {len(cache.files)} scripts "
+        f"({scanned} scanned)",
+        file=sys.stderr,
+    )
+    if findings:
+        sys.exit(1)
+
+
+def script_dir(root: Path) -> Path:
+    """Returns the script directory configured in `root`'s `foundry.toml`."""
+    foundry_toml = root / "foundry.toml"
+    if foundry_toml.is_file():
+        try:
+            import tomllib
+        except ImportError:
+            tomllib = None
+        if tomllib is not None:
+            profile = tomllib.loads(foundry_toml.read_text()).get("profile", {}).get("default", {})
+            return root / profile.get("script", "script")
+    return root / "script"
+
+
+class SafetyIndex:
+    """The safety of every cheatcode declared in Vm.sol, by name and number of parameters, kept until the spec changes.
+
+    Like `UsageCache`, the spec is first compared by size and mtime, then by
+    a hash of its content, so that an unchanged spec isn't parsed again.
+    """
+
+    VERSION = 2
+
+    # Name -> `[arity, safety, signature]` of each overload.
+    names: dict[str, list[list]]
+
+    def __init__(self, names: dict[str, list[list]]):
+        self.names = names
+
+    @staticmethod
+    def from_cheatcodes(cheatcodes: list[Cheatcode]) -> "SafetyIndex":
+        names: dict[str, list[list]] = {}
+        for cc in cheatcodes:
+            # Scripts can't call what Vm.sol doesn't declare.
+            if cc.status in HIDDEN_STATUSES:
+                continue
+            parsed = cc.func.parsed
+            names.setdefault(parsed.name, []).append([len(parsed.params), cc.safety, cc.func.signature])
+        return SafetyIndex(names)
+
+    @staticmethod
+    def for_spec(spec_path: str | None, index_path: Path) -> "SafetyIndex":
+        """Returns the index of the spec at `spec_path`, from `index_path` if the spec didn't change.
+
+        Without a `spec_path`, the spec is downloaded and nothing is cached.
+        """
+        if spec_path is None:
+            return SafetyIndex.from_cheatcodes(Cheatcodes.from_json(read_cheatcodes_json(None)).cheatcodes)
+
+        st = os.stat(spec_path)
+        try:
+            with open(index_path) as f:
+                d = json.load(f)
+        except (FileNotFoundError, ValueError):
+            d = {}
+        spec = d.get("spec") if d.get("version") == SafetyIndex.VERSION else None
+        if spec is not None and spec[:2] == [st.st_size, st.st_mtime_ns]:
+            return SafetyIndex(d["names"])
+
+        with open(spec_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if spec is not None and spec[2] == digest:
+            index = SafetyIndex(d["names"])
+        else:
+            index = SafetyIndex.from_cheatcodes(Cheatcodes.from_json(data).cheatcodes)
+        index.save(index_path, [st.st_size, st.st_mtime_ns, digest])
+        return index
+
+    def save(self, path: Path, spec: list):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            f.write(json.dumps({"version": self.VERSION, "spec": spec, "names": self.names}, separators=(",", ":")))
+        os.replace(tmp, path)
+
+    def check(self, calls: dict[str, list[list]]) -> list[tuple[str, int, str, list[str]]]:
+        """Returns `(path, line, name, signatures)` of every call in `calls` that may resolve to an unsafe cheatcode.
+
+        Overloads are told apart by their number of parameters, as in
+        `usage_report`; the call is flagged if any overload it may call is
+        unsafe. Names that aren't in the spec are skipped.
+        """
+        findings = []
+        for path in sorted(calls):
+            for name, line, arity in calls[path]:
+                candidates = self.names.get(name)
+                if candidates is None:
+                    continue
+                if arity is not None:
+                    candidates = [c for c in candidates if c[0] == arity] or candidates
+                unsafe = [signature for _, safety, signature in candidates if safety == "unsafe"]
+                if unsafe:
+                    findings.append((path, line, name, unsafe))
+        return findings
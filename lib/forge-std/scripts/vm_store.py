@@ -0,0 +1,175 @@
+"""Content-addressed store of generated Vm.sol files, see `vm.py --store` and `vm.py store`."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+from vm import (
+    OUT_PATH,
+    Cheatcodes,
+    fmt_config_key,
+    generate,
+    generator_hash,
+    read_cheatcodes_json,
+    render_vm_sol,
+)
+from vm_index import write_declaration_index
+
+MIB = 1024 * 1024
+
+
+def cmd_generate_stored(args: argparse.Namespace):
+    json_str = read_cheatcodes_json(args.path)
+    store = ArtifactStore(args.store)
+    key = store.key(json_str, Path("."), args.profile)
+    if store.fetch(key, OUT_PATH, link=args.store_link):
+        print(f"Wrote to {OUT_PATH} (from {store.root})")
+        if args.index is not None:
+            # The index only needs the order in which the items are printed.
+            emitted = []
+            render_vm_sol(Cheatcodes.from_json(json_str), emitted=emitted, profile=args.profile)
+            write_declaration_index(emitted, OUT_PATH, args.index)
+        return
+
+    if args.load_jobs is not None:
+        from vm_load import load_parallel
+
+        contract = load_parallel(json_str, args.load_jobs)
+    else:
+        contract = Cheatcodes.from_json(json_str)
+    generate(contract, args.index, args.render_jobs, args.profile)
+    store.put(key, OUT_PATH)
+    store.gc(int(args.store_max_size * MIB))
+
+
+def cmd_store_gc(args: argparse.Namespace):
+    store = ArtifactStore(args.store)
+    removed, freed, size = store.gc(int(args.store_max_size * MIB))
+    print(f"Evicted {removed} entries ({freed} bytes), {size} bytes left in {store.root}")
+
+
+class ArtifactStore:
+    """A directory of formatted `Vm.sol` files keyed by everything that determines them.
+
+    Entries are only ever added by an atomic rename and never modified, so the
+    directory can be shared between concurrent jobs, e.g. on a network mount.
+    Using an entry bumps its mtime, which `gc` uses to evict the least recently
+    used ones.
+    """
+
+    VERSION = 1
+
+    root: Path
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def key(self, json_str: str, project: Path, profile: str = "default") -> str:
+        """Returns the key of the `Vm.sol` that `json_str` renders to in `project` with `profile`.
+
+        Besides the spec, it depends on the generator, and on the `forge fmt`
+        configuration and version.
+        """
+        h = hashlib.sha256()
+        for part in (
+            str(self.VERSION),
+            hashlib.sha256(json_str.encode()).hexdigest(),
+            generator_hash(),
+            profile,
+            fmt_config_key(project),
+            forge_version(),
+        ):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _object(self, key: str) -> Path:
+        return self.root / "objects" / key[:2] / key
+
+    def fetch(self, key: str, dest: str, link: bool = False) -> bool:
+        """Atomically replaces `dest` with the entry for `key`, returning whether there was one."""
+        obj = self._object(key)
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        try:
+            if link:
+                try:
+                    os.link(obj, tmp)
+                except OSError as e:
+                    if not obj.exists():
+                        raise FileNotFoundError(e) from e
+                    # Across filesystems or on a filesystem without hardlinks.
+                    shutil.copyfile(obj, tmp)
+            else:
+                shutil.copyfile(obj, tmp)
+            touch(obj)
+        except FileNotFoundError:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            return False
+        os.replace(tmp, dest)
+        return True
+
+    def put(self, key: str, src: str):
+        obj = self._object(key)
+        if obj.exists():
+            touch(obj)
+            return
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        tmp = obj.parent / f".{key}.{os.getpid()}.tmp"
+        shutil.copyfile(src, tmp)
+        # Read-only, so that a hardlinked `Vm.sol` can't be edited in place.
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, obj)
+
+    def gc(self, max_size: int) -> tuple[int, int, int]:
+        """Evicts the least recently used entries until the store fits in `max_size` bytes.
+
+        Returns the number of entries evicted, the bytes freed, and the bytes left.
+        Temporary files left behind by interrupted jobs are removed too.
+        """
+        entries = []
+        stale = time.time() - 3600
+        for path in (self.root / "objects").glob("*/*"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.name.startswith("."):
+                if st.st_mtime < stale:
+                    path.unlink(missing_ok=True)
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        entries.sort()
+        size = sum(entry[1] for entry in entries)
+        removed = freed = 0
+        for _, entry_size, path in entries:
+            if size <= max_size:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+            freed += entry_size
+            removed += 1
+        return removed, freed, size
+
+
+def touch(path: Path):
+    """Marks `path` as recently used, as far as the permissions of a shared store allow."""
+    try:
+        os.utime(path)
+    except PermissionError:
+        pass
+
+
+def forge_version() -> str:
+    try:
+        res = subprocess.run(["forge", "--version"], capture_output=True, text=True)
+    except FileNotFoundError:
+        return ""
+    return res.stdout.strip()
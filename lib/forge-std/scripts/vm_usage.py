@@ -0,0 +1,248 @@
+"""Finds the cheatcodes a project calls and reports them by status, see `vm.py usage`."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+from vm import Cheatcode, Cheatcodes, read_cheatcodes, split_status
+
+# The source directories of a forge project, unless its foundry.toml says otherwise.
+SOURCE_DIRS = {"src": "src", "test": "test", "script": "script"}
+# Statuses that are not listed unless asked for, only counted.
+QUIET_STATUSES = ["stable"]
+
+# Starting with a literal lets the regex engine skip ahead; the byte before is checked separately.
+CALL = re.compile(rb"vm\s*\.\s*([A-Za-z_$][\w$]*)\s*\(")
+# Comments and string literals, whichever starts first; unterminated ones run to the end of the line or file.
+LEXEME = re.compile(rb"//[^\n]*|/\*.*?(?:\*/|\Z)|\"(?:\\.|[^\"\\\n])*\"?|'(?:\\.|[^'\\\n])*'?", re.S)
+IDENTIFIER = re.compile(rb"[\w$.]")
+WHITESPACE = b" \t\n\r"
+
+
+def cmd_usage(args: argparse.Namespace):
+    root = Path(args.root)
+    dirs = [root / d for d in args.dirs] if args.dirs else source_dirs(root)
+    cache = UsageCache.load(root / args.cache)
+    scanned = cache.update(root, dirs)
+    cache.save()
+
+    report = usage_report(read_cheatcodes(args.path), cache.calls(), args.status or None)
+    report = {"files": len(cache.files), "scanned": scanned, **report}
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+def source_dirs(root: Path) -> list[Path]:
+    """Returns the contract, test and script directories configured in `root`'s `foundry.toml`."""
+    dirs = dict(SOURCE_DIRS)
+    foundry_toml = root / "foundry.toml"
+    if foundry_toml.is_file():
+        try:
+            import tomllib
+        except ImportError:
+            tomllib = None
+        if tomllib is not None:
+            profile = tomllib.loads(foundry_toml.read_text()).get("profile", {}).get("default", {})
+            dirs = {key: profile.get(key, d) for key, d in dirs.items()}
+    return [root / d for d in dirs.values()]
+
+
+def scan(source: bytes) -> list[list]:
+    """Returns `[name, line, arity]` of every `vm.<name>(` call in `source`.
+
+    Calls in comments and string literals are skipped. The arity is None when
+    the argument list isn't closed.
+    """
+    source = blank_comments_and_strings(source)
+    calls = []
+    line, line_pos = 1, 0
+    for m in CALL.finditer(source):
+        start = m.start()
+        if start > 0 and IDENTIFIER.match(source, start - 1):
+            continue
+        line += source.count(b"\n", line_pos, start)
+        line_pos = start
+        calls.append([m.group(1).decode(), line, call_arity(source, m.end())])
+    return calls
+
+
+def blank_comments_and_strings(source: bytes) -> bytes:
+    """Returns `source` with the comments and the content of string literals replaced by spaces.
+
+    Both are found in a single pass, so that a `//` in a string doesn't start
+    a comment and a quote in a comment doesn't start a string. Newlines and
+    the quotes of strings are kept, so that lines and offsets don't move and
+    a string still counts as an argument.
+    """
+
+    def blank(m: re.Match) -> bytes:
+        text = m.group()
+        if text[0] == 0x2F:  # `/`
+            return re.sub(rb"[^\n]", b" ", text)
+        end = len(text) - 1 if len(text) > 1 and text[-1] == text[0] else len(text)
+        return text[:1] + b" " * (end - 1) + text[end:]
+
+    return LEXEME.sub(blank, source)
+
+
+def call_arity(source: bytes, pos: int) -> int | None:
+    """Returns the number of arguments of the call whose `(` ends at `pos`."""
+    depth = args = 0
+    empty = True
+    quote = None
+    i, n = pos, len(source)
+    while i < n:
+        c = source[i]
+        if quote is not None:
+            if c == 0x5C:  # `\`
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in b"\"'":
+            quote = c
+            empty = False
+        elif c in b"([{":
+            depth += 1
+            empty = False
+        elif c in b")]}":
+            if depth == 0:
+                return 0 if empty else args + 1
+            depth -= 1
+        elif c == 0x2C and depth == 0:  # `,`
+            args += 1
+        elif c not in WHITESPACE:
+            empty = False
+        i += 1
+    return None
+
+
+class UsageCache:
+    """The cheatcode calls of every source file, rescanned only when a file changes.
+
+    Like forge's `solidity-files-cache.json`, files are first compared by size
+    and mtime, then by a hash of their content, so that touching a file
+    doesn't rescan it. The calls don't depend on the spec, which is only
+    joined in when reporting.
+    """
+
+    VERSION = 2
+
+    path: Path
+    # Relative path -> `[size, mtime_ns, sha256, calls]`.
+    files: dict[str, list]
+    _dirty: bool
+
+    def __init__(self, path: Path, files: dict[str, list]):
+        self.path = path
+        self.files = files
+        self._dirty = False
+
+    @staticmethod
+    def load(path: Path) -> "UsageCache":
+        try:
+            with open(path) as f:
+                d = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return UsageCache(path, {})
+        if d.get("version") != UsageCache.VERSION:
+            return UsageCache(path, {})
+        return UsageCache(path, d["files"])
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            # `json.dumps` uses the C encoder, unlike `json.dump`.
+            f.write(json.dumps({"version": self.VERSION, "files": self.files}, separators=(",", ":")))
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def update(self, root: Path, dirs: list[Path], suffix: str = ".sol") -> int:
+        """Brings the calls of every `suffix` file under `dirs` up to date, returning how many were rescanned."""
+        old = self.files
+        self.files = {}
+        scanned = 0
+        for path, st in sol_files(dirs, suffix):
+            rel = Path(os.path.relpath(path, root)).as_posix()
+            entry = old.get(rel)
+            if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                self.files[rel] = entry
+                continue
+            with open(path, "rb") as f:
+                source = f.read()
+            digest = hashlib.sha256(source).hexdigest()
+            if entry is not None and entry[2] == digest:
+                calls = entry[3]
+            else:
+                calls = scan(source)
+                scanned += 1
+            self.files[rel] = [st.st_size, st.st_mtime_ns, digest, calls]
+            self._dirty = True
+        if len(self.files) != len(old):
+            self._dirty = True
+        return scanned
+
+    def calls(self) -> dict[str, list[list]]:
+        return {path: entry[3] for path, entry in self.files.items()}
+
+
+def sol_files(dirs: list[Path], suffix: str = ".sol"):
+    """Yields the path and stat of every file under `dirs` whose name ends with `suffix`, e.g. `.s.sol`."""
+    stack = [str(d) for d in dirs if d.is_dir()]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(suffix) and entry.is_file():
+                    yield entry.path, entry.stat()
+
+
+def usage_report(contract: Cheatcodes, calls: dict[str, list[list]], statuses: list[str] | None = None) -> dict:
+    """Counts the `calls` of every file by the status of the cheatcode they call.
+
+    Overloads are told apart by their number of parameters; a call that still
+    matches cheatcodes of several statuses counts for each of them. Calls to
+    names that aren't in the spec, e.g. removed cheatcodes, have the status
+    `unknown`. Statuses are counted by kind, so `{"deprecated": "replaced by
+    ..."}` counts as `deprecated`, and the notes of the listed signatures are
+    under `notes`. The calls are listed for `statuses`, or every status but
+    `stable` if None.
+    """
+    by_name: dict[str, list[Cheatcode]] = {}
+    kinds: dict[str, tuple[str, str | None]] = {}
+    for cc in contract.cheatcodes:
+        by_name.setdefault(cc.func.parsed.name, []).append(cc)
+        if cc.status not in kinds:
+            kinds[cc.status] = split_status(cc.status)
+
+    counts: dict[str, int] = {}
+    usages: dict[str, list[dict]] = {}
+    for path in sorted(calls):
+        for name, line, arity in calls[path]:
+            candidates = by_name.get(name, [])
+            if arity is not None:
+                candidates = [cc for cc in candidates if len(cc.func.parsed.params) == arity] or candidates
+            for status in sorted({kinds[cc.status][0] for cc in candidates}) or ["unknown"]:
+                counts[status] = counts.get(status, 0) + 1
+                if (status in statuses) if statuses is not None else (status not in QUIET_STATUSES):
+                    matching = [cc for cc in candidates if kinds[cc.status][0] == status]
+                    usage = {
+                        "file": path,
+                        "line": line,
+                        "name": name,
+                        "signatures": [cc.func.signature for cc in matching],
+                    }
+                    notes = {cc.func.signature: kinds[cc.status][1] for cc in matching if kinds[cc.status][1]}
+                    if notes:
+                        usage["notes"] = notes
+                    usages.setdefault(status, []).append(usage)
+    return {"counts": dict(sorted(counts.items())), "usages": dict(sorted(usages.items()))}
@@ -0,0 +1,210 @@
+"""Regenerates Vm.sol whenever the input spec changes, see `vm.py --watch`."""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import select
+import struct
+import time
+from abc import ABC, abstractmethod
+
+from vm import OUT_PATH, Cheatcodes, SectionCache, render_vm_sol, write_vm_sol
+
+# inotify(7) constants.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def cmd_watch(args: argparse.Namespace):
+    watcher = Watcher.for_path(args.path)
+    debounce = args.debounce / 1000
+    regen = Regenerator(args.path, args.index, args.profile)
+    print(f"Watching {args.path} ({type(watcher).__name__})")
+    regen.run()
+    try:
+        while True:
+            watcher.wait(None)
+            # Editors tend to save with several writes or a write and a rename.
+            while watcher.wait(debounce):
+                pass
+            regen.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+class Regenerator:
+    """Regenerates `OUT_PATH` from `path`, redoing only the work that its changes require."""
+
+    path: str
+    index_path: str | None
+    profile: str
+    section_cache: SectionCache
+    _input_hash: bytes | None
+    _out: str | None
+
+    def __init__(self, path: str, index_path: str | None = None, profile: str = "default"):
+        self.path = path
+        self.index_path = index_path
+        self.profile = profile
+        self.section_cache = SectionCache()
+        self._input_hash = None
+        self._out = None
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            # Some editors delete the file before writing it again, the next change will retry.
+            print(f"{self.path} does not exist")
+            self._input_hash = None
+            return
+        input_hash = hashlib.sha256(data).digest()
+        if input_hash == self._input_hash:
+            return
+        self._input_hash = input_hash
+
+        try:
+            contract = Cheatcodes.from_json(data)
+        except (ValueError, KeyError) as e:
+            # Most likely a half-written file, the next change will retry.
+            print(f"Failed to parse {self.path}: {e!r}")
+            self._input_hash = None
+            return
+
+        emitted = [] if self.index_path is not None else None
+        out = render_vm_sol(contract, self.section_cache, emitted, profile=self.profile)
+        rendered, total = self.section_cache.misses, self.section_cache.misses + self.section_cache.hits
+        self.section_cache.rotate()
+        if out == self._out:
+            print(f"Unchanged {OUT_PATH} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+            return
+        self._out = out
+
+        rendered_at = time.perf_counter()
+        write_vm_sol(out, fmt=self.profile != "lean")
+        if self.index_path is not None:
+            from vm_index import write_declaration_index
+
+            write_declaration_index(emitted, OUT_PATH, self.index_path)
+        end = time.perf_counter()
+        print(
+            f"  re-rendered {rendered} of {total} sections in {(rendered_at - start) * 1000:.1f} ms, "
+            f"wrote and formatted in {(end - rendered_at) * 1000:.1f} ms"
+        )
+
+
+class Watcher(ABC):
+    """Waits for changes to a file, with inotify where available and by polling otherwise."""
+
+    @staticmethod
+    def for_path(path: str) -> "Watcher":
+        try:
+            return InotifyWatcher(path)
+        except OSError:
+            return PollingWatcher(path)
+
+    @abstractmethod
+    def wait(self, timeout: float | None) -> bool:
+        """Waits up to `timeout` seconds (forever if None) for a change, returning whether one happened."""
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(Watcher):
+    """Watches the directory of `path` with inotify, so that atomic saves through a rename are seen too."""
+
+    fd: int
+    name: bytes
+
+    def __init__(self, path: str):
+        import ctypes
+        import ctypes.util
+
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(path))
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+        self.fd = fd
+        self.name = os.fsencode(os.path.basename(path))
+
+    def wait(self, timeout: float | None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return False
+            if self._read_events():
+                return True
+
+    def _read_events(self) -> bool:
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        changed = False
+        offset = 0
+        while offset < len(buf):
+            _, _, _, length = EVENT_HEADER.unpack_from(buf, offset)
+            offset += EVENT_HEADER.size
+            name = buf[offset : offset + length].rstrip(b"\0")
+            offset += length
+            changed = changed or name == self.name
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher(Watcher):
+    """Polls the modification time and size of `path`."""
+
+    path: str
+    interval: float
+    _stat: tuple[int, int] | None
+
+    def __init__(self, path: str, interval: float = 0.02):
+        self.path = path
+        self.interval = interval
+        self._stat = self._current()
+
+    def _current(self) -> tuple[int, int] | None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def wait(self, timeout: float | None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self._current()
+            if current != self._stat:
+                self._stat = current
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.interval)
@@ -0,0 +1,71 @@
+"""Regenerates every vendored forge-std under a directory, see `vm.py workspace`."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from vm import OUT_PATH, fmt_config_key, read_cheatcodes, render_vm_sol
+
+WORKSPACE_SKIP_DIRS = {".git", "cache", "out"}
+
+
+def cmd_workspace(args: argparse.Namespace):
+    targets = discover_forge_std(args.root)
+    if args.dry_run:
+        for target in targets:
+            print(target)
+        return
+
+    groups: dict[str, list[Path]] = {}
+    for target in targets:
+        groups.setdefault(fmt_config_key(target), []).append(target)
+    if not groups:
+        return
+
+    # The spec is parsed and rendered once, then formatted once per distinct `forge fmt` configuration.
+    out = render_vm_sol(read_cheatcodes(args.path, args.load_jobs), profile=args.profile)
+    with ThreadPoolExecutor(args.jobs) as pool:
+        keys = list(groups)
+        if args.profile == "lean":
+            formatted = dict.fromkeys(keys, out)
+        else:
+            formatted = dict(zip(keys, pool.map(lambda key: forge_fmt_source(out, groups[key][0]), keys)))
+        writes = [(t, pool.submit(write_if_changed, t / OUT_PATH, formatted[key])) for key in keys for t in groups[key]]
+        for target, changed in writes:
+            print(f"Wrote to {target / OUT_PATH}" if changed.result() else f"Unchanged {target / OUT_PATH}")
+
+
+def discover_forge_std(root: str) -> list[Path]:
+    """Returns every directory under `root` that contains a `scripts/vm.py` and `src/Vm.sol`."""
+    found = []
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in WORKSPACE_SKIP_DIRS)
+        path = Path(dirpath)
+        if (path / "scripts" / "vm.py").is_file() and (path / OUT_PATH).is_file():
+            found.append(path)
+    return found
+
+
+def forge_fmt_source(out: str, cwd: Path) -> str:
+    forge_fmt = ["forge", "fmt", "--raw", "-"]
+    res = subprocess.run(forge_fmt, input=out, capture_output=True, text=True, cwd=cwd)
+    assert res.returncode == 0, f"command failed: {forge_fmt}"
+    return res.stdout
+
+
+def write_if_changed(path: Path, content: str) -> bool:
+    """Atomically replaces `path` with `content`, unless it already has that content."""
+    data = content.encode()
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    return True